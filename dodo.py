@@ -25,71 +25,118 @@ from colorama import Fore, Style, init
 # from among all the other lines printed to the console.
 
 from settings import config
+from feature_store import PREP_KEYS
+
+from doit.tools import config_changed
 
 DATA_DIR = config("DATA_DIR")
 OUTPUT_DIR = config("OUTPUT_DIR")
 OUTPUT_EXTENDED = Path(OUTPUT_DIR).resolve().parent / "_output_extended"
 REPORTS_DIR = Path("reports")
+PERIODS = config("FORECAST_PERIODS")
+PROCESSED_DIR = DATA_DIR / "processed_data"
+WRDS_WATERMARKS = config("WRDS_STORE_DIR") / "watermarks.json"
+MACRO_FILES = [DATA_DIR / spec["file"] for spec in config("MACRO_SERIES").values()]
+LINK_SOURCES = [DATA_DIR / "ibes_id.parquet", DATA_DIR / "crsp_stocknames.parquet"]
+RESULTS = OUTPUT_DIR / "results"
+IMAGES = OUTPUT_DIR / "images"
 
 ##################################
 ## Man vs Machine pipeline (DAG)
 ##################################
-## DAG: config -> load_data -> data_engineering -> [eda, train_rf, partial_dependence]
-##      train_rf -> [stat_analysis, bias_analysis, table2]
+## DAG: config -> load_data -> data_engineering -> [eda, train_rf:{period}, partial_dependence:{period}]
+##      train_rf:{period} -> [stat_analysis, bias_analysis:{period}, table2, summary_stats, feature_importance]
+##
+## Tasks do not depend on settings.py as a file: each declares the settings keys it
+## reads (config_changed), so editing one setting reruns only the stages that use it.
+## Horizon-split stages are subtasks (e.g. pipeline_train_rf:Q1); `doit -n 5` runs
+## them in parallel.
+
+# Settings keys read by each stage (paths are covered by file_dep / targets);
+# PREP_KEYS (design-matrix settings) is shared with the feature store's panel key
+RF_KEYS = ["RF_N_ESTIMATORS", "RF_MAX_DEPTH", "RF_MAX_SAMPLES", "RF_MIN_SAMPLES_LEAF"]
+CONVERGENCE_KEYS = ["RF_CONVERGENCE_ENABLED", "RF_CONVERGENCE_STEP", "RF_CONVERGENCE_TOL"]
+IMPORTANCE_KEYS = [
+    "IMPORTANCE_ENABLED", "IMPORTANCE_PERMUTATION", "IMPORTANCE_PERM_MAX_ROWS",
+    "IMPORTANCE_PERM_REPEATS", "IMPORTANCE_SEED",
+]
+PDP_KEYS = [
+    "PDP_METHOD", "PDP_ICE_MAX_ROWS", "PDP_ICE_CHUNK_ROWS", "PDP_SEED", "PDP_FEATURES",
+    "PDP_INTERACTIONS", "PDP_GRID_RESOLUTION", "PDP_2D_GRID_RESOLUTION", "WINSORIZE_LIMITS", "OUTPUT_DPI",
+]
+
+
+def _config_deps(*keys):
+    """doit up-to-date check on the current values of the given settings keys."""
+    return config_changed({key: repr(config(key)) for key in keys})
+
+
+def _prep_inputs(period):
+    """Files a horizon's design matrix is built from (read_merge_prepare_data): its
+    modules, the processed panels and, under MACRO_SOURCE="vintage_store", the macro files."""
+    deps = [
+        "./src/functions.py",
+        "./src/feature_store.py",
+        "./src/profiles.py",
+        "./src/panel_features.py",
+        "./src/macro_store.py",
+        str(PROCESSED_DIR / "macro_data.csv"),
+        str(PROCESSED_DIR / f"{period}.csv"),
+    ]
+    if config("MACRO_SOURCE") == "vintage_store":
+        deps += map(str, MACRO_FILES)
+    return deps
+
+
+def _rolling_keys(period):
+    suffix = "_A2" if period == "A2" else ""
+    return [f"ROLLING_TRAIN_LENGTH{suffix}", f"ROLLING_N_LOOPS{suffix}"]
 
 
 def task_pipeline_load_data():
     """Pipeline step 1: Load raw data (WRDS CRSP/IBES/finratio + Philadelphia FED)."""
     raw_targets = [
-        DATA_DIR / "crsp.csv",
-        DATA_DIR / "ibes_summary.csv",
-        DATA_DIR / "finratio.csv",
-        DATA_DIR / "real_GDP_FED.csv",
-        DATA_DIR / "IPT_FED.csv",
-        DATA_DIR / "real_personal_consumption_FED.csv",
-        DATA_DIR / "Unemployment_FED.csv",
+        WRDS_WATERMARKS,
+        *LINK_SOURCES,
+        *MACRO_FILES,
     ]
     return {
         "actions": [
-            "ipython ./src/settings.py",
             "python ./src/load_data.py",
         ],
         "targets": raw_targets,
-        "file_dep": ["./src/settings.py", "./src/load_data.py"],
+        "file_dep": ["./src/load_data.py", "./src/wrds_store.py", "./src/link_table.py", "./src/profiles.py"],
+        "uptodate": [_config_deps("DATA_START_DATE", "MACRO_SERIES")],
         "clean": [],
     }
 
 
 def task_pipeline_data_engineering():
     """Pipeline step 2: IBES-CRSP link, macro, merge finratio -> processed_data/*.csv."""
-    processed = DATA_DIR / "processed_data"
     targets = [
         DATA_DIR / "ibes_crsp.csv",
-        processed / "macro_data.csv",
-        processed / "A1.csv",
-        processed / "A2.csv",
-        processed / "Q1.csv",
-        processed / "Q2.csv",
-        processed / "Q3.csv",
-    ]
+        PROCESSED_DIR / "macro_data.csv",
+    ] + [PROCESSED_DIR / f"{p}.csv" for p in PERIODS]
     return {
         "actions": [
-            "ipython ./src/settings.py",
             "python ./src/data_engineering.py",
         ],
         "targets": targets,
         "file_dep": [
-            "./src/settings.py",
             "./src/functions.py",
             "./src/data_engineering.py",
-            str(DATA_DIR / "crsp.csv"),
-            str(DATA_DIR / "ibes_summary.csv"),
-            str(DATA_DIR / "finratio.csv"),
-            str(DATA_DIR / "real_GDP_FED.csv"),
-            str(DATA_DIR / "IPT_FED.csv"),
-            str(DATA_DIR / "real_personal_consumption_FED.csv"),
-            str(DATA_DIR / "Unemployment_FED.csv"),
+            "./src/data_engineering_polars.py",
+            "./src/link_table.py",
+            "./src/wrds_store.py",
+            "./src/macro_store.py",
+            str(WRDS_WATERMARKS),
+            *map(str, LINK_SOURCES),
+            *map(str, MACRO_FILES),
         ],
+        "uptodate": [_config_deps(
+            "FORECAST_PERIODS", "MACRO_SERIES", "MACRO_GDP_START_YEAR", "MACRO_GDP_START_MONTH",
+            "MACRO_IPT_START_YEAR", "MACRO_IPT_START_MONTH", "MACRO_CONS_START_YEAR", "MACRO_CONS_START_MONTH",
+        )],
         "clean": [],
     }
 
@@ -98,103 +145,156 @@ def task_pipeline_eda():
     """Pipeline step 3: EDA on processed forecast data."""
     return {
         "actions": [
-            "ipython ./src/settings.py",
             "python ./src/eda.py",
         ],
         "targets": [OUTPUT_DIR / "eda_forecast_summary.csv"],
-        "file_dep": [
-            "./src/settings.py",
-            "./src/eda.py",
-            str(DATA_DIR / "processed_data" / "A1.csv"),
-            str(DATA_DIR / "processed_data" / "Q1.csv"),
-        ],
+        "file_dep": ["./src/eda.py"] + [str(PROCESSED_DIR / f"{p}.csv") for p in PERIODS],
+        "uptodate": [_config_deps("FORECAST_PERIODS")],
         "clean": [],
     }
 
 
 def task_pipeline_train_rf():
-    """Pipeline step 4: Rolling-window RF (and OLS) training -> results/*_rf.csv."""
-    results_dir = OUTPUT_DIR / "results"
-    targets = [results_dir / f"{p}_rf.csv" for p in ["Q1", "Q2", "Q3", "A1", "A2"]]
-    processed_dep = [
-        str(DATA_DIR / "processed_data" / "macro_data.csv"),
-        str(DATA_DIR / "processed_data" / "A1.csv"),
-        str(DATA_DIR / "processed_data" / "A2.csv"),
-        str(DATA_DIR / "processed_data" / "Q1.csv"),
-        str(DATA_DIR / "processed_data" / "Q2.csv"),
-        str(DATA_DIR / "processed_data" / "Q3.csv"),
-    ]
-    return {
-        "actions": [
-            "ipython ./src/settings.py",
-            "python ./src/train_rf.py",
-        ],
-        "targets": targets,
-        "file_dep": [
-            "./src/settings.py",
-            "./src/functions.py",
-            "./src/train_rf.py",
-        ] + processed_dep,
-        "clean": [],
-    }
+    """Pipeline step 4: Rolling-window RF (and OLS) training -> results/{period}_rf.csv, one subtask per horizon."""
+    for period in PERIODS:
+        targets = [RESULTS / f"{period}_rf.csv"]
+        if config("IMPORTANCE_ENABLED"):
+            targets.append(RESULTS / f"feature_importance_{period}.npz")
+        yield {
+            "name": period,
+            "actions": [
+                f"python ./src/train_rf.py --period {period} --force",
+            ],
+            "targets": targets,
+            "file_dep": [
+                "./src/artifact_store.py",
+                "./src/feature_importance.py",
+                "./src/train_rf.py",
+            ] + _prep_inputs(period),
+            "uptodate": [_config_deps(
+                *PREP_KEYS, *RF_KEYS, *CONVERGENCE_KEYS, *_rolling_keys(period), *IMPORTANCE_KEYS,
+                "ARTIFACT_STORE_ENABLED",
+            )],
+            "clean": [],
+        }
 
 
 def task_pipeline_stat_analysis():
-    """Pipeline step 5: Regression (bias ~ alpha_i, beta_t, post_regulation)."""
+    """Pipeline step 5: Regression (bias ~ post_regulation [+ N_analyst], fixed effects, clustered SEs)."""
     return {
         "actions": [
-            "ipython ./src/settings.py",
             "python ./src/stat_analysis.py",
         ],
-        "targets": [OUTPUT_DIR / "stat_analysis_regulation.txt"],
+        "targets": [
+            OUTPUT_DIR / "stat_analysis_regulation.txt",
+            OUTPUT_DIR / "stat_analysis_coefficients.csv",
+        ],
         "file_dep": [
-            "./src/settings.py",
             "./src/stat_analysis.py",
-            str(OUTPUT_DIR / "results" / "Q1_rf.csv"),
-            str(OUTPUT_DIR / "results" / "A2_rf.csv"),
-        ],
+            "./src/panel_regression.py",
+            "./src/results.py",
+        ] + [str(RESULTS / f"{p}_rf.csv") for p in PERIODS],
+        "uptodate": [_config_deps(
+            "FORECAST_PERIODS", "POST_REGULATION_DATE", "STAT_ANALYSIS_MODE", "STAT_FE_ABSORB",
+            "STAT_FE_CLUSTER", "STAT_FE_TOL", "STAT_FE_MAX_ITER", "STAT_SPECS", "STAT_SAMPLES",
+        )],
         "clean": [],
     }
 
 
 def task_pipeline_partial_dependence():
-    """Pipeline: Partial dependence plot (meanest -> realized EPS)."""
-    return {
+    """Pipeline: Partial dependence plots (Figure 1 + PDP_FEATURES / PDP_INTERACTIONS per horizon)."""
+    periods = config("PDP_PERIODS") or PERIODS
+    names = list(config("PDP_FEATURES")) + ["_x_".join(pair) for pair in config("PDP_INTERACTIONS")]
+    rf_keys = [*PREP_KEYS, *RF_KEYS, *PDP_KEYS]
+
+    def _inputs(period):
+        return ["./src/partial_dependence.py"] + _prep_inputs(period)
+
+    for period in periods:
+        yield {
+            "name": period,
+            "actions": [
+                f"python ./src/partial_dependence.py --period {period}",
+            ],
+            "targets": [IMAGES / "pdp" / f"{period}_{name}.png" for name in names],
+            "file_dep": _inputs(period),
+            "uptodate": [_config_deps(*rf_keys)],
+            "clean": [],
+        }
+
+    default = config("PDP_DEFAULT_PERIOD")
+    yield {
+        "name": "figure1",
         "actions": [
-            "ipython ./src/settings.py",
-            "python ./src/partial_dependence.py",
+            "python ./src/partial_dependence.py --figure1",
         ],
-        "targets": [OUTPUT_DIR / "images" / "partial_dependence_meanest.png"],
-        "file_dep": [
-            "./src/settings.py",
-            "./src/functions.py",
-            "./src/partial_dependence.py",
-            str(DATA_DIR / "processed_data" / "macro_data.csv"),
-            str(DATA_DIR / "processed_data" / "Q1.csv"),
+        "targets": [IMAGES / "partial_dependence_meanest.png"],
+        "file_dep": _inputs(default),
+        # Shares the cached forest of the default horizon; fit it once
+        "task_dep": [f"pipeline_partial_dependence:{default}"] if default in periods else [],
+        "uptodate": [_config_deps(*rf_keys, "PDP_DEFAULT_PERIOD")],
+        "clean": [],
+    }
+
+
+def task_pipeline_feature_importance():
+    """Pipeline: Feature-importance heatmaps per horizon (needs IMPORTANCE_ENABLED in train_rf)."""
+    enabled = config("IMPORTANCE_ENABLED")
+    kinds = ["impurity", "permutation"] if config("IMPORTANCE_PERMUTATION") else ["impurity"]
+    return {
+        "actions": [
+            "python ./src/feature_importance.py",
         ],
+        "targets": [IMAGES / f"feature_importance_{p}_{k}.png" for p in PERIODS for k in kinds] if enabled else [],
+        "file_dep": ["./src/feature_importance.py"] + (
+            [str(RESULTS / f"feature_importance_{p}.npz") for p in PERIODS] if enabled else []
+        ),
+        "uptodate": [_config_deps("FORECAST_PERIODS", "IMPORTANCE_TOP_N", "OUTPUT_DPI")],
         "clean": [],
     }
 
 
 def task_pipeline_bias_analysis():
-    """Pipeline: Bias analysis plots (analyst vs RF vs actual)."""
-    images_dir = OUTPUT_DIR / "images"
-    targets = [
-        images_dir / f"{p}_RF_forecast_and_analyst_vs_actual.pdf"
-        for p in ["Q1", "Q2", "Q3", "A1", "A2"]
-    ]
+    """Pipeline: Bias analysis plots (analyst vs RF vs actual), one subtask per horizon."""
+    for period in PERIODS:
+        yield {
+            "name": period,
+            "actions": [
+                f"python ./src/bias_analysis.py --period {period}",
+            ],
+            "targets": [IMAGES / f"{period}_RF_forecast_and_analyst_vs_actual.pdf"],
+            "file_dep": [
+                "./src/bias_analysis.py",
+                "./src/functions.py",
+                "./src/results.py",
+                str(RESULTS / f"{period}_rf.csv"),
+            ],
+            "uptodate": [_config_deps(
+                "BIAS_PLOT_YEAR_LOCATOR", "BIAS_FIGSIZE", "BIAS_DPI", "BIAS_TRIM_PROPORTION", "OUTPUT_DPI",
+            )],
+            "clean": [],
+        }
+
+
+def task_pipeline_summary_stats():
+    """Pipeline: Summary-statistics tables and figures (jobs skipped when results are unchanged)."""
     return {
         "actions": [
-            "ipython ./src/settings.py",
-            "python ./src/bias_analysis.py",
+            "python ./src/summary_stats.py",
         ],
-        "targets": targets,
-        "file_dep": [
-            "./src/settings.py",
-            "./src/bias_analysis.py",
-            str(OUTPUT_DIR / "results" / "Q1_rf.csv"),
-            str(OUTPUT_DIR / "results" / "A2_rf.csv"),
+        "targets": [
+            OUTPUT_DIR / "summary_stats_table.tex",
+            OUTPUT_DIR / "summary_stats_coverage.tex",
+            IMAGES / "fig_bias_distribution.png",
+            IMAGES / "fig_sample_coverage.png",
+            IMAGES / "fig_rmse_comparison.png",
         ],
+        "file_dep": [
+            "./src/summary_stats.py",
+            "./src/results.py",
+        ] + [str(RESULTS / f"{p}_rf.csv") for p in PERIODS],
+        "uptodate": [_config_deps("FORECAST_PERIODS")],
         "clean": [],
     }
 
@@ -203,7 +303,6 @@ def task_pipeline_table2():
     """Pipeline: Table 2 term structure (RF, AF, AE, differences, Newey-West t-stats)."""
     return {
         "actions": [
-            "ipython ./src/settings.py",
             "python ./src/table2_term_structure.py",
         ],
         "targets": [
@@ -211,14 +310,13 @@ def task_pipeline_table2():
             OUTPUT_DIR / "table2_term_structure.txt",
         ],
         "file_dep": [
-            "./src/settings.py",
             "./src/table2_term_structure.py",
-            str(OUTPUT_DIR / "results" / "Q1_rf.csv"),
-            str(OUTPUT_DIR / "results" / "Q2_rf.csv"),
-            str(OUTPUT_DIR / "results" / "Q3_rf.csv"),
-            str(OUTPUT_DIR / "results" / "A1_rf.csv"),
-            str(OUTPUT_DIR / "results" / "A2_rf.csv"),
-        ],
+            "./src/results.py",
+        ] + [str(RESULTS / f"{p}_rf.csv") for p in PERIODS],
+        "uptodate": [_config_deps(
+            "FORECAST_PERIODS", "TABLE2_BOOTSTRAP_DRAWS", "TABLE2_BOOTSTRAP_SEED", "TABLE2_BOOTSTRAP_METHOD",
+            "TABLE2_BOOTSTRAP_BLOCK_LENGTH", "TABLE2_BOOTSTRAP_CI_LEVEL",
+        )],
         "clean": [],
     }
 
@@ -231,22 +329,12 @@ def task_run_extended():
     ]
     return {
         "actions": [
-            "ipython ./src/settings.py",
             "python ./src/run_extended.py",
         ],
         "targets": targets,
-        "file_dep": [
-            "./src/settings.py",
-            "./src/run_extended.py",
-            "./src/load_data.py",
-            "./src/data_engineering.py",
-            "./src/train_rf.py",
-            "./src/partial_dependence.py",
-            "./src/table2_term_structure.py",
-            "./src/stat_analysis.py",
-            "./src/bias_analysis.py",
-            "./src/functions.py",
-        ],
+        # Runs every stage under the "extended" run profile (RUN_PROFILES in settings.py)
+        "file_dep": sorted(str(p) for p in Path("./src").glob("*.py")),
+        "uptodate": [_config_deps("RUN_PROFILES")],
         "clean": [],
     }
 
@@ -255,12 +343,10 @@ def task_generate_replication_latex():
     """Generate replication report LaTeX from pipeline outputs (reports/replication_report_generated.tex)."""
     return {
         "actions": [
-            "ipython ./src/settings.py",
             "python ./src/generate_replication_latex.py",
         ],
         "targets": [REPORTS_DIR / "replication_report_generated.tex"],
         "file_dep": [
-            "./src/settings.py",
             "./src/generate_replication_latex.py",
             str(OUTPUT_DIR / "table2_term_structure.csv"),
         ],
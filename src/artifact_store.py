@@ -0,0 +1,198 @@
+"""
+On-disk store for the models fitted in each rolling window (train_test_rolling).
+
+Each window is one compressed joblib file, keyed by forecast horizon and test month
+(``{root}/{period}/{month}.joblib``), holding the fitted forest, the OLS coefficients,
+the scaler and the feature list. An ``index.json`` tracks size and last access so the
+store can be capped in size with least-recently-used eviction. Artifacts are loaded
+lazily: lookups return handles and nothing is read until a field is accessed.
+
+Several processes (e.g. one per horizon) may write concurrently: index updates are
+re-read and rewritten under an exclusive lock on ``index.lock`` (POSIX only; elsewhere
+a single writer is assumed).
+"""
+import json
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+import joblib
+
+
+class Artifact:
+    """Lazy handle to one stored window; fields are loaded on first access."""
+
+    def __init__(self, store, period, month, path):
+        self._store = store
+        self.period = period
+        self.month = month
+        self.path = path
+        self._payload = None
+
+    def load(self) -> dict:
+        if self._payload is None:
+            self._payload = joblib.load(self.path)
+            self._store._touch(self.period, self.month)
+        return self._payload
+
+    def __getitem__(self, field):
+        return self.load()[field]
+
+    @property
+    def model(self):
+        return self["model"]
+
+    @property
+    def scaler(self):
+        return self["scaler"]
+
+    @property
+    def features(self):
+        return self["features"]
+
+    def __repr__(self):
+        return f"Artifact({self.period!r}, {self.month!r})"
+
+
+class ArtifactStore:
+    """Fitted rolling-window models keyed by (period, month).
+
+    Parameters
+    ----------
+    root : path-like
+        Store directory (created if missing).
+    max_bytes : int, optional
+        Size cap; least-recently-used windows are evicted after each save (never the one
+        just saved). None = no cap.
+    compress : int
+        joblib compression level (0-9).
+    """
+
+    INDEX = "index.json"
+
+    def __init__(self, root, max_bytes=None, compress=3):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.compress = compress
+        index_path = self.root / self.INDEX
+        self._index = json.loads(index_path.read_text()) if index_path.exists() else {}
+
+    @staticmethod
+    def _key(period, month):
+        return f"{period}/{month}"
+
+    def _path(self, period, month):
+        return self.root / str(period) / f"{month}.joblib"
+
+    @contextmanager
+    def _locked(self):
+        """Hold the index lock and re-read the index, so other writers' entries are kept."""
+        with open(self.root / "index.lock", "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                index_path = self.root / self.INDEX
+                if index_path.exists():
+                    self._index = json.loads(index_path.read_text())
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _flush(self):
+        tmp = self.root / (self.INDEX + ".tmp")
+        tmp.write_text(json.dumps(self._index, indent=0))
+        tmp.replace(self.root / self.INDEX)
+
+    def _touch(self, period, month):
+        with self._locked():
+            entry = self._index.get(self._key(period, month))
+            if entry is not None:
+                entry["last_access"] = time.time()
+                self._flush()
+
+    def save(self, period, month, model, scaler=None, features=None, **extra):
+        """Persist one window; extra keyword fields (e.g. ``ols_params``) are stored as-is."""
+        path = self._path(period, str(month))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        payload = {"model": model, "scaler": scaler, "features": list(features or []), **extra}
+        joblib.dump(payload, path, compress=self.compress)
+        with self._locked():
+            self._index[self._key(period, month)] = {
+                "period": str(period),
+                "month": str(month),
+                "bytes": path.stat().st_size,
+                "last_access": time.time(),
+            }
+            self._evict(keep=self._key(period, month))
+            self._flush()
+        return path
+
+    def _evict(self, keep=None):
+        """Drop least recently used windows until under max_bytes; ``keep`` (the window
+        just saved) is never dropped, even if it alone exceeds the cap."""
+        if self.max_bytes is None:
+            return
+        total = self.size_bytes()
+        for key, entry in sorted(self._index.items(), key=lambda kv: kv[1]["last_access"]):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            self._path(entry["period"], entry["month"]).unlink(missing_ok=True)
+            total -= entry["bytes"]
+            del self._index[key]
+        if total > self.max_bytes:
+            print(f"Artifact store {self.root}: {keep} alone exceeds the {self.max_bytes:,}-byte cap; kept")
+
+    def size_bytes(self) -> int:
+        return sum(e["bytes"] for e in self._index.values())
+
+    def __contains__(self, key):
+        period, month = key
+        return self._key(period, str(month)) in self._index
+
+    def __len__(self):
+        return len(self._index)
+
+    def keys(self, period=None) -> list:
+        """Sorted (period, month) pairs, optionally for one period."""
+        return sorted(
+            (e["period"], e["month"]) for e in self._index.values()
+            if period is None or e["period"] == str(period)
+        )
+
+    def months(self, period) -> list:
+        return [m for _, m in self.keys(period)]
+
+    def get(self, period, month) -> Artifact:
+        """Handle for one window; raises KeyError if it is not stored."""
+        if (period, str(month)) not in self:
+            raise KeyError(f"No artifact for {period} {month}")
+        return Artifact(self, str(period), str(month), self._path(period, str(month)))
+
+    def lookup(self, period, as_of) -> Artifact:
+        """Latest stored window for ``period`` with test month <= ``as_of`` ("YYYY-MM")."""
+        candidates = [m for m in self.months(period) if m <= str(as_of)]
+        if not candidates:
+            raise KeyError(f"No artifact for {period} at or before {as_of}")
+        return self.get(period, candidates[-1])
+
+
+def store_from_config():
+    """ArtifactStore configured from settings, or None when ARTIFACT_STORE_ENABLED is off."""
+    from settings import config
+    if not config("ARTIFACT_STORE_ENABLED"):
+        return None
+    max_gb = config("ARTIFACT_STORE_MAX_GB")
+    return ArtifactStore(
+        config("ARTIFACT_STORE_DIR"),
+        max_bytes=None if max_gb is None else int(max_gb * 1024 ** 3),
+        compress=config("ARTIFACT_STORE_COMPRESS"),
+    )
@@ -2,61 +2,51 @@
 Bias analysis: Analyst vs RF vs Actual time series and bias plots.
 Depends on: pipeline_train_rf (results/*_rf.csv).
 Outputs: OUTPUT_DIR/images/{period}_RF_forecast_and_analyst_vs_actual.pdf
+
+Usage: python bias_analysis.py [--period Q1 [--period A2 ...]]
 """
+import argparse
 import sys
 from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).resolve().parent))
 from settings import config
+from functions import grouped_trim_mean
+from results import load_result
+from profiles import with_profile
 
-import pandas as pd
 import matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
-from scipy import stats
 from matplotlib.dates import YearLocator
 
-OUTPUT_DIR = Path(config("OUTPUT_DIR"))
-RESULTS_DIR = Path(config("RESULTS_DIR"))
-IMAGES_DIR = Path(config("IMAGES_DIR"))
-IMAGES_DIR.mkdir(parents=True, exist_ok=True)
-
 
-def run_bias_analysis():
-    periods = config("FORECAST_PERIODS")
+@with_profile
+def run_bias_analysis(periods=None):
+    periods = periods or config("FORECAST_PERIODS")
+    results_dir = Path(config("RESULTS_DIR"))
+    images_dir = Path(config("IMAGES_DIR"))
+    images_dir.mkdir(parents=True, exist_ok=True)
     locator = YearLocator(config("BIAS_PLOT_YEAR_LOCATOR"))
 
     for period in periods:
-        path = RESULTS_DIR / f"{period}_rf.csv"
-        if not path.exists():
-            print("Missing", path)
+        df = load_result(period, results_dir)
+        if df is None:
+            print("Missing", results_dir / f"{period}_rf.csv")
             continue
-        df = pd.read_csv(path)
-        df['Date'] = df['Date'].astype(str)
-        g = df.groupby('Date')
-        dates = sorted(g.groups.keys())
+        trimmed = grouped_trim_mean(
+            df, 'Date', ['meanest', 'predicted_adj_actual', 'adj_actual'], config("BIAS_TRIM_PROPORTION"))
+        dates = list(trimmed.index)
 
         plt.figure(figsize=config("BIAS_FIGSIZE"), dpi=config("BIAS_DPI"))
-        plt.plot(
-            dates,
-            g['meanest'].apply(lambda x: stats.trim_mean(x, 0.01)).reindex(dates).values,
-            label='analyst forecast'
-        )
-        plt.plot(
-            dates,
-            g['predicted_adj_actual'].apply(lambda x: stats.trim_mean(x, 0.01)).reindex(dates).values,
-            label='RF prediction'
-        )
-        plt.plot(
-            dates,
-            g['adj_actual'].apply(lambda x: stats.trim_mean(x, 0.01)).reindex(dates).values,
-            label='actual value'
-        )
+        plt.plot(dates, trimmed['meanest'].values, label='analyst forecast')
+        plt.plot(dates, trimmed['predicted_adj_actual'].values, label='RF prediction')
+        plt.plot(dates, trimmed['adj_actual'].values, label='actual value')
         plt.gca().xaxis.set_major_locator(locator)
         plt.gcf().autofmt_xdate()
         plt.legend()
         plt.title(f'{period}: Analyst Forecast vs RF Prediction vs Actual Value')
-        out = IMAGES_DIR / f"{period}_RF_forecast_and_analyst_vs_actual.pdf"
+        out = images_dir / f"{period}_RF_forecast_and_analyst_vs_actual.pdf"
         plt.savefig(out, dpi=config("OUTPUT_DPI"), format='pdf')
         plt.close()
         print("Saved", out)
@@ -64,4 +54,7 @@ def run_bias_analysis():
 
 
 if __name__ == "__main__":
-    run_bias_analysis()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--period", action="append", help="horizon to plot (repeatable; default: all)")
+    args, _ = parser.parse_known_args()  # ALL-CAPS --VAR=value options are read by settings
+    run_bias_analysis(periods=args.period)
@@ -1,7 +1,13 @@
 """
 Data engineering for Man vs Machine: IBES-CRSP link, macro processing, merge with finratio.
-Depends on: pipeline_load_data outputs (crsp, ibes_summary, finratio, FED CSVs).
+Depends on: pipeline_load_data outputs (crsp, ibes_summary, finratio in the WRDS_STORE_DIR
+            store, see wrds_store.py; FED CSVs; ibes_id / crsp_stocknames for the link
+            table, see link_table.py).
 Outputs: DATA_DIR/ibes_crsp.csv, DATA_DIR/processed_data/macro_data.csv, A1,A2,Q1,Q2,Q3.csv
+
+The CRSP x IBES merges, the finratio imputation and the finratio as-of merge are
+separate functions with a Polars counterpart in data_engineering_polars.py (same
+signatures, pandas frames in and out); DATA_ENGINEERING_ENGINE picks the engine.
 """
 import sys
 from pathlib import Path
@@ -9,14 +15,11 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).resolve().parent))
 from settings import config
 from functions import PrepareMacro
+from profiles import with_profile
 
 import pandas as pd
 import numpy as np
 
-DATA_DIR = Path(config("DATA_DIR"))
-PROCESSED_DIR = Path(config("PROCESSED_DIR"))
-PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
-
 
 def group_fpi(fpi):
     if fpi in [6, 7, 8]:
@@ -26,112 +29,159 @@ def group_fpi(fpi):
     return fpi
 
 
-def run_data_engineering(use_wrds=True):
-    if use_wrds:
-        try:
-            import wrds
-            # Match notebook: notebook uses wrds.Connection(yautoconnect=True).
-            # If WRDS_USERNAME is set (e.g. in .env), use it for non-interactive runs.
-            try:
-                username = config("WRDS_USERNAME")
-                db = wrds.Connection(wrds_username=username)
-            except Exception:
-                db = wrds.Connection(yautoconnect=True)
-        except Exception as e:
-            print("WRDS connection failed:", e)
-            return
-    else:
-        db = None
-
-    # ---- 1) IBES-CRSP link table from WRDS ----
-    if db is not None:
-        _ibes1 = db.raw_sql("""
-            select ticker, cusip, cname, sdates
-            from ibes.id
-            where usfirm='1' and cusip != ''
-        """, date_cols=['sdates'])
-        _ibes1_date = _ibes1.groupby(['ticker', 'cusip']).sdates.agg(['min', 'max']).reset_index().rename(
-            columns={'min': 'fdate', 'max': 'ldate'})
-        _ibes2 = pd.merge(_ibes1, _ibes1_date, how='left', on=['ticker', 'cusip'])
-        _ibes2 = _ibes2.sort_values(by=['ticker', 'cusip', 'sdates'])
-        _ibes2 = _ibes2.loc[_ibes2.sdates == _ibes2.ldate].drop(['sdates'], axis=1)
-
-        _crsp1 = db.raw_sql("""
-            select permno, ncusip, comnam, namedt, nameenddt
-            from crsp.stocknames where ncusip != ''
-        """, date_cols=['namedt', 'nameenddt'])
-        _crsp1_fnamedt = _crsp1.groupby(['permno', 'ncusip']).namedt.min().reset_index()
-        _crsp1_lnameenddt = _crsp1.groupby(['permno', 'ncusip']).nameenddt.max().reset_index()
-        _crsp1_dtrange = pd.merge(_crsp1_fnamedt, _crsp1_lnameenddt, on=['permno', 'ncusip'], how='inner')
-        _crsp1 = _crsp1.drop(['namedt'], axis=1).rename(columns={'nameenddt': 'enddt'})
-        _crsp2 = pd.merge(_crsp1, _crsp1_dtrange, on=['permno', 'ncusip'], how='inner')
-        _crsp2 = _crsp2.loc[_crsp2.enddt == _crsp2.nameenddt].drop(['enddt'], axis=1)
-
-        _link1_1 = pd.merge(_ibes2, _crsp2, how='inner', left_on='cusip', right_on='ncusip').sort_values(
-            ['ticker', 'permno', 'ldate'])
-        _link1_1_tmp = _link1_1.groupby(['ticker', 'permno']).ldate.max().reset_index()
-        _link1_2 = pd.merge(_link1_1, _link1_1_tmp, how='inner', on=['ticker', 'permno', 'ldate'])
-        link_table = _link1_2[['permno', 'ncusip']]
-    else:
-        print("Skipping WRDS link table; need existing ibes_crsp or run with WRDS.")
-        return
+def fpi_group_codes(fpi):
+    """group_fpi for a whole column, as small integer codes (equal codes = same group).
+
+    group_fpi runs once per distinct fpi value to build a mapping table; rows are
+    mapped through their factorized codes, so the result has one integer dtype
+    whatever the mix of grouped and ungrouped fpi values.
+    """
+    codes, uniques = pd.factorize(pd.Series(fpi))
+    _, table = np.unique([str(group_fpi(v)) for v in uniques], return_inverse=True)
+    return np.where(codes < 0, -1, table.astype(np.int64)[codes])
 
-    # ---- 2) Load local CRSP, IBES ----
-    IBES = pd.read_csv(DATA_DIR / "ibes_summary.csv")
-    if 'anndats_act' in IBES.columns:
-        IBES.rename(columns={'anndats_act': 'announcement_actual_eps'}, inplace=True)
-    CRSP = pd.read_csv(DATA_DIR / "crsp.csv")
 
-    CRSP['rankdate'] = pd.to_datetime(CRSP['date'])
-    CRSP['date'] = pd.to_datetime(CRSP['date'])
-    CRSP['rankdate'] = CRSP['rankdate'].dt.to_period('M')
-    CRSP['ret'] = pd.to_numeric(CRSP['ret'], errors='coerce')
-    CRSP = CRSP.sort_values(by=['permno', 'rankdate'], ascending=True)
+def ticker_fpi_key(ticker, fpi):
+    """int64 merge_asof ``by`` key for (ticker, fpi group): int32 ticker codes combined
+    with fpi_group_codes, so the as-of grouping hashes one integer per row instead of
+    a tuple of Python objects."""
+    ticker_codes = pd.factorize(pd.Series(ticker))[0].astype(np.int32)
+    groups = fpi_group_codes(fpi)
+    return ticker_codes.astype(np.int64) * (groups.max(initial=0) + 2) + groups + 1
 
+
+def _day_key(permno, dates):
+    """int64 key of (permno, calendar day): permno * 2**20 + days since 1970-01-01."""
+    days = np.asarray(dates, dtype='datetime64[ns]').astype('datetime64[D]').astype(np.int64)
+    return np.asarray(permno, dtype=np.int64) * (1 << 20) + days
+
+
+def link_ibes(IBES, link_table):
+    """IBES rows with their permno (inner join on cusip), dates parsed, ``fpi`` as an
+    integer (the WRDS store keeps it as the char column WRDS serves), ``rankdate``
+    month and the (ticker, fpi group) as-of key ``asof_group``."""
     IBES_link = pd.merge(IBES, link_table, how='inner', left_on=['cusip'], right_on=['ncusip']).drop('ncusip', axis=1)
+    IBES_link['fpi'] = pd.to_numeric(IBES_link['fpi'])
     IBES_link['statpers'] = pd.to_datetime(IBES_link['statpers'])
-    IBES_link['rankdate'] = pd.to_datetime(IBES_link['statpers']).dt.to_period('M')
+    IBES_link['announcement_actual_eps'] = pd.to_datetime(IBES_link['announcement_actual_eps'])
+    IBES_link['rankdate'] = IBES_link['statpers'].dt.to_period('M')
     IBES_link['permno'] = IBES_link['permno'].astype('int')
-
-    IBES_CRSP1 = pd.merge(
-        CRSP[['permno', 'price', 'ret', 'cfacshr', 'date']],
-        IBES_link,
-        how='inner',
-        left_on=['permno', 'date'],
-        right_on=['permno', 'statpers']
-    )
+    IBES_link['asof_group'] = ticker_fpi_key(IBES_link['ticker'], IBES_link['fpi'])
+    return IBES_link
+
+
+def restrict_crsp(CRSP, IBES_link):
+    """The CRSP rows on a (permno, date) that IBES_link needs: its statpers and
+    announcement dates.
+
+    Runs on CRSP as read: the date strings are parsed once per distinct value and the
+    rows are selected by an integer key, so the daily file is neither converted nor
+    sorted; only the (much smaller) selection is. ``CRSP`` may also be an iterable of
+    chunks (wrds_store.iter_source), each restricted as it arrives, so the full daily
+    panel is never held in memory.
+
+    Returns
+    -------
+    pd.DataFrame
+        ``key`` (see _day_key), ``permno``, ``date``, ``price``, ``ret`` (numeric),
+        ``cfacshr``, sorted by permno and date.
+    """
+    needed = np.unique(np.concatenate([
+        _day_key(IBES_link['permno'], IBES_link['statpers']),
+        _day_key(IBES_link['permno'], IBES_link['announcement_actual_eps']),
+    ]))
+    chunks = [CRSP] if isinstance(CRSP, pd.DataFrame) else CRSP
+    crsp = pd.concat([_restrict_chunk(chunk, needed) for chunk in chunks], ignore_index=True)
+    return crsp.sort_values(['permno', 'date'], kind='stable').reset_index(drop=True)
+
+
+def _restrict_chunk(CRSP, needed):
+    codes, uniques = pd.factorize(CRSP['date'])
+    days = pd.to_datetime(uniques).values
+    key = _day_key(CRSP['permno'].to_numpy(), days[codes])
+    rows = pd.Series(key, copy=False).isin(needed).to_numpy()
+    crsp = CRSP.loc[rows, ['permno', 'price', 'ret', 'cfacshr']].copy()
+    crsp.insert(0, 'key', key[rows])
+    crsp.insert(2, 'date', days[codes[rows]])
+    crsp['ret'] = pd.to_numeric(crsp['ret'], errors='coerce')
+    return crsp
+
+
+def crsp_filters(IBES, link_table):
+    """Row filters (wrds_store / pyarrow form) that keep only the CRSP rows
+    restrict_crsp can use: linked permnos, dates between the first estimate and the
+    last announcement."""
+    dates = pd.to_datetime(pd.concat([IBES['statpers'], IBES['announcement_actual_eps']]))
+    lo, hi = dates.min(), dates.max()
+    return [
+        ('year', '>=', lo.year), ('year', '<=', hi.year),
+        ('permno', 'in', sorted(set(link_table['permno'].dropna().astype(int)))),
+        ('date', '>=', lo), ('date', '<=', hi),
+    ]
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB (NaN where the resource
+    module is unavailable)."""
+    try:
+        import resource
+    except ImportError:
+        return float('nan')
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+
+def merge_ibes_crsp(IBES, CRSP, link_table):
+    """IBES estimates with CRSP prices and split-adjusted actual and past EPS.
+
+    CRSP is first cut down to the rows on an estimate's statpers or announcement date
+    (restrict_crsp); both CRSP lookups are then joins on one integer key.
+
+    Parameters
+    ----------
+    IBES : pd.DataFrame
+        ibes_summary rows (``anndats_act`` renamed to ``announcement_actual_eps``).
+    CRSP : pd.DataFrame
+        crsp rows as read (``date`` as text or datetime).
+    link_table : pd.DataFrame
+        ``permno``, ``ncusip`` (link_table.load_link_table).
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per linked estimate with a CRSP row on both ``statpers`` and the
+        announcement date; ``adj_past_eps`` is the latest earlier announced actual of
+        the same ticker and horizon group (quarterly / annual).
+    """
+    IBES_link = link_ibes(IBES, link_table)
+    crsp = restrict_crsp(CRSP, IBES_link)
+    columns = ['statpers', 'permno', 'price', 'ret'] + [c for c in IBES.columns if c not in ('statpers', 'actual')] + [
+        'rankdate', 'adjust_factor', 'adj_actual', 'announcement_past_ep', 'adj_past_eps']
+
+    IBES_link['key'] = _day_key(IBES_link['permno'], IBES_link['statpers'])
+    IBES_CRSP1 = pd.merge(crsp[['key', 'price', 'ret', 'cfacshr']], IBES_link, how='inner', on='key')
     IBES_CRSP1.rename(columns={'cfacshr': 'cfacshr_estdate'}, inplace=True)
-    IBES_CRSP1.drop(columns=['date'], axis=1, inplace=True)
-
-    IBES_CRSP1['announcement_actual_eps'] = pd.to_datetime(IBES_CRSP1['announcement_actual_eps'])
-    IBES_CRSP2 = pd.merge(
-        CRSP[['permno', 'cfacshr', 'date']],
-        IBES_CRSP1,
-        how='inner',
-        left_on=['permno', 'date'],
-        right_on=['permno', 'announcement_actual_eps']
-    )
+
+    IBES_CRSP1['key'] = _day_key(IBES_CRSP1['permno'], IBES_CRSP1['announcement_actual_eps'])
+    IBES_CRSP2 = pd.merge(crsp[['key', 'cfacshr']], IBES_CRSP1, how='inner', on='key')
     IBES_CRSP2.rename(columns={'cfacshr': 'cfacshr_reportdate'}, inplace=True)
-    IBES_CRSP2.drop(columns=['date'], axis=1, inplace=True)
+    IBES_CRSP2.drop(columns=['key'], axis=1, inplace=True)
 
     IBES_CRSP2['adjust_factor'] = IBES_CRSP2['cfacshr_estdate'] / IBES_CRSP2['cfacshr_reportdate']
     IBES_CRSP2['adj_actual'] = IBES_CRSP2['actual'] * IBES_CRSP2['adjust_factor']
     IBES_CRSP2.drop(columns=['actual', 'cfacshr_estdate', 'cfacshr_reportdate'], axis=1, inplace=True)
 
     IBES_CRSP2 = IBES_CRSP2.sort_values(by=['ticker', 'statpers'], ascending=True)
-    IBES_adj_actual = IBES_CRSP2[['announcement_actual_eps', 'ticker', 'adj_actual', 'fpi']].sort_values(
-        by=['ticker', 'announcement_actual_eps'], ascending=True)
+    IBES_adj_actual = IBES_CRSP2[['announcement_actual_eps', 'asof_group', 'adj_actual', 'fpi']].sort_values(
+        by=['asof_group', 'announcement_actual_eps'], ascending=True)
     IBES_adj_actual.dropna(subset=['announcement_actual_eps'], inplace=True)
-    IBES_adj_actual['announcement_actual_eps'] = pd.to_datetime(IBES_adj_actual['announcement_actual_eps'])
-    IBES_CRSP2['fpi_group'] = IBES_CRSP2['fpi'].apply(group_fpi)
-    IBES_adj_actual['fpi_group'] = IBES_adj_actual['fpi'].apply(group_fpi)
 
     IBES_CRSP = pd.merge_asof(
         IBES_CRSP2.set_index('statpers').sort_index(),
         IBES_adj_actual.set_index('announcement_actual_eps', drop=False).sort_index(),
         left_index=True,
         right_index=True,
-        by=['ticker', 'fpi_group'],
+        by='asof_group',
         direction='backward'
     )
     IBES_CRSP.rename(columns={
@@ -139,19 +189,18 @@ def run_data_engineering(use_wrds=True):
         'announcement_actual_eps_x': 'announcement_actual_eps',
         'announcement_actual_eps_y': 'announcement_past_ep', 'fpi_x': 'fpi'
     }, inplace=True)
-    IBES_CRSP = IBES_CRSP.drop(columns=['fpi_group', 'fpi_y'])
-    IBES_CRSP = IBES_CRSP.reset_index()
+    return IBES_CRSP.reset_index()[columns]
 
-    IBES_CRSP.to_csv(DATA_DIR / "ibes_crsp.csv", index=False)
-    print("Saved", DATA_DIR / "ibes_crsp.csv")
 
-    # ---- 3) Macro data ----
-    GDP_Raw = pd.read_csv(DATA_DIR / "real_GDP_FED.csv", index_col=0)
-    IPT_Raw = pd.read_csv(DATA_DIR / "IPT_FED.csv", skiprows=range(1, 620), index_col=0)
+def build_macro(data_dir):
+    """Real-time macro series (GDP, IPT, consumption growth; unemployment) from the Fed CSVs."""
+    data_dir = Path(data_dir)
+    GDP_Raw = pd.read_csv(data_dir / "real_GDP_FED.csv", index_col=0)
+    IPT_Raw = pd.read_csv(data_dir / "IPT_FED.csv", skiprows=range(1, 620), index_col=0)
     IPT_Raw.drop(IPT_Raw.columns[1:121], axis=1, inplace=True)
     IPT_Raw.reset_index(inplace=True, drop=True)
-    Cons_Raw = pd.read_csv(DATA_DIR / "real_personal_consumption_FED.csv", index_col=0)
-    Unempl_Raw = pd.read_csv(DATA_DIR / "Unemployment_FED.csv", skiprows=range(1, 225), index_col=0)
+    Cons_Raw = pd.read_csv(data_dir / "real_personal_consumption_FED.csv", index_col=0)
+    Unempl_Raw = pd.read_csv(data_dir / "Unemployment_FED.csv", skiprows=range(1, 225), index_col=0)
 
     GDP_Data = PrepareMacro(GDP_Raw, config("MACRO_GDP_START_YEAR"), config("MACRO_GDP_START_MONTH"), 'ROUTPUT', 'GDP')
     IPT_Data = PrepareMacro(IPT_Raw, config("MACRO_IPT_START_YEAR"), config("MACRO_IPT_START_MONTH"), 'IPT', 'IPT')
@@ -175,11 +224,12 @@ def run_data_engineering(use_wrds=True):
     merged_macro = Unempl_Data
     for df in [GDP_Data, Cons_Data, IPT_Data]:
         merged_macro = pd.merge(merged_macro, df, on=['Dates'], how='outer')
-    merged_macro.to_csv(PROCESSED_DIR / "macro_data.csv", index=False)
-    print("Saved", PROCESSED_DIR / "macro_data.csv")
+    return merged_macro
 
-    # ---- 4) Finratio and merge ----
-    finratio = pd.read_csv(DATA_DIR / "finratio.csv", index_col=0)
+
+def load_finratio(finratio):
+    """finratio rows (wrds_store.read_source) without the columns the model does not
+    use; ``public_date`` parsed."""
     finratio.drop(
         ['peg_1yrforward', 'peg_ltgforward', 'pe_op_basic', 'pe_op_dil', 'price', 'ret_crsp'],
         axis=1, inplace=True
@@ -190,7 +240,12 @@ def run_data_engineering(use_wrds=True):
         'ffi12_desc', 'ffi12', 'ffi17_desc', 'ffi17', 'ffi30_desc', 'ffi30', 'ffi38_desc', 'ffi38',
         'ffi48_desc', 'ffi48', 'ffi49_desc', 'gsector', 'gicdesc'
     ], axis=1, inplace=True)
+    return finratio
 
+
+def impute_finratio(finratio):
+    """Fill missing ratios: industry-month (ffi49) median, then the firm's own
+    neighbouring months, then the industry-month median again."""
     vars_winsorize = list(finratio.drop(['permno'], axis=1).columns)
     finratio = finratio.dropna(axis=0, subset=['ffi49'])
     finratio.loc[:, vars_winsorize] = finratio.groupby(['public_date', 'ffi49'])[vars_winsorize].transform(
@@ -198,7 +253,11 @@ def run_data_engineering(use_wrds=True):
     finratio.loc[:, vars_winsorize] = finratio.groupby('permno')[vars_winsorize].transform(lambda x: x.ffill().bfill())
     finratio.loc[:, vars_winsorize] = finratio.groupby(['public_date', 'ffi49'])[vars_winsorize].transform(
         lambda x: x.fillna(x.median(skipna=True)))
+    return finratio
+
 
+def merge_finratio(IBES_CRSP, finratio):
+    """Latest financial ratios published on or before each estimate's statpers (by permno)."""
     IBES_CRSP = IBES_CRSP.sort_values(by=['permno', 'statpers'], ascending=True)
     IBES_CRSP['statpers'] = pd.to_datetime(IBES_CRSP['statpers'])
     finratio = finratio.sort_values(by=['permno', 'public_date'], ascending=True)
@@ -218,21 +277,104 @@ def run_data_engineering(use_wrds=True):
 
     if 'Unnamed: 0' in data.columns:
         data.drop(columns=['Unnamed: 0'], axis=1, inplace=True)
+    return data
+
+
+def get_engine(name=None):
+    """Module implementing merge_ibes_crsp / impute_finratio / merge_finratio for
+    ``name`` (default DATA_ENGINEERING_ENGINE): "pandas" or "polars"."""
+    name = name or config("DATA_ENGINEERING_ENGINE")
+    if name == "polars":
+        import data_engineering_polars
+        return data_engineering_polars
+    if name != "pandas":
+        raise ValueError(f"Unknown DATA_ENGINEERING_ENGINE {name!r} (expected 'pandas' or 'polars')")
+    return sys.modules[__name__]
+
+
+def _connect_wrds():
+    """WRDS connection, or None (with the error printed) if it fails."""
+    try:
+        import wrds
+        # Match notebook: notebook uses wrds.Connection(yautoconnect=True).
+        # If WRDS_USERNAME is set (e.g. in .env), use it for non-interactive runs.
+        try:
+            username = config("WRDS_USERNAME")
+            return wrds.Connection(wrds_username=username)
+        except Exception:
+            return wrds.Connection(yautoconnect=True)
+    except Exception as e:
+        print("WRDS connection failed:", e)
+        return None
+
+
+def split_horizons(data):
+    """{A1, A2, Q1, Q2, Q3: rows of that fpi (1, 2, 6, 7, 8) with actual, estimate and
+    past EPS, sorted by permno and rankdate}."""
+    horizons = {}
+    for name, fpi in [('A1', 1), ('A2', 2), ('Q1', 6), ('Q2', 7), ('Q3', 8)]:
+        Forecast = data[data['fpi'] == fpi].dropna(subset=['adj_actual', 'meanest', 'adj_past_eps'])
+        horizons[name] = Forecast.sort_values(by=['permno', 'rankdate'], ascending=True).reset_index(drop=True)
+    return horizons
+
+
+@with_profile
+def run_data_engineering(use_wrds=True):
+    """Build the processed panels from the local load_data outputs.
+
+    WRDS is only contacted (with ``use_wrds``) when the link-table sources are missing
+    locally and no link version is stored (see link_table.py).
+    """
+    from link_table import load_link_table
+    from wrds_store import iter_source, read_source
+    from macro_store import build_store
+
+    DATA_DIR = Path(config("DATA_DIR"))
+    PROCESSED_DIR = Path(config("PROCESSED_DIR"))
+    PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
+    engine = get_engine()
+    print("Data engineering engine:", config("DATA_ENGINEERING_ENGINE"))
+
+    # ---- 1) IBES-CRSP link table (versioned local artifact) ----
+    link_table = load_link_table(connect=_connect_wrds if use_wrds else None)
+    if link_table is None:
+        print("No IBES-CRSP link: need ibes_id/crsp_stocknames from load_data, a stored link, or WRDS.")
+        return
 
-    A1 = data[data['fpi'] == 1].reset_index(drop=True)
-    A2 = data[data['fpi'] == 2].reset_index(drop=True)
-    Q1 = data[data['fpi'] == 6].reset_index(drop=True)
-    Q2 = data[data['fpi'] == 7].reset_index(drop=True)
-    Q3 = data[data['fpi'] == 8].reset_index(drop=True)
+    # ---- 2) Load local CRSP, IBES ----
+    IBES = read_source("ibes_summary")
+    if 'anndats_act' in IBES.columns:
+        IBES.rename(columns={'anndats_act': 'announcement_actual_eps'}, inplace=True)
+    crsp_columns = ['permno', 'date', 'price', 'ret', 'cfacshr']
+    chunk_rows = config("CRSP_CHUNK_ROWS")
+    if chunk_rows:
+        # Out-of-core: CRSP streamed in chunks, filtered while read (restrict_crsp)
+        CRSP = iter_source("crsp", columns=crsp_columns, filters=crsp_filters(IBES, link_table), batch_rows=chunk_rows)
+    else:
+        CRSP = read_source("crsp", columns=crsp_columns)
+
+    IBES_CRSP = engine.merge_ibes_crsp(IBES, CRSP, link_table)
+    del CRSP
+    print(f"CRSP merged ({'chunks of ' + format(chunk_rows, ',') + ' rows' if chunk_rows else 'in memory'}); "
+          f"peak RSS {peak_rss_mb():,.0f} MB")
+    IBES_CRSP.to_csv(DATA_DIR / "ibes_crsp.csv", index=False)
+    print("Saved", DATA_DIR / "ibes_crsp.csv")
+
+    # ---- 3) Macro data ----
+    merged_macro = build_macro(DATA_DIR)
+    merged_macro.to_csv(PROCESSED_DIR / "macro_data.csv", index=False)
+    print("Saved", PROCESSED_DIR / "macro_data.csv")
+    build_store()  # vintage matrices for MACRO_SOURCE = "vintage_store"
+
+    # ---- 4) Finratio and merge ----
+    finratio = engine.impute_finratio(load_finratio(read_source("finratio")))
+    data = engine.merge_finratio(IBES_CRSP, finratio)
 
-    for name, Forecast in [('A1', A1), ('A2', A2), ('Q1', Q1), ('Q2', Q2), ('Q3', Q3)]:
-        Forecast.dropna(subset=['adj_actual', 'meanest', 'adj_past_eps'], inplace=True)
-        Forecast.sort_values(by=['permno', 'rankdate'], ascending=True, inplace=True)
-        Forecast.reset_index(drop=True, inplace=True)
+    for name, Forecast in split_horizons(data).items():
         out = PROCESSED_DIR / f"{name}.csv"
         Forecast.to_csv(out, index=False)
         print("Saved", out)
-    print("Data engineering done.")
+    print(f"Data engineering done; peak RSS {peak_rss_mb():,.0f} MB.")
 
 
 if __name__ == "__main__":
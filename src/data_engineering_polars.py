@@ -0,0 +1,207 @@
+"""
+Polars engine for data_engineering: the CRSP x IBES merges, the finratio imputation and
+the finratio as-of merge as lazy Polars queries.
+
+Same functions and signatures as the pandas engine in data_engineering.py (pandas
+frames in and out, so the orchestration and the CSV outputs do not change); selected
+with DATA_ENGINEERING_ENGINE = "polars". The equi-joins, the ``join_asof`` with ``by``
+and the window medians / fills run multi-threaded on all cores (POLARS_MAX_THREADS
+caps them).
+
+One documented difference: when several earlier announcements of the same ticker and
+horizon group fall on the same date, the pandas engine's pick for ``adj_past_eps``
+depends on an unstable sort; here it is the last one in (ticker, statpers) order. The
+candidates only differ when the CRSP share adjustment changed between their statpers.
+
+Usage: python data_engineering_polars.py [--firms 500] [--months 120]  (benchmark)
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import numpy as np
+import pandas as pd
+import polars as pl
+
+
+def _lazy(df):
+    """pandas -> LazyFrame; NaN becomes null and Period columns become month-start datetimes."""
+    periods = [c for c in df.columns if isinstance(df[c].dtype, pd.PeriodDtype)]
+    if periods:
+        df = df.assign(**{c: df[c].dt.to_timestamp() for c in periods})
+    return pl.from_pandas(df, nan_to_null=True).lazy()
+
+
+def _to_pandas(lf, periods=()):
+    """Collect to pandas with ``periods`` columns as monthly Periods (as the pandas engine)."""
+    df = lf.collect().to_pandas()
+    for c in periods:
+        df[c] = df[c].dt.to_period("M")
+    return df
+
+
+def _datetime(lf, *columns):
+    """Parse text date columns (or cast datetimes) to nanosecond datetimes."""
+    schema = lf.collect_schema()
+    return lf.with_columns(
+        pl.col(c).str.to_datetime(time_unit="ns") if schema[c] == pl.String else pl.col(c).cast(pl.Datetime("ns"))
+        for c in columns
+    )
+
+
+def merge_ibes_crsp(IBES, CRSP, link_table):
+    """Polars version of data_engineering.merge_ibes_crsp (same inputs, columns and rows).
+
+    The link (with its integer (ticker, fpi group) as-of key) and the CRSP restriction
+    to the needed (permno, date) keys are shared with the pandas engine, so only the
+    small CRSP selection is converted to Polars.
+    """
+    from data_engineering import link_ibes, restrict_crsp, _day_key
+
+    IBES_link = link_ibes(IBES, link_table)
+    crsp = _lazy(restrict_crsp(CRSP, IBES_link))
+    IBES_link['key'] = _day_key(IBES_link['permno'], IBES_link['statpers'])
+    IBES_link['report_key'] = _day_key(IBES_link['permno'], IBES_link['announcement_actual_eps'])
+    ibes_columns = [c for c in IBES.columns if c not in ("statpers", "actual")]
+    merged = (
+        crsp.select("key", "price", "ret", pl.col("cfacshr").alias("cfacshr_estdate"))
+        .join(_lazy(IBES_link).pipe(_datetime, "statpers", "announcement_actual_eps"), on="key", how="inner")
+        .join(crsp.select(pl.col("key").alias("report_key"), pl.col("cfacshr").alias("cfacshr_reportdate")),
+              on="report_key", how="inner")
+        .with_columns((pl.col("cfacshr_estdate") / pl.col("cfacshr_reportdate")).alias("adjust_factor"))
+        .with_columns((pl.col("actual") * pl.col("adjust_factor")).alias("adj_actual"))
+        .sort(["ticker", "statpers"])
+    )
+    past = (
+        merged.select(pl.col("announcement_actual_eps").alias("announcement_past_ep"),
+                      pl.col("adj_actual").alias("adj_past_eps"), "asof_group")
+        .drop_nulls("announcement_past_ep")
+        .sort("announcement_past_ep", maintain_order=True)
+    )
+    out = merged.sort("statpers", maintain_order=True).join_asof(
+        past, left_on="statpers", right_on="announcement_past_ep", by="asof_group",
+        strategy="backward", check_sortedness=False,
+    )
+    columns = ["statpers", "permno", "price", "ret", *ibes_columns, "rankdate", "adjust_factor", "adj_actual",
+               "announcement_past_ep", "adj_past_eps"]
+    return _to_pandas(out.select(columns), periods=["rankdate"])
+
+
+def impute_finratio(finratio):
+    """Polars version of data_engineering.impute_finratio (row order kept)."""
+    values = [c for c in finratio.columns if c not in ("permno", "public_date", "ffi49")]
+    industry_median = [pl.col(c).fill_null(pl.col(c).median().over(["public_date", "ffi49"])) for c in values]
+    out = (
+        _lazy(finratio.reset_index(drop=True))
+        .filter(pl.col("ffi49").is_not_null())
+        .with_columns(industry_median)
+        .with_columns(pl.col(values).forward_fill().backward_fill().over("permno"))
+        .with_columns(industry_median)
+    )
+    return _to_pandas(out)
+
+
+def merge_finratio(IBES_CRSP, finratio):
+    """Polars version of data_engineering.merge_finratio (sorted by permno, rankdate)."""
+    periods = [c for c in IBES_CRSP.columns if isinstance(IBES_CRSP[c].dtype, pd.PeriodDtype)]
+    left = _datetime(_lazy(IBES_CRSP), "statpers").with_columns(pl.col("permno").cast(pl.Int64))
+    right = _datetime(_lazy(finratio), "public_date").with_columns(pl.col("permno").cast(pl.Int64))
+    # Overlapping columns get pandas' _x / _y suffixes
+    shared = (set(IBES_CRSP.columns) & set(finratio.columns)) - {"permno", "statpers"}
+    left = left.rename({c: f"{c}_x" for c in shared})
+    right = right.rename({c: f"{c}_y" for c in shared})
+    data = (
+        left.sort("statpers", maintain_order=True)
+        .join_asof(right.sort("public_date", maintain_order=True), left_on="statpers", right_on="public_date",
+                   by="permno", strategy="backward", check_sortedness=False)
+        .sort(["permno", "rankdate"], maintain_order=True)
+    )
+    if "Unnamed: 0" in data.collect_schema().names():
+        data = data.drop("Unnamed: 0")
+    return _to_pandas(data, periods=periods)
+
+
+def synthetic_inputs(n_firms=200, n_months=60, seed=0):
+    """Random IBES / CRSP / link / finratio frames shaped like the load_data outputs
+    (CRSP daily on business days, monthly statpers, fpi 1, 2, 6, 7, 8), for the parity
+    test and the benchmark. Share adjustments are constant per firm."""
+    rng = np.random.default_rng(seed)
+    days = pd.bdate_range("1990-01-01", periods=n_months * 21 + 400)
+    permnos = 10000 + np.arange(n_firms)
+    CRSP = pd.DataFrame({
+        "permno": np.repeat(permnos, len(days)),
+        "date": np.tile(days.strftime("%Y-%m-%d"), n_firms),
+        "cfacshr": np.repeat(rng.choice([1.0, 2.0, 3.0], n_firms), len(days)),
+        "price": rng.uniform(5, 100, n_firms * len(days)).round(2),
+    })
+    ret = rng.normal(0, 0.02, len(CRSP)).round(5).astype(object)
+    ret[rng.random(len(CRSP)) < 0.001] = "C"
+    CRSP["ret"] = ret
+
+    statpers = pd.Series(days).groupby(days.to_period("M")).nth(10).iloc[:n_months].to_numpy()
+    quarter_ends = pd.date_range("1989-12-31", periods=n_months // 3 + 12, freq="QE")
+    rows = []
+    for f in range(n_firms):
+        ticker, cusip = f"T{f:05d}", f"C{f:07d}"
+        actuals = dict(zip(quarter_ends, rng.normal(1, 0.5, len(quarter_ends)).round(3)))
+        for s in statpers:
+            q = quarter_ends[quarter_ends > s]
+            y = q[q.month == 12]
+            for fpi, end in ((6, q[0]), (7, q[1]), (8, q[2]), (1, y[0]), (2, y[1])):
+                ann = days[min(days.searchsorted(end + pd.Timedelta(days=int(rng.integers(20, 40)))), len(days) - 1)]
+                rows.append((ticker, cusip, f"Firm {f}", end, s, fpi, actuals[end], ann))
+    IBES = pd.DataFrame(rows, columns=["ticker", "cusip", "cname", "fpedats", "statpers", "fpi", "actual",
+                                       "announcement_actual_eps"])
+    IBES["meanest"] = (IBES["actual"] + rng.normal(0, 0.2, len(IBES))).round(3)
+    IBES["numest"] = rng.integers(1, 20, len(IBES))
+    for c in ("fpedats", "statpers", "announcement_actual_eps"):
+        IBES[c] = pd.to_datetime(IBES[c]).dt.strftime("%Y-%m-%d")
+    IBES.loc[rng.random(len(IBES)) < 0.02, "announcement_actual_eps"] = np.nan
+    link_table = pd.DataFrame({"permno": permnos, "ncusip": [f"C{f:07d}" for f in range(n_firms)]})
+
+    months = pd.date_range("1989-12-31", periods=n_months + 1, freq="ME")
+    finratio = pd.DataFrame({
+        "permno": np.repeat(permnos, len(months)),
+        "public_date": np.tile(months, n_firms),
+        "ffi49": np.repeat(rng.integers(1, 6, n_firms).astype(float), len(months)),
+    })
+    for c in ("bm", "roa", "npm"):
+        finratio[c] = rng.normal(size=len(finratio))
+        finratio.loc[rng.random(len(finratio)) < 0.1, c] = np.nan
+    finratio.loc[rng.random(len(finratio)) < 0.01, "ffi49"] = np.nan
+    return IBES, CRSP, link_table, finratio
+
+
+def benchmark(n_firms=500, n_months=120, seed=0):
+    """Time both engines on synthetic_inputs; returns {step: (pandas s, polars s)}."""
+    import data_engineering
+    import data_engineering_polars
+
+    IBES, CRSP, link_table, finratio = synthetic_inputs(n_firms, n_months, seed)
+    print(f"CRSP {len(CRSP):,} rows, IBES {len(IBES):,} rows, finratio {len(finratio):,} rows, "
+          f"{pl.thread_pool_size()} Polars threads")
+    timings = {}
+    for name, engine in (("pandas", data_engineering), ("polars", data_engineering_polars)):
+        t0 = time.perf_counter()
+        ibes_crsp = engine.merge_ibes_crsp(IBES, CRSP, link_table)
+        t1 = time.perf_counter()
+        imputed = engine.impute_finratio(finratio.copy())
+        t2 = time.perf_counter()
+        engine.merge_finratio(ibes_crsp, imputed)
+        t3 = time.perf_counter()
+        for step, seconds in (("merge_ibes_crsp", t1 - t0), ("impute_finratio", t2 - t1), ("merge_finratio", t3 - t2)):
+            timings.setdefault(step, {})[name] = seconds
+    for step, t in timings.items():
+        print(f"{step:>16}: pandas {t['pandas']:7.2f}s  polars {t['polars']:7.2f}s  ({t['pandas'] / t['polars']:.1f}x)")
+    return timings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--firms", type=int, default=500)
+    parser.add_argument("--months", type=int, default=120)
+    args, _ = parser.parse_known_args()  # ALL-CAPS --VAR=value options are read by settings
+    benchmark(args.firms, args.months)
@@ -8,19 +8,19 @@ from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).resolve().parent))
 from settings import config
+from profiles import with_profile
 
 import pandas as pd
 
-DATA_DIR = Path(config("DATA_DIR"))
-OUTPUT_DIR = Path(config("OUTPUT_DIR"))
-PROCESSED_DIR = Path(config("PROCESSED_DIR"))
-
 
+@with_profile
 def run_eda():
     periods = config("FORECAST_PERIODS")
+    processed_dir = Path(config("PROCESSED_DIR"))
+    output_dir = Path(config("OUTPUT_DIR"))
     forecast_data = {}
     for forecast in periods:
-        path = PROCESSED_DIR / f"{forecast}.csv"
+        path = processed_dir / f"{forecast}.csv"
         if not path.exists():
             print("EDA: missing", path)
             return
@@ -39,8 +39,8 @@ def run_eda():
             'cols': len(df.columns),
         })
     summary_df = pd.DataFrame(summaries)
-    out = OUTPUT_DIR / "eda_forecast_summary.csv"
-    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    out = output_dir / "eda_forecast_summary.csv"
+    output_dir.mkdir(parents=True, exist_ok=True)
     summary_df.to_csv(out, index=False)
     print("EDA summary saved to", out)
     return forecast_data
@@ -0,0 +1,198 @@
+"""
+Feature importance over time from the rolling-window random forests.
+Depends on: pipeline_train_rf with IMPORTANCE_ENABLED (results/feature_importance_{period}.npz).
+Outputs: OUTPUT_DIR/images/feature_importance_{period}_{kind}.png (kind = impurity, permutation)
+
+train_test_rolling records, per window, the impurity importances of the fitted forest
+(free) and, optionally, permutation importances on a subsample of the test month
+(IMPORTANCE_PERM_MAX_ROWS rows, IMPORTANCE_PERM_REPEATS shuffles, parallel over
+features). ImportanceRecorder stores them as dense horizon x month x feature arrays,
+one file per horizon so horizons can be trained in parallel processes.
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from settings import config
+from profiles import with_profile
+
+import numpy as np
+import pandas as pd
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
+KINDS = ("impurity", "permutation")
+
+
+def permutation_importance_subsample(model, X, y, max_rows=2000, n_repeats=3, seed=None, n_jobs=None):
+    """Permutation importances (mean drop in R^2) on at most ``max_rows`` rows of (X, y)."""
+    from sklearn.inspection import permutation_importance
+    X = np.asarray(X)
+    y = np.asarray(y)
+    if max_rows is not None and len(X) > max_rows:
+        rows = np.random.default_rng(seed).choice(len(X), size=max_rows, replace=False)
+        X, y = X[rows], y[rows]
+    res = permutation_importance(model, X, y, n_repeats=n_repeats, random_state=seed, n_jobs=n_jobs)
+    return res.importances_mean
+
+
+class ImportanceRecorder:
+    """Collects per-window importances and writes a compact horizon x month x feature array.
+
+    Parameters
+    ----------
+    permutation : bool
+        Also compute permutation importances on the test month (impurity ones are free).
+    max_rows, n_repeats, seed, n_jobs
+        Passed to :func:`permutation_importance_subsample`.
+    """
+
+    def __init__(self, permutation=True, max_rows=2000, n_repeats=3, seed=42, n_jobs=None):
+        self.permutation = permutation
+        self.max_rows = max_rows
+        self.n_repeats = n_repeats
+        self.seed = seed
+        self.n_jobs = n_jobs
+        self._records = {}  # (period, month) -> {kind: pd.Series indexed by feature}
+
+    def measure(self, model, X_test=None, y_test=None):
+        """(impurity, permutation) importances of one fitted window, without recording
+        them (process-parallel windows measure in the worker and ``add`` in the parent);
+        permutation importances need the (scaled) test month and are None otherwise."""
+        permutation = None
+        if self.permutation and X_test is not None and len(X_test) > 1:
+            permutation = permutation_importance_subsample(
+                model, X_test, y_test, max_rows=self.max_rows, n_repeats=self.n_repeats,
+                seed=self.seed, n_jobs=self.n_jobs)
+        return model.feature_importances_, permutation
+
+    def record(self, period, month, model, features, X_test=None, y_test=None):
+        """Record one fitted window; permutation importances need the (scaled) test month."""
+        self.add(period, month, features, *self.measure(model, X_test, y_test))
+
+    def add(self, period, month, features, impurity, permutation=None):
+        entry = {"impurity": pd.Series(impurity, index=list(features), dtype="float32")}
+        if permutation is not None:
+            entry["permutation"] = pd.Series(permutation, index=list(features), dtype="float32")
+        self._records[(str(period), str(month))] = entry
+
+    def __len__(self):
+        return len(self._records)
+
+    def save(self, path, merge=True):
+        """Write ``.npz`` with ``periods``, ``months``, ``features`` and one
+        (n_periods, n_months, n_features) float32 array per kind (NaN where absent).
+
+        With ``merge``, windows already in ``path`` are kept unless re-recorded, so
+        horizons trained in separate runs accumulate in one file.
+        """
+        path = Path(path)
+        records = dict(load_importances(path)["records"]) if merge and path.exists() else {}
+        records.update(self._records)
+        periods = sorted({p for p, _ in records})
+        months = sorted({m for _, m in records})
+        features = list(dict.fromkeys(f for e in records.values() for s in e.values() for f in s.index))
+        arrays = {k: np.full((len(periods), len(months), len(features)), np.nan, dtype="float32") for k in KINDS}
+        p_pos = {p: i for i, p in enumerate(periods)}
+        m_pos = {m: i for i, m in enumerate(months)}
+        for (period, month), entry in records.items():
+            for kind, series in entry.items():
+                arrays[kind][p_pos[period], m_pos[month]] = series.reindex(features).to_numpy()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez_compressed(path, periods=np.array(periods), months=np.array(months),
+                            features=np.array(features), **arrays)
+        return path
+
+
+def load_importances(path):
+    """Read a file written by :meth:`ImportanceRecorder.save`.
+
+    Returns
+    -------
+    dict
+        ``periods``, ``months``, ``features`` (lists), one array per kind, and
+        ``records`` ((period, month) -> {kind: Series}) for windows with data.
+    """
+    with np.load(path) as f:
+        out = {k: f[k] for k in f.files}
+    out["periods"] = out["periods"].tolist()
+    out["months"] = out["months"].tolist()
+    out["features"] = out["features"].tolist()
+    records = {}
+    for i, period in enumerate(out["periods"]):
+        for j, month in enumerate(out["months"]):
+            entry = {
+                kind: pd.Series(out[kind][i, j], index=out["features"])
+                for kind in KINDS if kind in out and not np.isnan(out[kind][i, j]).all()
+            }
+            if entry:
+                records[(period, month)] = entry
+    out["records"] = records
+    return out
+
+
+def recorder_from_config():
+    """ImportanceRecorder configured from settings, or None when IMPORTANCE_ENABLED is off."""
+    if not config("IMPORTANCE_ENABLED"):
+        return None
+    return ImportanceRecorder(
+        permutation=config("IMPORTANCE_PERMUTATION"),
+        max_rows=config("IMPORTANCE_PERM_MAX_ROWS"),
+        n_repeats=config("IMPORTANCE_PERM_REPEATS"),
+        seed=config("IMPORTANCE_SEED"),
+        n_jobs=config("IMPORTANCE_N_JOBS"),
+    )
+
+
+def _plot_heatmap(values, months, features, title, out, top_n):
+    """Months on x, the top_n features by mean importance on y."""
+    mean = np.nanmean(values, axis=0)
+    order = np.argsort(-np.nan_to_num(mean, nan=-np.inf))[:top_n]
+    fig, ax = plt.subplots(figsize=(14, max(4, 0.28 * len(order) + 1.5)))
+    mesh = ax.imshow(values[:, order].T, aspect='auto', cmap='viridis', interpolation='nearest')
+    fig.colorbar(mesh, ax=ax, label="Importance")
+    ax.set_yticks(range(len(order)))
+    ax.set_yticklabels([features[i] for i in order], fontsize=8)
+    step = max(1, len(months) // 20)
+    ax.set_xticks(range(0, len(months), step))
+    ax.set_xticklabels(months[::step], rotation=45, ha='right', fontsize=8)
+    ax.set_title(title, fontsize=12)
+    plt.tight_layout()
+    plt.savefig(out, dpi=config("OUTPUT_DPI"), format='png')
+    plt.close()
+
+
+def _plot_file(data, images_dir):
+    outs = []
+    for i, period in enumerate(data["periods"]):
+        for kind in KINDS:
+            values = data[kind][i]
+            has_data = ~np.isnan(values).all(axis=1)
+            if not has_data.any():
+                continue
+            months = [m for m, keep in zip(data["months"], has_data) if keep]
+            out = images_dir / f"feature_importance_{period}_{kind}.png"
+            _plot_heatmap(values[has_data], months, data["features"],
+                          f"{period}: {kind} importance by test month", out, config("IMPORTANCE_TOP_N"))
+            print("Saved", out)
+            outs.append(out)
+    return outs
+
+
+@with_profile
+def run_feature_importance():
+    """Render importance heatmaps (feature x test month) per horizon and kind."""
+    images_dir = Path(config("IMAGES_DIR"))
+    images_dir.mkdir(parents=True, exist_ok=True)
+    outs = []
+    for path in [Path(config("RESULTS_DIR")) / f"feature_importance_{p}.npz" for p in config("FORECAST_PERIODS")]:
+        if not path.exists():
+            print("Missing", path, "(set IMPORTANCE_ENABLED and rerun pipeline_train_rf)")
+            continue
+        outs += _plot_file(load_importances(path), images_dir)
+    return outs
+
+
+if __name__ == "__main__":
+    run_feature_importance()
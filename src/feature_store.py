@@ -0,0 +1,175 @@
+"""
+Memory-mapped feature store: one copy of each horizon's model-ready panel, shared by
+worker processes.
+
+A FeaturePanel holds read_merge_prepare_data's output as arrays: the features as a
+C-contiguous float32 matrix (the dtype sklearn's trees work in), the target as
+float64, and per-month row offsets (rows sorted by month, counted from
+ROLLING_START_YEAR-01). Saved as plain .npy files and opened with mmap_mode="r",
+every process reads the same pages from the OS page cache instead of receiving a
+pickled copy, so memory stays at one copy of the panel whatever the worker count.
+
+Two ways in:
+  horizon_panel(period) -- built from the processed CSVs once per input change,
+                           under FEATURE_STORE_DIR/{period}_{source}/ (rf_sweep).
+  publish(panel)        -- temporary copy of an in-memory panel for the duration of
+                           a process pool (parallel windows of train_test_rolling).
+attach(path) opens a saved panel read-only, once per process.
+"""
+import hashlib
+import json
+import shutil
+import sys
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from settings import config
+
+import numpy as np
+import pandas as pd
+
+NON_FEATURES = ["adj_actual", "Date", "permno", "numest"]
+# Settings that shape the design matrix: part of the panel key and of dodo's up-to-date checks
+PREP_KEYS = [
+    "ROLLING_START_YEAR", "ROLLING_END_YEAR", "COLS_TO_DROP_PREP", "TRIM_VALUE", "VARS_TO_TRIM", "MACRO_SOURCE",
+    "MACRO_SERIES", "PANEL_FEATURES",
+]
+ARRAYS = ("X", "y", "offsets")
+
+_attached = {}  # path -> FeaturePanel (memory-mapped), per process
+
+
+class FeaturePanel:
+    """One horizon's prepared panel as arrays, rows sorted by month.
+
+    ``offsets[m]:offsets[m + 1]`` are the rows of month ``m``; months past the
+    sample have no rows.
+    """
+
+    def __init__(self, X, y, offsets, features):
+        self.X = X
+        self.y = y
+        self.offsets = offsets
+        self.features = list(features)
+
+    @classmethod
+    def from_frame(cls, data_frame):
+        """Build from read_merge_prepare_data output (``Date`` as monthly Period); rows
+        outside ROLLING_START_YEAR..ROLLING_END_YEAR are dropped, ties keep frame order."""
+        start, end = config("ROLLING_START_YEAR"), config("ROLLING_END_YEAR")
+        df = data_frame[(data_frame["Date"] >= f"{start}-01") & (data_frame["Date"] <= f"{end}-12")]
+        month = ((df["Date"].dt.year - start) * 12 + df["Date"].dt.month - 1).to_numpy()
+        order = np.argsort(month, kind="stable")
+        features = [c for c in df.columns if c not in NON_FEATURES]
+        X = np.ascontiguousarray(df[features].to_numpy(dtype=np.float32)[order])
+        y = df["adj_actual"].to_numpy(dtype=np.float64)[order]
+        offsets = np.searchsorted(month[order], np.arange((end - start + 1) * 12 + 1))
+        return cls(X, y, offsets, features)
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in ARRAYS)
+
+    def save(self, path, key=""):
+        """Write the arrays and ``meta.json`` to ``path`` (atomically replaced)."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = Path(tempfile.mkdtemp(dir=path.parent, prefix=f".{path.name}."))
+        for name in ARRAYS:
+            np.save(tmp / f"{name}.npy", getattr(self, name))
+        (tmp / "meta.json").write_text(json.dumps({"key": key, "features": self.features}))
+        if path.exists():
+            shutil.rmtree(path)
+        tmp.rename(path)
+        return path
+
+    @classmethod
+    def load(cls, path, mmap_mode="r"):
+        path = Path(path)
+        meta = json.loads((path / "meta.json").read_text())
+        arrays = [np.load(path / f"{name}.npy", mmap_mode=mmap_mode) for name in ARRAYS]
+        return cls(*arrays, meta["features"])
+
+    def column(self, name):
+        return self.X[:, self.features.index(name)]
+
+    def month_start(self, month):
+        """First row of ``month`` (the row count for months past the sample)."""
+        return int(self.offsets[min(month, len(self.offsets) - 1)])
+
+    def window_bounds(self, length_train, n_loops):
+        """(i, train_lo, test_lo, test_hi) of train_test_rolling's windows.
+
+        Window i trains on months i..i+length_train and tests on month
+        i+length_train+1; windows whose test month has no rows are left out.
+        """
+        bounds = []
+        for i in range(n_loops):
+            test = i + length_train + 1
+            test_lo, test_hi = self.month_start(test), self.month_start(test + 1)
+            if test_hi > test_lo:
+                bounds.append((i, self.month_start(i), test_lo, test_hi))
+        return bounds
+
+    def rolling_windows(self, period):
+        """(train_lo, train_hi, test_lo, test_hi) row ranges for ``period``'s rolling settings."""
+        suffix = "_A2" if period == "A2" else ""
+        bounds = self.window_bounds(config(f"ROLLING_TRAIN_LENGTH{suffix}"), config(f"ROLLING_N_LOOPS{suffix}"))
+        return [(lo, test_lo, test_lo, test_hi) for _, lo, test_lo, test_hi in bounds]
+
+
+def attach(path) -> FeaturePanel:
+    """Memory-mapped panel at ``path``, opened once per process."""
+    path = str(path)
+    if path not in _attached:
+        _attached[path] = FeaturePanel.load(path)
+    return _attached[path]
+
+
+def horizon_panel(period):
+    """Directory of ``period``'s panel under FEATURE_STORE_DIR, rebuilt only when the
+    processed inputs or the preparation settings changed.
+
+    The directory name carries a digest of PROCESSED_DIR, so profiles with separate
+    data can share FEATURE_STORE_DIR.
+
+    Returns
+    -------
+    Path or None
+        Panel directory; None if the processed data is missing.
+    """
+    from functions import read_merge_prepare_data
+
+    processed = Path(config("PROCESSED_DIR")).resolve()
+    inputs = [processed / f"{period}.csv", processed / "macro_data.csv"]
+    if not all(p.exists() for p in inputs):
+        print("Missing processed data for", period)
+        return None
+    key_parts = [f"{p}:{p.stat().st_size}:{p.stat().st_mtime_ns}" for p in inputs]
+    key_parts += [repr(config(k)) for k in PREP_KEYS]
+    key = hashlib.sha1("|".join(key_parts).encode()).hexdigest()[:12]
+    source = hashlib.sha1(str(processed).encode()).hexdigest()[:8]
+    path = Path(config("FEATURE_STORE_DIR")) / f"{period}_{source}"
+    meta = path / "meta.json"
+    if meta.exists() and json.loads(meta.read_text()).get("key") == key:
+        return path
+    df = read_merge_prepare_data(period, pd.read_csv(processed / "macro_data.csv"))
+    FeaturePanel.from_frame(df).save(path, key=key)
+    _attached.pop(str(path), None)
+    print(f"{period}: feature panel saved to {path}")
+    return path
+
+
+@contextmanager
+def publish(panel):
+    """Save ``panel`` to a temporary directory under FEATURE_STORE_DIR for the block;
+    yields its path for workers to ``attach``."""
+    root = Path(config("FEATURE_STORE_DIR"))
+    root.mkdir(parents=True, exist_ok=True)
+    tmp = Path(tempfile.mkdtemp(dir=root, prefix="published_"))
+    try:
+        yield panel.save(tmp / "panel")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
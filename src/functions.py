@@ -1,14 +1,12 @@
 """
 Shared functions for Man vs Machine pipeline (van Binsbergen, Han, Lopez-Lira 2022).
 Paths use project config (DATA_DIR, OUTPUT_DIR) when run via dodo; can be overridden.
+
+Heavy libraries (sklearn, tqdm) are imported inside the functions that
+use them, so stages that only need PrepareMacro or the data helpers start quickly.
 """
 import pandas as pd
-from sklearn.ensemble import RandomForestRegressor
-import statsmodels.api as sm
 import numpy as np
-import matplotlib.pyplot as plt
-from sklearn import preprocessing
-from tqdm.auto import tqdm
 from pathlib import Path
 
 
@@ -71,6 +69,10 @@ def PrepareMacro(Macro_Data, Begin_Year, Begin_Month, Name_col, Name_Var):
 def read_merge_prepare_data(forecast_period, Macro_Data, data_dir=None):
     """
     Read, merge, and prepare data from CSV files.
+
+    Macro features come from ``Macro_Data`` (macro_data.csv, as-of merge on statpers),
+    or with MACRO_SOURCE = "vintage_store" from macro_store (``Macro_Data`` unused).
+    PANEL_FEATURES firm-history columns are added first (panel_features.py).
     """
     if data_dir is None:
         data_dir = _data_dir()
@@ -78,25 +80,35 @@ def read_merge_prepare_data(forecast_period, Macro_Data, data_dir=None):
     processed = data_dir / "processed_data"
     forecast_file_path = processed / f"{forecast_period}.csv"
     df = pd.read_csv(forecast_file_path)
+    from settings import config
+    if config("PANEL_FEATURES"):
+        from panel_features import add_panel_features
+        df = add_panel_features(df, forecast_period, forecast_file_path)
 
     df = df.sort_values(by=['permno', 'statpers'], ascending=True)
     df.statpers = pd.to_datetime(df.statpers)
-    Macro_Data = Macro_Data[['GDP_log_return', 'Cons_log_return', 'IPT_log_return', 'Unempl', 'Dates']]
-    Macro_Data = Macro_Data.sort_values(by=['Dates'], ascending=True)
-    Macro_Data.Dates = pd.to_datetime(Macro_Data.Dates)
-
-    Merged_Data = pd.merge_asof(
-        df.set_index('statpers').sort_index(),
-        Macro_Data.set_index('Dates', drop=False).sort_index(),
-        left_index=True,
-        right_index=True,
-        direction='backward'
-    ).drop(columns=['Dates'])
+    if config("MACRO_SOURCE") == "vintage_store":
+        # Macro values as known on each statpers, straight from the vintage store
+        from macro_store import macro_features
+        Merged_Data = df.set_index('statpers').sort_index()
+        features = macro_features(Merged_Data.index).drop(columns=['Dates'])
+        Merged_Data = Merged_Data.assign(**{c: features[c].to_numpy() for c in features.columns})
+    else:
+        Macro_Data = Macro_Data[['GDP_log_return', 'Cons_log_return', 'IPT_log_return', 'Unempl', 'Dates']]
+        Macro_Data = Macro_Data.sort_values(by=['Dates'], ascending=True)
+        Macro_Data.Dates = pd.to_datetime(Macro_Data.Dates)
+
+        Merged_Data = pd.merge_asof(
+            df.set_index('statpers').sort_index(),
+            Macro_Data.set_index('Dates', drop=False).sort_index(),
+            left_index=True,
+            right_index=True,
+            direction='backward'
+        ).drop(columns=['Dates'])
 
     Merged_Data = Merged_Data.reset_index()
     Merged_Data.sort_values(by=['permno', 'rankdate'], ascending=True)
     Merged_Data['Date'] = pd.to_datetime(Merged_Data['rankdate'], format='%Y-%m').dt.to_period('M')
-    from settings import config
     start_year = config("ROLLING_START_YEAR")
     end_year = config("ROLLING_END_YEAR")
     Merged_Data = Merged_Data[(Merged_Data['Date'].dt.year >= start_year) & (Merged_Data['Date'].dt.year <= end_year)].drop(['rankdate'], axis=1)
@@ -122,74 +134,316 @@ def read_merge_prepare_data(forecast_period, Macro_Data, data_dir=None):
     return Merged_Data
 
 
-def train_test_rolling(period, data_frame):
+def grouped_trim_mean(data_frame, by, columns, proportion=0.01):
+    """
+    Trimmed mean of each column within each group, as scipy.stats.trim_mean per group.
+
+    Rows are ordered by group once; each column is then scattered into a
+    (groups x largest group) matrix padded with +inf and sorted along rows in one
+    call, and the int(proportion * n) smallest and largest values of every group
+    are masked out before summing. There is no Python-level call per group. As in
+    trim_mean, a group containing NaN has a NaN mean.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per group (sorted), one column per entry in ``columns``.
+    """
+    if not 0 <= proportion < 0.5:
+        raise ValueError("proportion must be in [0, 0.5)")
+    codes, groups = pd.factorize(data_frame[by], sort=True)
+    counts = np.bincount(codes, minlength=len(groups))
+    cut = (proportion * counts).astype(np.int64)
+    order = np.argsort(codes, kind='stable')
+    sorted_codes = codes[order]
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    rank = np.arange(len(order)) - starts[sorted_codes]
+    width = counts.max() if len(counts) else 0
+    slots = np.arange(width)
+    keep = (slots >= cut[:, None]) & (slots < (counts - cut)[:, None])
+    out = {}
+    for column in columns:
+        values = data_frame[column].to_numpy(dtype=float)
+        padded = np.full((len(groups), width), np.inf)
+        padded[sorted_codes, rank] = values[order]
+        padded.sort(axis=1)
+        means = np.where(keep, padded, 0.0).sum(axis=1) / (counts - 2 * cut)
+        means[np.bincount(codes, weights=np.isnan(values), minlength=len(groups)) > 0] = np.nan
+        out[column] = means
+    return pd.DataFrame(out, index=pd.Index(groups, name=by))
+
+
+def fit_forest_converged(model, X_train, y_train, X_test, step, tol):
+    """
+    Grow ``model`` (a RandomForestRegressor) with warm_start in increments of ``step``
+    trees, up to its ``n_estimators``, until the test predictions settle.
+
+    After each increment the RMS change of the test predictions, relative to the
+    standard deviation of ``y_train``, is compared with ``tol``; growth stops at the
+    first increment below it. The predictions are a running mean over the trees, so
+    each increment predicts with its new trees only. Only the features of the test
+    rows are used, not their outcomes.
+
+    Returns
+    -------
+    (model, np.ndarray, int)
+        Fitted model, its test predictions and the number of trees grown.
+    """
+    max_trees = model.n_estimators
+    scale = float(np.std(y_train)) or 1.0
+    X_eval = np.ascontiguousarray(X_test, dtype=np.float32)
+    model.set_params(warm_start=True)
+    pred = None
+    total = np.zeros(len(X_eval))
+    n_trees = 0
+    while n_trees < max_trees:
+        prev, n_trees = n_trees, min(n_trees + step, max_trees)
+        model.set_params(n_estimators=n_trees)
+        model.fit(X_train, y_train)
+        # Running sum over the trees: each increment predicts with its new trees only
+        for tree in model.estimators_[prev:]:
+            total += tree.predict(X_eval, check_input=False)
+        new_pred = total / n_trees
+        if pred is not None and np.sqrt(np.mean((new_pred - pred) ** 2)) / scale < tol:
+            pred = new_pred
+            break
+        pred = new_pred
+    model.set_params(warm_start=False)
+    return model, pred, n_trees
+
+
+def standardize_into(X, out, mean=None, scale=None):
+    """
+    Write ``(X - mean) / scale`` into the preallocated array ``out`` (same shape).
+
+    Nothing of X's size is allocated: the centered values are written straight into
+    ``out`` and divided in place. Without ``mean`` / ``scale`` the column moments of
+    X are used, as StandardScaler computes them (population std, 1 for constant
+    columns); moments are accumulated in float64.
+
+    Returns
+    -------
+    (np.ndarray, np.ndarray)
+        The float64 ``mean`` and ``scale`` applied.
+    """
+    if mean is None:
+        mean = X.mean(axis=0, dtype=np.float64)
+    np.subtract(X, mean.astype(out.dtype), out=out)
+    if scale is None:
+        var = np.einsum('ij,ij->j', out, out, dtype=np.float64) / max(len(out), 1)
+        scale = np.sqrt(var)
+        scale[scale < 10 * np.finfo(np.float64).eps] = 1.0
+    out /= scale.astype(out.dtype)
+    return mean, scale
+
+
+def ols_fit(X, y, chunk_rows=65536):
+    """
+    OLS coefficients ``[const, b_1, ..., b_k]`` of y on X plus an intercept.
+
+    The normal equations are accumulated in float64 over row chunks, so no
+    (n_rows x k+1) design matrix with a constant column is built, and solved with
+    a pseudo-inverse (as statsmodels' OLS does by default).
+    """
+    k = X.shape[1] + 1
+    xtx = np.zeros((k, k))
+    xty = np.zeros(k)
+    for start in range(0, len(X), chunk_rows):
+        chunk = X[start:start + chunk_rows].astype(np.float64)
+        y_chunk = y[start:start + chunk_rows]
+        xtx[0, 0] += len(chunk)
+        col_sums = chunk.sum(axis=0)
+        xtx[0, 1:] += col_sums
+        xtx[1:, 0] += col_sums
+        xtx[1:, 1:] += chunk.T @ chunk
+        xty[0] += y_chunk.sum()
+        xty[1:] += chunk.T @ y_chunk
+    return np.linalg.pinv(xtx) @ xty
+
+
+def _fitted_scaler(mean, scale, n_samples):
+    """StandardScaler carrying moments computed by standardize_into (for the artifact store)."""
+    from sklearn import preprocessing
+    scaler = preprocessing.StandardScaler()
+    scaler.mean_, scaler.scale_, scaler.var_ = mean, scale, scale ** 2
+    scaler.n_features_in_, scaler.n_samples_seen_ = len(mean), n_samples
+    return scaler
+
+
+_window_state = {}  # per-process: panel, buffers and fit settings for _fit_window_task
+
+
+def _window_buffers(panel, bounds):
+    """Train/test buffers sized for the largest of ``bounds``' windows."""
+    n_features = panel.X.shape[1]
+    train_rows = max([test_lo - lo for _, lo, test_lo, _ in bounds], default=0)
+    test_rows = max([test_hi - test_lo for _, _, test_lo, test_hi in bounds], default=0)
+    return (np.empty((max(train_rows, 1), n_features), dtype=np.float32),
+            np.empty((max(test_rows, 1), n_features), dtype=np.float32))
+
+
+def _fit_window(panel, window, buffers, fit):
+    """Fit RF and OLS on one rolling window of a feature_store.FeaturePanel.
+
+    The train and test rows are standardized into ``buffers``; ``fit`` holds the
+    forest arguments and convergence settings, read from config by the caller.
+
+    Returns
+    -------
+    tuple
+        (forest, RF predictions, OLS predictions, OLS coefficients, trees used,
+        scaler mean, scaler scale, standardized test rows)
+    """
+    from sklearn.ensemble import RandomForestRegressor
+    train_lo, test_lo, test_hi = window
+    X_train = buffers[0][:test_lo - train_lo]
+    X_test = buffers[1][:test_hi - test_lo]
+    y_train = panel.y[train_lo:test_lo]
+    mean, scale = standardize_into(panel.X[train_lo:test_lo], X_train)
+    standardize_into(panel.X[test_lo:test_hi], X_test, mean, scale)
+
+    model = RandomForestRegressor(**fit["rf"])
+    if fit["converge"]:
+        model, pred_rf, n_trees = fit_forest_converged(model, X_train, y_train, X_test, fit["step"], fit["tol"])
+    else:
+        model.fit(X_train, y_train)
+        pred_rf = model.predict(X_test)
+        n_trees = model.n_estimators
+    ols_params = ols_fit(X_train, y_train)
+    return model, pred_rf, ols_params[0] + X_test @ ols_params[1:], ols_params, n_trees, mean, scale, X_test
+
+
+def _init_window_worker(panel_path, bounds, fit, period, store, importances):
+    import feature_store
+    panel = feature_store.attach(panel_path)
+    _window_state.update(panel=panel, buffers=_window_buffers(panel, bounds), fit=fit,
+                         period=period, store=store, importances=importances)
+
+
+def _fit_window_task(task):
+    """Worker: fit one window of the published panel; save its artifacts and measure
+    its importances here, so only predictions and importances go back to the parent."""
+    window, test_date = task
+    state = _window_state
+    panel, period = state["panel"], state["period"]
+    features = panel.features
+    model, pred_rf, pred_lr, ols_params, n_trees, mean, scale, X_test = _fit_window(
+        panel, window, state["buffers"], state["fit"])
+    if state["store"] is not None:
+        state["store"].save(period, test_date, model, scaler=_fitted_scaler(mean, scale, window[1] - window[0]),
+                            features=features, ols_params=ols_params)
+    measured = None
+    if state["importances"] is not None:
+        measured = state["importances"].measure(model, X_test, panel.y[window[1]:window[2]])
+    return pred_rf, pred_lr, n_trees, measured
+
+
+def train_test_rolling(period, data_frame, store=None, importances=None):
     """
     Rolling-window training and testing for RF and OLS.
+
+    The panel is sorted by month (stable) once and held as a feature_store.FeaturePanel:
+    features copied once into a C-contiguous float32 matrix, the dtype sklearn's trees
+    work in, plus per-month row offsets. Each window is a pair of row ranges into that
+    matrix; the standardized train and test rows are written into two buffers
+    allocated once for the largest window, so the forest fits and predicts without
+    converting or copying its input. Predictions are returned for the test rows in
+    that same order.
+
+    With ROLLING_N_WORKERS > 1 the windows are fitted in a process pool: the panel is
+    published to the feature store once and memory-mapped by every worker (one copy
+    in memory whatever the pool size), each worker keeps its own buffers, and each
+    forest runs with n_jobs=1. Results do not depend on the worker count except
+    through the forests' random seeds (none are fixed, as in the serial loop).
+
+    If ``store`` (an artifact_store.ArtifactStore) is given, each window's fitted
+    forest, OLS coefficients, scaler and feature list are saved under
+    (period, test month). If ``importances`` (a feature_importance.ImportanceRecorder)
+    is given, each window's forest importances are recorded under the same key.
+    With RF_CONVERGENCE_ENABLED, each forest is grown by fit_forest_converged
+    (at most RF_N_ESTIMATORS trees) and the trees used per window are returned in
+    the ``rf_n_trees`` column.
     """
+    from tqdm.auto import tqdm
     from settings import config
+    import feature_store
     start_year = config("ROLLING_START_YEAR")
     end_year = config("ROLLING_END_YEAR")
     date_start = f"{start_year}-01"
     date_end = f"{end_year}-12"
     data_frame = data_frame[(data_frame['Date'] >= date_start) & (data_frame['Date'] <= date_end)]
-    start_train = pd.to_datetime(date_start, format='%Y-%m').to_period('M')
+    data_frame = data_frame.sort_values('Date', kind='stable').reset_index(drop=True)
     print(f"Length total df: {len(data_frame)}")
 
-    y_hat_test_RF = pd.Series(dtype=float)
-    y_hat_test_LR = pd.Series(dtype=float)
-
     length_train = config("ROLLING_TRAIN_LENGTH")
     n_loops = config("ROLLING_N_LOOPS")
     if period == 'A2':
         length_train = config("ROLLING_TRAIN_LENGTH_A2")
         n_loops = config("ROLLING_N_LOOPS_A2")
 
-    for i in tqdm(range(0, n_loops)):
-        train_start_date = (start_train.to_timestamp() + pd.DateOffset(months=i)).to_period('M')
-        train_end_date = (start_train.to_timestamp() + pd.DateOffset(months=length_train + i)).to_period('M')
-        train_data = data_frame[(data_frame['Date'] >= train_start_date) & (data_frame['Date'] <= train_end_date)]
-        test_date = (start_train.to_timestamp() + pd.DateOffset(months=length_train + 1 + i)).to_period('M')
-        test_data = data_frame[data_frame['Date'] == test_date]
-
-        if len(test_data) != 0:
-            y_train = train_data['adj_actual']
-            X_train_full = train_data.loc[:, ~train_data.columns.isin(['adj_actual'])]
-            X_test_full = test_data.loc[:, ~test_data.columns.isin(['adj_actual'])]
-            X_train = X_train_full.drop(['Date', 'permno', 'numest'], axis=1)
-            X_test = X_test_full.drop(['Date', 'permno', 'numest'], axis=1)
-
-            scaler = preprocessing.StandardScaler().fit(X_train)
-            X_train = scaler.transform(X_train)
-            X_test = scaler.transform(X_test)
-
-            forest_model_rf = RandomForestRegressor(
-                n_estimators=config("RF_N_ESTIMATORS"),
-                max_depth=config("RF_MAX_DEPTH"),
-                max_samples=config("RF_MAX_SAMPLES"),
-                min_samples_leaf=config("RF_MIN_SAMPLES_LEAF"),
-                n_jobs=config("RF_N_JOBS"),
-            )
-            forest_model_rf.fit(X_train, y_train)
-            pred_rf = forest_model_rf.predict(X_test)
-            y_hat_test_RF = pd.concat([y_hat_test_RF, pd.Series(pred_rf)], ignore_index=True)
-
-            X_train_LR = sm.add_constant(X_train)
-            model_LR = sm.OLS(y_train, X_train_LR)
-            olsres = model_LR.fit()
-            X_test_LR = sm.add_constant(X_test, has_constant='add')
-            y_hat_LR_temp = pd.Series(olsres.predict(X_test_LR))
-            y_hat_test_LR = pd.concat([y_hat_test_LR, y_hat_LR_temp], ignore_index=True)
-
-    result_start_other = f"{start_year + 1}-01"
-    result_start_a2 = f"{start_year + 2}-01"
-    if period == 'A2':
-        result_df = data_frame[(data_frame['Date'] >= result_start_a2) & (data_frame['Date'] <= date_end)].copy()
+    panel = feature_store.FeaturePanel.from_frame(data_frame)
+    features = panel.features
+    bounds = panel.window_bounds(length_train, n_loops)
+    first_test = length_train + 1
+    start_train = pd.Period(date_start, freq='M')
+    test_dates = [str(start_train + i + first_test) for i, _, _, _ in bounds]
+    windows = [(lo, test_lo, test_hi) for _, lo, test_lo, test_hi in bounds]
+
+    workers = config("ROLLING_N_WORKERS") or 1
+    converge = config("RF_CONVERGENCE_ENABLED")
+    fit = {
+        "rf": {
+            "n_estimators": config("RF_N_ESTIMATORS"), "max_depth": config("RF_MAX_DEPTH"),
+            "max_samples": config("RF_MAX_SAMPLES"), "min_samples_leaf": config("RF_MIN_SAMPLES_LEAF"),
+            "n_jobs": config("RF_N_JOBS") if workers <= 1 else 1,
+        },
+        "converge": converge, "step": config("RF_CONVERGENCE_STEP"), "tol": config("RF_CONVERGENCE_TOL"),
+    }
+
+    y_hat_test_RF = []
+    y_hat_test_LR = []
+    n_trees_used = []
+
+    if workers <= 1 or len(windows) < 2:
+        buffers = _window_buffers(panel, bounds)
+        for window, test_date in tqdm(list(zip(windows, test_dates))):
+            model, pred_rf, pred_lr, ols_params, n_trees, mean, scale, X_test = _fit_window(
+                panel, window, buffers, fit)
+            y_hat_test_RF.append(pred_rf)
+            y_hat_test_LR.append(pred_lr)
+            n_trees_used.append(np.full(len(pred_rf), n_trees))
+            train_lo, test_lo, test_hi = window
+            if store is not None:
+                store.save(
+                    period, test_date, model, scaler=_fitted_scaler(mean, scale, test_lo - train_lo),
+                    features=features, ols_params=ols_params,
+                )
+            if importances is not None:
+                importances.record(period, test_date, model, features, X_test, panel.y[test_lo:test_hi])
     else:
-        result_df = data_frame[(data_frame['Date'] >= result_start_other) & (data_frame['Date'] <= date_end)].copy()
-    result_df = result_df.sort_values('Date').reset_index(drop=True)
-    n_test = len(y_hat_test_RF)
-    result_df = result_df.head(n_test).copy()
-    result_df['predicted_adj_actual'] = y_hat_test_RF.values
-    result_df['predicted_adj_actual_LR'] = y_hat_test_LR.values
+        from concurrent.futures import ProcessPoolExecutor
+        with feature_store.publish(panel) as panel_path:
+            initargs = (str(panel_path), bounds, fit, period, store, importances)
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_window_worker,
+                                     initargs=initargs) as ex:
+                results = ex.map(_fit_window_task, zip(windows, test_dates))
+                for test_date, (pred_rf, pred_lr, n_trees, measured) in tqdm(
+                        zip(test_dates, results), total=len(windows)):
+                    y_hat_test_RF.append(pred_rf)
+                    y_hat_test_LR.append(pred_lr)
+                    n_trees_used.append(np.full(len(pred_rf), n_trees))
+                    if measured is not None:
+                        importances.add(period, test_date, features, *measured)
+
+    # Test months are consecutive, so the predicted rows are one contiguous range
+    result_df = data_frame.iloc[panel.month_start(first_test):panel.month_start(first_test + n_loops)].copy()
+    result_df = result_df.reset_index(drop=True)
+    result_df['predicted_adj_actual'] = np.concatenate(y_hat_test_RF) if y_hat_test_RF else np.nan
+    result_df['predicted_adj_actual_LR'] = np.concatenate(y_hat_test_LR) if y_hat_test_LR else np.nan
     result_df['bias_AF_ML'] = (result_df.meanest - result_df.predicted_adj_actual) / result_df.price
+    if converge and n_trees_used:
+        result_df['rf_n_trees'] = np.concatenate(n_trees_used)
+        per_window = [int(t[0]) for t in n_trees_used]
+        print(f"{period}: trees per window min {min(per_window)}, median {int(np.median(per_window))}, "
+              f"max {max(per_window)} (of {config('RF_N_ESTIMATORS')})")
     return result_df
@@ -77,8 +77,8 @@ for _, row in df.iterrows():
     for c in cols[1:]:
         cells.append(latex_cell(row.get(c, "")))
     line = " & ".join(cells) + " \\\\"
-    if row["Horizon"] == "t-stat":
-        line = "\\textit{t-stat} & " + " & ".join(cells[1:]) + " \\\\"
+    if row["Horizon"] in ("t-stat", "CI low", "CI high"):
+        line = "\\textit{" + row["Horizon"] + "} & " + " & ".join(cells[1:]) + " \\\\"
     lines.append(line)
 
 lines.append("\\bottomrule")
@@ -99,8 +99,8 @@ if ext_csv.exists():
         for c in cols[1:]:
             cells.append(latex_cell(row.get(c, "")))
         line = " & ".join(cells) + " \\\\"
-        if row["Horizon"] == "t-stat":
-            line = "\\textit{t-stat} & " + " & ".join(cells[1:]) + " \\\\"
+        if row["Horizon"] in ("t-stat", "CI low", "CI high"):
+            line = "\\textit{" + row["Horizon"] + "} & " + " & ".join(cells[1:]) + " \\\\"
         lines_ext.append(line)
     lines_ext.append("\\bottomrule")
     table2_extended_latex = "\n".join(lines_ext)
@@ -110,7 +110,7 @@ elif ext_txt.exists():
     i = 2  # skip header and separator
     while i < len(raw):
         parts = raw[i].split()
-        if not parts or parts[0] == "Horizon" or parts[0] == "t-stat":
+        if not parts or parts[0] in ("Horizon", "t-stat", "CI"):
             i += 1
             continue
         # data row: horizon + 9 numbers
@@ -0,0 +1,260 @@
+"""
+IBES-CRSP link table as a versioned local artifact, maintained incrementally.
+Depends on: load_data (DATA_DIR/ibes_id.parquet, crsp_stocknames.parquet: WRDS ibes.id
+            and crsp.stocknames), or a WRDS connection when those are missing.
+Outputs: LINK_DIR/v{n}/link.parquet, LINK_DIR/sources/*.parquet, LINK_DIR/manifest.json
+
+The link (IBES ticker -> CRSP permno through the 8-digit cusip, see compute_link) is
+recomputed only when its sources change:
+  - unchanged source files (size, mtime) or unchanged contents: the current version is
+    returned as is;
+  - changed contents: the rows added or removed since the last version are found by
+    row hashes against a snapshot of the previous sources, and only the tickers they
+    touch (directly, or through one of their cusips) are recomputed; every other
+    ticker's link rows are carried over. The result equals a full recompute.
+Each update writes a new version directory and a manifest entry; the last
+LINK_KEEP_VERSIONS versions are kept. With the sources missing, the current version is
+used without contacting WRDS, so data engineering runs offline.
+"""
+import hashlib
+import json
+import shutil
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from settings import config
+
+import pandas as pd
+
+# Local file name -> (WRDS query, date columns)
+SOURCES = {
+    "ibes_id": ("""
+        select ticker, cusip, cname, sdates
+        from ibes.id
+        where usfirm='1' and cusip != ''
+    """, ["sdates"]),
+    "crsp_stocknames": ("""
+        select permno, ncusip, comnam, namedt, nameenddt
+        from crsp.stocknames where ncusip != ''
+    """, ["namedt", "nameenddt"]),
+}
+LINK_COLUMNS = ["ticker", "permno", "ncusip"]
+
+
+def fetch_link_sources(db, data_dir=None):
+    """Pull ibes.id and crsp.stocknames from WRDS into DATA_DIR/{name}.parquet."""
+    data_dir = Path(data_dir or config("DATA_DIR"))
+    data_dir.mkdir(parents=True, exist_ok=True)
+    for name, (query, date_cols) in SOURCES.items():
+        out = data_dir / f"{name}.parquet"
+        db.raw_sql(query, date_cols=date_cols).to_parquet(out, index=False)
+        print(f"Link source saved to {out}")
+
+
+def compute_link(ibes_id, stocknames):
+    """IBES ticker -> CRSP permno link.
+
+    Each (ticker, cusip) keeps its latest ``sdates`` record and each (permno, ncusip)
+    its latest-ending name record; they are matched on cusip = ncusip and each
+    (ticker, permno) keeps the match with the latest IBES date.
+
+    Returns
+    -------
+    pd.DataFrame
+        ``ticker``, ``permno``, ``ncusip``; a ticker's rows depend only on its own
+        ibes.id rows and the stocknames rows of its cusips.
+    """
+    _ibes1 = ibes_id
+    _ibes1_date = _ibes1.groupby(['ticker', 'cusip']).sdates.agg(['min', 'max']).reset_index().rename(
+        columns={'min': 'fdate', 'max': 'ldate'})
+    _ibes2 = pd.merge(_ibes1, _ibes1_date, how='left', on=['ticker', 'cusip'])
+    _ibes2 = _ibes2.sort_values(by=['ticker', 'cusip', 'sdates'])
+    _ibes2 = _ibes2.loc[_ibes2.sdates == _ibes2.ldate].drop(['sdates'], axis=1)
+
+    _crsp1 = stocknames
+    _crsp1_fnamedt = _crsp1.groupby(['permno', 'ncusip']).namedt.min().reset_index()
+    _crsp1_lnameenddt = _crsp1.groupby(['permno', 'ncusip']).nameenddt.max().reset_index()
+    _crsp1_dtrange = pd.merge(_crsp1_fnamedt, _crsp1_lnameenddt, on=['permno', 'ncusip'], how='inner')
+    _crsp1 = _crsp1.drop(['namedt'], axis=1).rename(columns={'nameenddt': 'enddt'})
+    _crsp2 = pd.merge(_crsp1, _crsp1_dtrange, on=['permno', 'ncusip'], how='inner')
+    _crsp2 = _crsp2.loc[_crsp2.enddt == _crsp2.nameenddt].drop(['enddt'], axis=1)
+
+    _link1_1 = pd.merge(_ibes2, _crsp2, how='inner', left_on='cusip', right_on='ncusip').sort_values(
+        ['ticker', 'permno', 'ldate'])
+    _link1_1_tmp = _link1_1.groupby(['ticker', 'permno']).ldate.max().reset_index()
+    _link1_2 = pd.merge(_link1_1, _link1_1_tmp, how='inner', on=['ticker', 'permno', 'ldate'])
+    return _sorted(_link1_2[LINK_COLUMNS])
+
+
+def _sorted(link):
+    return link.sort_values(LINK_COLUMNS, kind='stable').reset_index(drop=True)
+
+
+def _row_hashes(df):
+    return pd.util.hash_pandas_object(df, index=False)
+
+
+def _digest(df):
+    """Order-independent digest of a frame's rows (and column names)."""
+    hashes = _row_hashes(df).sort_values().to_numpy()
+    return hashlib.sha1(",".join(df.columns).encode() + hashes.tobytes()).hexdigest()[:16]
+
+
+def _changed_rows(old, new):
+    """Rows in only one of ``old`` / ``new`` (added, removed, or modified)."""
+    if list(old.columns) != list(new.columns):
+        return None
+    old_h, new_h = _row_hashes(old), _row_hashes(new)
+    return pd.concat([new[~new_h.isin(old_h).to_numpy()], old[~old_h.isin(new_h).to_numpy()]])
+
+
+def affected_tickers(old_ibes, ibes_id, old_names, stocknames):
+    """Tickers whose link may differ between the old and new sources, or None when the
+    source schemas changed (full recompute)."""
+    ibes_changed = _changed_rows(old_ibes, ibes_id)
+    names_changed = _changed_rows(old_names, stocknames)
+    if ibes_changed is None or names_changed is None:
+        return None
+    tickers = set(ibes_changed['ticker'])
+    ncusips = set(names_changed['ncusip'])
+    for ibes in (old_ibes, ibes_id):
+        tickers |= set(ibes.loc[ibes['cusip'].isin(ncusips), 'ticker'])
+    return tickers
+
+
+class LinkStore:
+    """Versioned link artifacts under ``root``.
+
+    Parameters
+    ----------
+    root : path-like
+        Store directory (created if missing).
+    keep : int
+        Versions kept on disk (the manifest keeps the full history).
+    """
+
+    MANIFEST = "manifest.json"
+
+    def __init__(self, root, keep=5):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.keep = keep
+        path = self.root / self.MANIFEST
+        self.manifest = json.loads(path.read_text()) if path.exists() else {"current": None, "versions": []}
+
+    @property
+    def version(self):
+        """Current version number, or None before the first update."""
+        return self.manifest["current"]
+
+    def _version_dir(self, version):
+        return self.root / f"v{version:04d}"
+
+    def current(self):
+        """Current link (``ticker``, ``permno``, ``ncusip``), or None before the first update."""
+        if self.version is None:
+            return None
+        return pd.read_parquet(self._version_dir(self.version) / "link.parquet")
+
+    def _snapshot(self, name):
+        path = self.root / "sources" / f"{name}.parquet"
+        return pd.read_parquet(path) if path.exists() else None
+
+    def update(self, ibes_id, stocknames, files=None):
+        """Link for these sources: the current version if they are unchanged, otherwise
+        a new version recomputed for the affected tickers only.
+
+        Parameters
+        ----------
+        ibes_id, stocknames : pd.DataFrame
+            ibes.id and crsp.stocknames rows (SOURCES columns).
+        files : dict, optional
+            Source name -> [size, mtime_ns] of the files they were read from, stored so
+            an unchanged file can be recognised without reading it (see ``unchanged``).
+        """
+        digests = {"ibes_id": _digest(ibes_id), "crsp_stocknames": _digest(stocknames)}
+        if self.version is not None and self.manifest.get("sources") == digests:
+            self.manifest["files"] = files or {}
+            self._flush()
+            print(f"IBES-CRSP link v{self.version} reused (sources unchanged)")
+            return self.current()
+
+        old_ibes, old_names = self._snapshot("ibes_id"), self._snapshot("crsp_stocknames")
+        tickers = None
+        if self.version is not None and old_ibes is not None and old_names is not None:
+            tickers = affected_tickers(old_ibes, ibes_id, old_names, stocknames)
+        if tickers is None:
+            link = compute_link(ibes_id, stocknames)
+            mode, recomputed = "full", int(ibes_id['ticker'].nunique())
+        else:
+            sub_ibes = ibes_id[ibes_id['ticker'].isin(tickers)]
+            sub_names = stocknames[stocknames['ncusip'].isin(set(sub_ibes['cusip']))]
+            current = self.current()
+            link = _sorted(pd.concat([current[~current['ticker'].isin(tickers)], compute_link(sub_ibes, sub_names)]))
+            mode, recomputed = "incremental", len(tickers)
+        self._write(link, ibes_id, stocknames, digests, files, mode, recomputed)
+        print(f"IBES-CRSP link v{self.version}: {mode}, {recomputed} tickers recomputed, {len(link)} rows")
+        return link
+
+    def unchanged(self, files):
+        """True if a current version exists and was built from files with these stats."""
+        return self.version is not None and bool(files) and self.manifest.get("files") == files
+
+    def _write(self, link, ibes_id, stocknames, digests, files, mode, recomputed):
+        version = (self.version or 0) + 1
+        path = self._version_dir(version)
+        path.mkdir(parents=True, exist_ok=True)
+        link.to_parquet(path / "link.parquet", index=False)
+        sources = self.root / "sources"
+        sources.mkdir(exist_ok=True)
+        for name, df in (("ibes_id", ibes_id), ("crsp_stocknames", stocknames)):
+            df.to_parquet(sources / f"{name}.parquet.tmp", index=False)
+            (sources / f"{name}.parquet.tmp").replace(sources / f"{name}.parquet")
+        self.manifest["versions"].append({
+            "version": version, "created": time.strftime("%Y-%m-%dT%H:%M:%S"), "mode": mode,
+            "tickers_recomputed": recomputed, "rows": len(link), "sources": digests,
+        })
+        self.manifest.update(current=version, sources=digests, files=files or {})
+        self._flush()
+        for old in sorted(self.root.glob("v[0-9]*"))[:-self.keep]:
+            shutil.rmtree(old, ignore_errors=True)
+
+    def _flush(self):
+        tmp = self.root / (self.MANIFEST + ".tmp")
+        tmp.write_text(json.dumps(self.manifest, indent=1))
+        tmp.replace(self.root / self.MANIFEST)
+
+
+def load_link_table(connect=None):
+    """``permno``, ``ncusip`` link for data_engineering, from the local link store.
+
+    Parameters
+    ----------
+    connect : callable, optional
+        Returns a WRDS connection (or None); called only when the link sources are
+        missing in DATA_DIR and no link version is stored.
+
+    Returns
+    -------
+    pd.DataFrame or None
+        None if there are neither local sources, nor a stored link, nor a connection.
+    """
+    data_dir = Path(config("DATA_DIR"))
+    paths = {name: data_dir / f"{name}.parquet" for name in SOURCES}
+    store = LinkStore(config("LINK_DIR"), keep=config("LINK_KEEP_VERSIONS"))
+    if not all(p.exists() for p in paths.values()):
+        if store.version is not None:
+            print(f"Link sources missing; using stored IBES-CRSP link v{store.version} (offline)")
+            return store.current()[['permno', 'ncusip']]
+        db = connect() if connect is not None else None
+        if db is None:
+            return None
+        fetch_link_sources(db, data_dir)
+    files = {name: [p.stat().st_size, p.stat().st_mtime_ns] for name, p in paths.items()}
+    if store.unchanged(files):
+        print(f"IBES-CRSP link v{store.version} reused (source files unchanged)")
+        return store.current()[['permno', 'ncusip']]
+    link = store.update(pd.read_parquet(paths["ibes_id"]), pd.read_parquet(paths["crsp_stocknames"]), files=files)
+    return link[['permno', 'ncusip']]
@@ -1,6 +1,9 @@
 """
-Data loading for Man vs Machine pipeline: WRDS (CRSP, IBES, finratio) and Philadelphia Fed.
-Outputs go to DATA_DIR. Run after settings (config) so DATA_DIR exists.
+Data loading for Man vs Machine pipeline: WRDS (CRSP, IBES, finratio, IBES-CRSP link
+sources) and Philadelphia Fed.
+Outputs go to DATA_DIR; the CRSP / IBES / finratio tables go to the partitioned store in
+WRDS_STORE_DIR and are refreshed incrementally from their date watermarks (wrds_store.py).
+Run after settings (config) so DATA_DIR exists.
 """
 import os
 import sys
@@ -9,84 +12,42 @@ from pathlib import Path
 # ensure src is on path and config available
 sys.path.insert(0, str(Path(__file__).resolve().parent))
 from settings import config
+from profiles import with_profile
+from link_table import fetch_link_sources
+from wrds_store import WrdsRunner, pull_source
 
 import pandas as pd
 from dotenv import load_dotenv
 
 load_dotenv()
 
-DATA_DIR = Path(config("DATA_DIR"))
-
 
 def _fetch_fed_data(url: str, filename: str) -> pd.DataFrame:
     df = pd.read_excel(url)
-    out = DATA_DIR / filename
+    out = Path(config("DATA_DIR")) / filename
     df.to_csv(out)
     print(f"Data saved to {out}")
     return df
 
 
 def fetch_crsp_data(db):
-    """Fetch CRSP stock returns and prices from WRDS."""
-    from settings import config
-    data_start = config("DATA_START_DATE")
-    print("Fetching CRSP data...")
-    crsp = db.raw_sql(f"""
-        SELECT a.permno, a.cusip, a.date, a.cfacshr, ABS(a.prc) AS price, b.shrcd, b.exchcd, a.ret
-        FROM crsp.dsf AS a
-        LEFT JOIN crsp.msenames AS b
-        ON a.permno = b.permno
-        AND b.namedt <= a.date
-        AND a.date <= b.nameendt
-        WHERE a.cusip != ''
-        AND a.date >= '{data_start}'
-        AND (b.exchcd IN ('1', '2', '3'))
-        AND (b.shrcd IN ('10', '11'))
-    """)
-    out = DATA_DIR / "crsp.csv"
-    crsp.to_csv(out)
-    print(f"CRSP data saved to {out}")
-    return crsp
+    """Fetch CRSP stock returns and prices from WRDS into the local store (incremental)."""
+    return pull_source(WrdsRunner(db), "crsp")
 
 
 def fetch_ibes_summary(db):
-    """Fetch IBES summary (analyst estimates and actuals)."""
-    from settings import config
-    data_start = config("DATA_START_DATE")
-    print("Fetching IBES summary data...")
-    ibes_summary = db.raw_sql(f"""
-        SELECT ticker, cusip, cname, fpedats, statpers, meanest, fpi, numest, actual, anndats_act
-        FROM ibes.statsum_epsus
-        WHERE cusip != ''
-        AND usfirm = '1'
-        AND fpedats >= '{data_start}'
-        AND (fpi IN ('1', '2', '6', '7', '8'))
-    """)
-    out = DATA_DIR / "ibes_summary.csv"
-    ibes_summary.to_csv(out)
-    print(f"IBES summary saved to {out}")
-    return ibes_summary
+    """Fetch IBES summary (analyst estimates and actuals) into the local store (incremental)."""
+    return pull_source(WrdsRunner(db), "ibes_summary")
 
 
 def fetch_financial_ratios(db):
-    """Fetch financial ratios from WRDS."""
-    from settings import config
-    data_start = config("DATA_START_DATE")
-    print("Fetching financial ratios...")
-    finratio = db.raw_sql(f"""
-        SELECT *
-        FROM wrdsapps_finratio_ibes.firm_ratio_ibes
-        WHERE cusip != ''
-        AND public_date >= '{data_start}'
-    """)
-    out = DATA_DIR / "finratio.csv"
-    finratio.to_csv(out)
-    print(f"Financial ratios saved to {out}")
-    return finratio
+    """Fetch financial ratios from WRDS into the local store (incremental)."""
+    return pull_source(WrdsRunner(db), "finratio")
 
 
+@with_profile
 def main():
-    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    Path(config("DATA_DIR")).mkdir(parents=True, exist_ok=True)
 
     try:
         import wrds
@@ -108,18 +69,10 @@ def main():
     fetch_crsp_data(db)
     fetch_ibes_summary(db)
     fetch_financial_ratios(db)
+    fetch_link_sources(db)
 
-    real_gdp_url = "https://www.philadelphiafed.org/-/media/frbp/assets/surveys-and-data/real-time-data/data-files/xlsx/routputmvqd.xlsx?la=en&hash=403C8B9FD72B33F83C1EE5C59D015C86"
-    _fetch_fed_data(real_gdp_url, "real_GDP_FED.csv")
-
-    ipt_url = "https://www.philadelphiafed.org/-/media/frbp/assets/surveys-and-data/real-time-data/data-files/xlsx/iptmvmd.xlsx?la=en&hash=E53F4C735866E2366E50511D5C9CCADE"
-    _fetch_fed_data(ipt_url, "IPT_FED.csv")
-
-    personal_consumption_url = "https://www.philadelphiafed.org/-/media/frbp/assets/surveys-and-data/real-time-data/data-files/xlsx/rconmvqd.xlsx?la=en&hash=9F7B44DB227E6A620629495229CD93BB"
-    _fetch_fed_data(personal_consumption_url, "real_personal_consumption_FED.csv")
-
-    unemployment_url = "https://www.philadelphiafed.org/-/media/frbp/assets/surveys-and-data/real-time-data/data-files/xlsx/rucqvmd.xlsx?la=en&hash=FF1D4C67E144D916C1986A8EEDC4B42A"
-    _fetch_fed_data(unemployment_url, "Unemployment_FED.csv")
+    for spec in config("MACRO_SERIES").values():
+        _fetch_fed_data(spec["url"], spec["file"])
 
     print("Pipeline load_data done.")
 
@@ -0,0 +1,212 @@
+"""
+Vintage-aware macro feature store: the Philadelphia Fed real-time files kept as
+vintage matrices, queried as of any date.
+Depends on: load_data (the MACRO_SERIES files in DATA_DIR).
+Outputs: MACRO_STORE_DIR/{series}.npz
+
+A VintageMatrix holds one series' whole real-time history in three arrays: vintage
+month codes (ascending), observation month codes, and ``values[t, v]`` = observation t
+as published in vintage v (NaN before it was published). The last published row of
+each vintage and the first vintage of each observation are precomputed, so "value of
+X as known at t" is one ``searchsorted`` over the vintages (O(log n)) and a lookup.
+
+Series are declared in MACRO_SERIES (file, vintage column prefix, transform, dating);
+vintage columns are found by name (PREFIX{yy}M{m} / PREFIX{yy}Q{q}) and observations
+by their DATE labels, so a new series needs no row or column offsets. A matrix is
+re-parsed only when its source file or spec changes.
+
+With MACRO_SOURCE = "vintage_store", read_merge_prepare_data takes its macro features
+from macro_features(statpers). The "log_return" transform follows PrepareMacro (change
+of the latest-known value between consecutive vintages), but takes the true last
+published row of each vintage; PrepareMacro's row pick agrees only while a vintage has
+fewer published rows than missing ones.
+"""
+import re
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from settings import config
+
+import numpy as np
+import pandas as pd
+
+TRANSFORMS = ("level", "diff", "log_return")
+
+
+def _month_codes(dates):
+    """Months since year 0 (year * 12 + month - 1) of datetime-like values."""
+    dates = pd.DatetimeIndex(pd.to_datetime(dates))
+    return (dates.year * 12 + dates.month - 1).to_numpy(np.int64)
+
+
+def _code_dates(codes):
+    codes = np.asarray(codes, np.int64)
+    return pd.to_datetime(pd.DataFrame({"year": codes // 12, "month": codes % 12 + 1, "day": 1}))
+
+
+def _vintage_code(column, prefix):
+    """Month code of a vintage column (ROUTPUT65M11 -> 1965-11, RUC99Q4 -> 1999-11), or
+    None. Two-digit years from 60 are 19xx; quarterly vintages sit in the quarter's
+    middle month."""
+    m = re.fullmatch(re.escape(prefix) + r"(\d{2})([MQ])(\d{1,2})", str(column))
+    if m is None:
+        return None
+    yy, kind, n = int(m[1]), m[2], int(m[3])
+    year = 1900 + yy if yy >= 60 else 2000 + yy
+    month = n if kind == "M" else 3 * n - 1
+    return year * 12 + month - 1
+
+
+def _observation_code(label):
+    """Month code of a DATE label (1947:Q1 -> 1947-01, 1947:01 -> 1947-01)."""
+    m = re.fullmatch(r"(\d{4}):(Q?)(\d{1,2})", str(label).strip())
+    if m is None:
+        raise ValueError(f"unrecognised observation label {label!r}")
+    year, n = int(m[1]), int(m[3])
+    return year * 12 + (3 * (n - 1) if m[2] else n - 1)
+
+
+class VintageMatrix:
+    """One series' real-time vintages.
+
+    Parameters
+    ----------
+    vintages : array-like of int
+        Vintage month codes, ascending.
+    observations : array-like of int
+        Observation month codes, ascending.
+    values : array-like, shape (observations, vintages)
+        ``values[t, v]``: observation t as published in vintage v, NaN if unpublished.
+    """
+
+    def __init__(self, vintages, observations, values):
+        self.vintages = np.asarray(vintages, np.int64)
+        self.observations = np.asarray(observations, np.int64)
+        self.values = np.asarray(values, np.float64)
+        published = ~np.isnan(self.values)
+        n_obs = len(self.observations)
+        self.last_row = np.where(published.any(axis=0), n_obs - 1 - published[::-1].argmax(axis=0), -1)
+        self.first_vintage = np.where(published.any(axis=1), published.argmax(axis=1), -1)
+
+    @classmethod
+    def from_fed_csv(cls, path, prefix):
+        """Parse a Philadelphia Fed real-time file (as saved by load_data): a DATE column
+        of observation labels and one column per vintage named PREFIX{yy}M{m}/Q{q}."""
+        raw = pd.read_csv(path, index_col=0)
+        columns = {c: _vintage_code(c, prefix) for c in raw.columns}
+        columns = sorted(((code, c) for c, code in columns.items() if code is not None))
+        if not columns:
+            raise ValueError(f"{path}: no vintage columns named {prefix}{{yy}}M{{m}} or {prefix}{{yy}}Q{{q}}")
+        raw = raw.dropna(subset=["DATE"])
+        observations = np.array([_observation_code(d) for d in raw["DATE"]], np.int64)
+        values = raw[[c for _, c in columns]].apply(pd.to_numeric, errors="coerce").to_numpy(np.float64)
+        order = np.argsort(observations, kind="stable")
+        return cls([code for code, _ in columns], observations[order], values[order])
+
+    def save(self, path, key=""):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path.with_suffix(".tmp"), "wb") as f:
+            np.savez(f, vintages=self.vintages, observations=self.observations, values=self.values, key=np.array(key))
+        path.with_suffix(".tmp").replace(path)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        """(matrix, key) from a saved .npz."""
+        with np.load(path) as f:
+            return cls(f["vintages"], f["observations"], f["values"]), str(f["key"])
+
+    def vintage_at(self, dates):
+        """Index of the latest vintage published by each date (-1 before the first)."""
+        return np.searchsorted(self.vintages, _month_codes(dates), side="right") - 1
+
+    def as_of(self, date):
+        """The observations as known at ``date`` (pd.Series by observation month)."""
+        v = self.vintage_at([date])[0]
+        if v < 0:
+            return pd.Series(dtype=float)
+        column = pd.Series(self.values[:, v], index=_code_dates(self.observations))
+        return column.dropna()
+
+    def latest(self):
+        """Per vintage, the value of its last published observation."""
+        out = np.full(len(self.vintages), np.nan)
+        has = self.last_row >= 0
+        out[has] = self.values[self.last_row[has], np.flatnonzero(has)]
+        return out
+
+    def first_release(self):
+        """Per observation, the value it was first published with."""
+        out = np.full(len(self.observations), np.nan)
+        has = self.first_vintage >= 0
+        out[has] = self.values[np.flatnonzero(has), self.first_vintage[has]]
+        return out
+
+    def series(self, transform="level", dating="vintage"):
+        """(month codes, values) of the transformed series; NaNs dropped.
+
+        ``dating="vintage"`` gives the latest-known value at each vintage,
+        ``"observation"`` each observation's first release at its own month.
+        """
+        if transform not in TRANSFORMS:
+            raise ValueError(f"transform must be one of {TRANSFORMS}, got {transform!r}")
+        if dating == "vintage":
+            codes, x = self.vintages, self.latest()
+        elif dating == "observation":
+            codes, x = self.observations, self.first_release()
+        else:
+            raise ValueError(f"dating must be 'vintage' or 'observation', got {dating!r}")
+        if transform == "diff":
+            x = np.r_[np.nan, np.diff(x)]
+        elif transform == "log_return":
+            with np.errstate(divide="ignore", invalid="ignore"):
+                x = np.r_[np.nan, np.log(x[1:] / x[:-1])]
+        keep = ~np.isnan(x)
+        return codes[keep], x[keep]
+
+
+def feature_name(name, spec):
+    transform = spec.get("transform", "level")
+    return name if transform == "level" else f"{name}_{transform}"
+
+
+def load_series(name, data_dir=None, store_dir=None):
+    """The VintageMatrix of MACRO_SERIES[name], re-parsed only if its file or spec changed."""
+    spec = config("MACRO_SERIES")[name]
+    source = Path(data_dir or config("DATA_DIR")) / spec["file"]
+    path = Path(store_dir or config("MACRO_STORE_DIR")) / f"{name}.npz"
+    key = f"{source.stat().st_size}:{source.stat().st_mtime_ns}:{spec['prefix']}"
+    if path.exists():
+        matrix, stored_key = VintageMatrix.load(path)
+        if stored_key == key:
+            return matrix
+    matrix = VintageMatrix.from_fed_csv(source, spec["prefix"])
+    matrix.save(path, key=key)
+    print(f"Macro series {name}: {len(matrix.observations)} observations x {len(matrix.vintages)} vintages -> {path}")
+    return matrix
+
+
+def macro_features(dates, data_dir=None, store_dir=None):
+    """Each MACRO_SERIES feature as known at each of ``dates``.
+
+    Returns
+    -------
+    pd.DataFrame
+        ``Dates`` and one column per series (see feature_name), row i as of dates[i];
+        NaN before a series' first value.
+    """
+    codes = _month_codes(dates)
+    out = pd.DataFrame({"Dates": pd.to_datetime(dates).to_numpy()})
+    for name, spec in config("MACRO_SERIES").items():
+        months, x = load_series(name, data_dir, store_dir).series(spec.get("transform", "level"),
+                                                                  spec.get("dating", "vintage"))
+        i = np.searchsorted(months, codes, side="right") - 1
+        out[feature_name(name, spec)] = np.where(i >= 0, x[np.maximum(i, 0)], np.nan) if len(x) else np.nan
+    return out
+
+
+def build_store(data_dir=None, store_dir=None):
+    """Parse (or confirm up to date) every MACRO_SERIES matrix; returns {name: matrix}."""
+    return {name: load_series(name, data_dir, store_dir) for name in config("MACRO_SERIES")}
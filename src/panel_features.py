@@ -0,0 +1,176 @@
+"""
+Firm-history features on the processed horizon panels: grouped lags, differences and
+rolling statistics by permno over calendar months, declared in PANEL_FEATURES.
+Depends on: data_engineering (processed_data/{period}.csv).
+Outputs: processed_data/panel_features/{period}_{key}.parquet (cache)
+
+Rows are sorted once by (permno, statpers month) into one int64 key per row, spaced so
+that no offset crosses into the next firm. A k-month lag is then one ``searchsorted``
+of key - k (an exact-month match, so gaps in a firm's history give NaN rather than an
+older row), and a rolling statistic over the months (t - k, t] adds up the k monthly
+aggregates found the same way, one vectorized pass per month offset (direct sums, so
+the precision does not degrade with the panel size). No Python code runs per firm.
+
+Specs (PANEL_FEATURES, name -> spec):
+    column   panel column (must be known at statpers; the target is refused)
+    op       "lag", "diff", "pct_change", "rolling_mean", "rolling_std" or "rolling_sum"
+    periods  months (lag distance, or rolling window length including the current month)
+    min_periods  rolling only: values required in the window (default: periods)
+    fill     value for missing results (default NaN; read_merge_prepare_data drops rows
+             with NaN, so set a fill to keep firms without enough history)
+
+read_merge_prepare_data adds the declared columns to each horizon panel; they are
+computed once per panel file and spec and cached next to the processed panels.
+"""
+import hashlib
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from settings import config
+
+import numpy as np
+import pandas as pd
+
+OPS = ("lag", "diff", "pct_change", "rolling_mean", "rolling_std", "rolling_sum")
+TARGET = "adj_actual"
+
+
+def _month_codes(dates):
+    dates = pd.DatetimeIndex(pd.to_datetime(dates))
+    return (dates.year * 12 + dates.month - 1).to_numpy(np.int64)
+
+
+class PanelIndex:
+    """Rows of a panel sorted by (group, month), with one int64 key per sorted row.
+
+    Parameters
+    ----------
+    groups : array-like
+        Firm identifier per row (e.g. permno).
+    months : array-like of int
+        Month code per row.
+    max_offset : int
+        Largest lag / window the keys must keep inside a firm.
+    """
+
+    def __init__(self, groups, months, max_offset):
+        codes = pd.factorize(pd.Series(groups))[0].astype(np.int64)
+        months = np.asarray(months, np.int64)
+        months = months - months.min(initial=0)
+        self.order = np.lexsort((months, codes))
+        span = months.max(initial=0) + 1 + max_offset
+        self.key = codes[self.order] * span + months[self.order]
+        # Cells: distinct (group, month) keys, their first sorted row, each sorted row's cell
+        self.cell_key, self.cell_start, self.cell_of_row = np.unique(self.key, return_index=True, return_inverse=True)
+
+    def _scatter(self, values):
+        out = np.empty_like(values)
+        out[self.order] = values
+        return out
+
+    def lag(self, x, periods):
+        """x of the same group exactly ``periods`` months earlier (last such row), else NaN."""
+        xs = np.asarray(x, np.float64)[self.order]
+        target = self.key - periods
+        pos = np.searchsorted(self.key, target, side="right") - 1
+        hit = (pos >= 0) & (self.key[np.maximum(pos, 0)] == target)
+        return self._scatter(np.where(hit, xs[np.maximum(pos, 0)], np.nan))
+
+    def rolling(self, x, periods, stat="mean", min_periods=None):
+        """``stat`` of the group's non-missing x over the months (t - periods, t]."""
+        if stat not in ("sum", "mean", "std"):
+            raise ValueError(f"unknown rolling stat {stat!r}")
+        xs = np.asarray(x, np.float64)[self.order]
+        valid = ~np.isnan(xs)
+        # Per (group, month): count, sum and squared deviations of its rows
+        count = np.add.reduceat(valid.astype(np.int64), self.cell_start)
+        total = np.add.reduceat(np.where(valid, xs, 0.0), self.cell_start)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = np.where(count > 0, total / count, 0.0)
+        # Window sums: one pass per month offset, each term a direct sum (no running totals)
+        n, s = np.zeros(len(self.cell_key), np.int64), np.zeros(len(self.cell_key))
+        for rows, pos in self._offsets(periods):
+            n[rows] += count[pos]
+            s[rows] += total[pos]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            out = s if stat == "sum" else s / n
+            if stat == "std":
+                dev = np.add.reduceat(np.where(valid, xs - mean[self.cell_of_row], 0.0) ** 2, self.cell_start)
+                m2 = np.zeros(len(self.cell_key))
+                for rows, pos in self._offsets(periods):
+                    m2[rows] += dev[pos] + count[pos] * (mean[pos] - out[rows]) ** 2
+                out = np.sqrt(m2 / (n - 1))
+        out = np.where(n < (periods if min_periods is None else min_periods), np.nan, out)
+        return self._scatter(out[self.cell_of_row])
+
+    def _offsets(self, periods):
+        """(cells, the same group's cell j months earlier) index pairs, j = 0 .. periods - 1."""
+        for j in range(periods):
+            pos = np.minimum(np.searchsorted(self.cell_key, self.cell_key - j), len(self.cell_key) - 1)
+            rows = np.flatnonzero(self.cell_key[pos] == self.cell_key - j)
+            yield rows, pos[rows]
+
+
+def _validate(name, spec):
+    if spec.get("op") not in OPS:
+        raise ValueError(f"PANEL_FEATURES[{name!r}]: op must be one of {OPS}")
+    if spec.get("column") == TARGET:
+        raise ValueError(f"PANEL_FEATURES[{name!r}]: {TARGET} is the target, not known at statpers")
+    if int(spec.get("periods", 0)) < 1:
+        raise ValueError(f"PANEL_FEATURES[{name!r}]: periods must be >= 1")
+
+
+def compute_panel_features(df, features, by="permno", date="statpers"):
+    """The declared features for ``df`` (same index), one column per spec.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Horizon panel with ``by``, ``date`` and the spec columns.
+    features : dict
+        Feature name -> spec (see module docstring).
+    """
+    for name, spec in features.items():
+        _validate(name, spec)
+    index = PanelIndex(df[by].to_numpy(), _month_codes(df[date]),
+                       max((int(s["periods"]) for s in features.values()), default=0))
+    out = {}
+    for name, spec in features.items():
+        x, op, k = df[spec["column"]].to_numpy(np.float64), spec["op"], int(spec["periods"])
+        if op.startswith("rolling_"):
+            values = index.rolling(x, k, op[len("rolling_"):], spec.get("min_periods"))
+        else:
+            lagged = index.lag(x, k)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                values = {"lag": lagged, "diff": x - lagged, "pct_change": x / lagged - 1}[op]
+            values = np.where(np.isinf(values), np.nan, values)
+        if spec.get("fill") is not None:
+            values = np.where(np.isnan(values), spec["fill"], values)
+        out[name] = values
+    return pd.DataFrame(out, index=df.index)
+
+
+def add_panel_features(df, period, source):
+    """``df`` (read from ``source``, the period's processed CSV, in file order) with the
+    PANEL_FEATURES columns, cached per source file and spec."""
+    features = config("PANEL_FEATURES")
+    if not features:
+        return df
+    source = Path(source)
+    key = hashlib.sha1(f"{source.resolve()}:{source.stat().st_size}:{source.stat().st_mtime_ns}:"
+                       f"{json.dumps(features, sort_keys=True, default=str)}".encode()).hexdigest()[:12]
+    cache_dir = source.parent / "panel_features"
+    path = cache_dir / f"{period}_{key}.parquet"
+    if path.exists():
+        computed = pd.read_parquet(path)
+        computed.index = df.index
+    else:
+        computed = compute_panel_features(df, features)
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        for old in cache_dir.glob(f"{period}_*.parquet"):
+            old.unlink()
+        computed.reset_index(drop=True).to_parquet(path, index=False)
+        print(f"{period}: {len(features)} panel features cached to {path}")
+    return df.assign(**{c: computed[c] for c in computed.columns})
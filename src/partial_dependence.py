@@ -1,15 +1,36 @@
 """
-Partial Dependence Plot: Realized EPS vs Analysts' Forecast (meanest).
-Depends on: data_engineering (processed_data/macro_data.csv, Q1.csv).
-Outputs: OUTPUT_DIR/images/partial_dependence_meanest.png
+Partial Dependence Plots: Realized EPS vs Analysts' Forecast (meanest) and other features.
+Depends on: data_engineering (processed_data/macro_data.csv, A1..Q3.csv).
+Outputs: OUTPUT_DIR/images/partial_dependence_meanest.png (Figure 1, PDP_DEFAULT_PERIOD)
+         OUTPUT_DIR/images/pdp/{period}_{feature}.png and {period}_{f1}_x_{f2}.png
+           for PDP_FEATURES / PDP_INTERACTIONS across PDP_PERIODS
+
+One full-sample forest per horizon is fitted and cached under PDP_MODEL_DIR; all
+figures for that horizon reuse it.
+
+The average curve and the ICE spread behind the 95% band come from one engine
+(compute_partial_dependence): the average via tree traversal (sklearn's "recursion"
+method) when the model supports it, and the ICE standard deviation from a streaming,
+row-chunked brute pass over at most PDP_ICE_MAX_ROWS rows, so the n_rows x grid ICE
+matrix is never held in memory.
+
+Usage: python partial_dependence.py [--figure1 | --period Q1 [--period A2 ...]]
+(no options: Figure 1 and the full grid)
 """
+import argparse
+import hashlib
+import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).resolve().parent))
 from settings import config
 from functions import read_merge_prepare_data
+from feature_store import PREP_KEYS
+from profiles import current_profile, use_profile, with_profile
 
+import joblib
 import pandas as pd
 import numpy as np
 import matplotlib
@@ -20,24 +41,155 @@ from sklearn.inspection import partial_dependence
 from sklearn import preprocessing
 from scipy.stats.mstats import winsorize
 
-DATA_DIR = Path(config("DATA_DIR"))
-OUTPUT_DIR = Path(config("OUTPUT_DIR"))
-IMAGES_DIR = Path(config("IMAGES_DIR"))
-IMAGES_DIR.mkdir(parents=True, exist_ok=True)
 
+def _feature_grid(values, grid_resolution, percentiles=(0, 1)):
+    """Grid over one feature, as sklearn builds it (unique values if fewer than the resolution)."""
+    uniques = np.unique(values)
+    if len(uniques) < grid_resolution:
+        return uniques
+    lo, hi = np.quantile(values, percentiles)
+    return np.linspace(lo, hi, grid_resolution)
 
-def run_partial_dependence(period=None):
-    from settings import config
-    if period is None:
-        period = config("PDP_DEFAULT_PERIOD")
+
+def _supports_recursion(model):
+    from sklearn.ensemble import GradientBoostingRegressor, HistGradientBoostingRegressor
+    from sklearn.tree import DecisionTreeRegressor
+    return isinstance(model, (RandomForestRegressor, GradientBoostingRegressor,
+                              HistGradientBoostingRegressor, DecisionTreeRegressor))
+
+
+def _ice_moments(model, X, feature_idx, grid, chunk_rows):
+    """Mean and standard deviation over rows of the ICE curves, streamed in row chunks.
+
+    Each chunk of ``chunk_rows`` rows is expanded to ``chunk_rows * len(grid)`` rows for
+    one ``predict`` call; chunk moments are merged with Chan et al.'s parallel update so
+    only O(len(grid)) state is kept.
+    """
+    columns = getattr(model, "feature_names_in_", None)
+    n_grid = len(grid)
+    count, mean, m2 = 0, np.zeros(n_grid), np.zeros(n_grid)
+    for start in range(0, len(X), chunk_rows):
+        chunk = X[start:start + chunk_rows]
+        expanded = np.repeat(chunk, n_grid, axis=0)
+        expanded[:, feature_idx] = np.tile(grid, len(chunk))
+        if columns is not None:
+            expanded = pd.DataFrame(expanded, columns=columns)
+        ice = model.predict(expanded).reshape(len(chunk), n_grid)
+        n_b, mean_b = len(chunk), ice.mean(axis=0)
+        m2_b = ((ice - mean_b) ** 2).sum(axis=0)
+        delta = mean_b - mean
+        total = count + n_b
+        mean = mean + delta * n_b / total
+        m2 = m2 + m2_b + delta ** 2 * count * n_b / total
+        count = total
+    return mean, np.sqrt(m2 / count)
+
+
+def compute_partial_dependence(
+    model,
+    X,
+    feature_idx,
+    grid_resolution=100,
+    percentiles=(0, 1),
+    method="auto",
+    ice_max_rows=None,
+    chunk_rows=1000,
+    seed=None,
+):
+    """Partial dependence of ``model`` on one feature with the ICE spread, in one pass.
+
+    Parameters
+    ----------
+    model : fitted regressor
+    X : array-like, shape (n_rows, n_features)
+    feature_idx : int
+    method : {"auto", "recursion", "brute"}
+        "recursion" takes the average from tree traversal (tree ensembles only);
+        "brute" averages the ICE curves; "auto" uses recursion when supported.
+    ice_max_rows : int, optional
+        Rows sampled (without replacement) for the ICE moments; None uses all rows.
+    chunk_rows : int
+        Rows per ``predict`` batch; bounds memory at ``chunk_rows * grid`` rows.
+
+    Returns
+    -------
+    dict
+        ``grid``, ``average``, ``ice_std`` (std over rows of the ICE curves), ``n_rows``
+        (rows in X, for the standard error), ``n_ice`` (rows used for ``ice_std``).
+    """
+    X_arr = np.asarray(X, dtype=float)
+    n_rows = len(X_arr)
+    if method == "auto":
+        method = "recursion" if _supports_recursion(model) else "brute"
+
+    if method == "recursion":
+        pd_res = partial_dependence(
+            model, X, [feature_idx], kind="average", method="recursion",
+            grid_resolution=grid_resolution, percentiles=percentiles,
+        )
+        grid, average = pd_res["grid_values"][0], pd_res["average"][0]
+    elif method == "brute":
+        grid, average = _feature_grid(X_arr[:, feature_idx], grid_resolution, percentiles), None
+    else:
+        raise ValueError(f"Unknown PDP method: {method!r} (use 'auto', 'recursion' or 'brute')")
+
+    rows = X_arr
+    if ice_max_rows is not None and ice_max_rows < n_rows:
+        rng = np.random.default_rng(seed)
+        rows = X_arr[np.sort(rng.choice(n_rows, size=ice_max_rows, replace=False))]
+    ice_mean, ice_std = _ice_moments(model, rows, feature_idx, grid, chunk_rows)
+    if average is None:
+        average = ice_mean
+    return {"grid": grid, "average": average, "ice_std": ice_std, "n_rows": n_rows, "n_ice": len(rows)}
+
+
+def _pdp_model_paths(period):
+    """Cache paths (model, design matrix) for a horizon, keyed by inputs and RF settings.
+
+    The key covers the processed inputs (size + mtime), the RF hyperparameters,
+    winsorization and the settings that shape the design matrix (feature_store.PREP_KEYS:
+    sample bounds, dropped and trimmed columns, macro and panel features), so any change
+    forces a refit. File
+    names also carry a digest of PROCESSED_DIR, so profiles with separate data can
+    share PDP_MODEL_DIR without evicting each other's models.
+    """
+    processed = Path(config("PROCESSED_DIR")).resolve()
+    source = hashlib.sha1(str(processed).encode()).hexdigest()[:8]
+    inputs = [processed / f"{period}.csv", processed / "macro_data.csv"]
+    key_parts = [period] + [f"{p}:{p.stat().st_size}:{p.stat().st_mtime_ns}" for p in inputs]
+    key_parts += [str(config(k)) for k in (
+        "RF_N_ESTIMATORS", "RF_MAX_DEPTH", "RF_MAX_SAMPLES", "WINSORIZE_LIMITS",
+    )]
+    key_parts += [repr(config(k)) for k in PREP_KEYS]
+    key = hashlib.sha1("|".join(key_parts).encode()).hexdigest()[:12]
+    model_dir = Path(config("PDP_MODEL_DIR"))
+    return model_dir / f"{period}_rf_{source}_{key}.joblib", model_dir / f"{period}_X_{source}_{key}.npy"
+
+
+def fit_pdp_model(period):
+    """Full-sample RF for one horizon's PDPs, fitted once and cached on disk.
+
+    The model (with feature names) is stored as compressed joblib; the standardized
+    design matrix is stored as a plain ``.npy`` so PDP workers can memory-map it.
+
+    Returns
+    -------
+    (Path, Path) or None
+        Model and design-matrix paths; None if inputs are missing.
+    """
     macro_path = Path(config("PROCESSED_DIR")) / "macro_data.csv"
-    if not macro_path.exists():
-        print("Missing", macro_path)
-        return
+    if not macro_path.exists() or not (Path(config("PROCESSED_DIR")) / f"{period}.csv").exists():
+        print("Missing processed data for", period)
+        return None
+    model_path, X_path = _pdp_model_paths(period)
+    if model_path.exists() and X_path.exists():
+        print(f"{period}: using cached PDP model {model_path.name}")
+        return model_path, X_path
+
     Macro_Data = pd.read_csv(macro_path)
-    df = read_merge_prepare_data(period, Macro_Data, data_dir=DATA_DIR)
+    df = read_merge_prepare_data(period, Macro_Data)
     if df is None or len(df) == 0:
-        return
+        return None
 
     X = df.drop(columns=['adj_actual', 'Date', 'permno', 'numest']).copy()
     y = df['adj_actual'].copy()
@@ -51,7 +203,6 @@ def run_partial_dependence(period=None):
     X_scaled = scaler.transform(X)
     X_scaled = pd.DataFrame(X_scaled, columns=X.columns)
 
-    meanest_idx = list(X.columns).index('meanest') if 'meanest' in X.columns else 0
     rf_model = RandomForestRegressor(
         n_estimators=config("RF_N_ESTIMATORS"),
         max_depth=config("RF_MAX_DEPTH"),
@@ -63,22 +214,31 @@ def run_partial_dependence(period=None):
     )
     rf_model.fit(X_scaled, y)
 
-    pdp_results = partial_dependence(
-        rf_model, X_scaled, [meanest_idx],
-        kind='average', grid_resolution=config("PDP_GRID_RESOLUTION"), percentiles=(0, 1)
-    )
-    x_vals = pdp_results['grid_values'][0]
-    y_vals = pdp_results['average'][0]
+    model_path.parent.mkdir(parents=True, exist_ok=True)
+    source = model_path.stem.split("_")[-2]
+    for stale in model_path.parent.glob(f"{period}_*_{source}_*"):
+        stale.unlink()
+    joblib.dump(rf_model, model_path, compress=3)
+    np.save(X_path, X_scaled.to_numpy())
+    print(f"{period}: PDP model cached to {model_path}")
+    return model_path, X_path
 
-    # ICE for 95% confidence interval (notebook style)
-    ice_results = partial_dependence(
-        rf_model, X_scaled, [meanest_idx],
-        kind='individual', grid_resolution=config("PDP_GRID_RESOLUTION"), percentiles=(0, 1)
-    )
-    ice_lines = ice_results['individual'][0]
-    n_samples = ice_lines.shape[0]
-    std_dev = np.std(ice_lines, axis=0)
-    sem = std_dev / np.sqrt(n_samples)
+
+def _load_pdp_model(model_path, X_path):
+    model = joblib.load(model_path)
+    # Workers already run in parallel; avoid oversubscribing cores inside predict
+    model.n_jobs = 1
+    X = pd.DataFrame(np.load(X_path, mmap_mode='r'), columns=model.feature_names_in_)
+    return model, X
+
+
+def _plot_figure1(pdp, out):
+    """Paper-style Figure 1 (meanest) with the 95% band from the ICE spread."""
+    x_vals = pdp["grid"]
+    y_vals = pdp["average"]
+
+    # 95% confidence interval from the ICE spread (notebook style: std / sqrt(n_rows))
+    sem = pdp["ice_std"] / np.sqrt(pdp["n_rows"])
     margin_of_error = 1.96 * sem
     upper = y_vals + margin_of_error
     lower = y_vals - margin_of_error
@@ -96,11 +256,145 @@ def run_partial_dependence(period=None):
     ax.grid(True, linestyle='--', alpha=0.5)
     ax.set_facecolor('#f0f0f0')
     plt.tight_layout()
-    out = IMAGES_DIR / "partial_dependence_meanest.png"
     plt.savefig(out, dpi=config("OUTPUT_DPI"), format='png')
     plt.close()
+
+
+def _plot_pdp(pdp, period, feature, out):
+    sem = pdp["ice_std"] / np.sqrt(pdp["n_rows"])
+    fig, ax = plt.subplots(figsize=(8, 5))
+    ax.fill_between(pdp["grid"], pdp["average"] - 1.96 * sem, pdp["average"] + 1.96 * sem,
+                    color='grey', alpha=0.3, label='95% Confidence Interval')
+    ax.plot(pdp["grid"], pdp["average"], color='royalblue', linewidth=2, label='Partial Dependence')
+    ax.set_title(f"{period}: partial dependence of realized EPS on {feature}", fontsize=12)
+    ax.set_xlabel(f"{feature} (Standardized)", fontsize=11)
+    ax.set_ylabel("Realized EPS", fontsize=11)
+    ax.legend(loc='upper left')
+    ax.grid(True, linestyle='--', alpha=0.5)
+    plt.tight_layout()
+    plt.savefig(out, dpi=config("OUTPUT_DPI"), format='png')
+    plt.close()
+
+
+def _plot_pdp_2d(grids, average, period, features, out):
+    fig, ax = plt.subplots(figsize=(7, 6))
+    mesh = ax.contourf(grids[0], grids[1], average.T, levels=20, cmap='viridis')
+    fig.colorbar(mesh, ax=ax, label="Realized EPS")
+    ax.set_title(f"{period}: partial dependence on {features[0]} x {features[1]}", fontsize=12)
+    ax.set_xlabel(f"{features[0]} (Standardized)", fontsize=11)
+    ax.set_ylabel(f"{features[1]} (Standardized)", fontsize=11)
+    plt.tight_layout()
+    plt.savefig(out, dpi=config("OUTPUT_DPI"), format='png')
+    plt.close()
+
+
+def pdp_figure_path(period, features):
+    """Output path of the PDP figure for one feature or an interaction pair."""
+    name = "_x_".join(features) if isinstance(features, (list, tuple)) else features
+    return Path(config("IMAGES_DIR")) / "pdp" / f"{period}_{name}.png"
+
+
+def _pdp_job(job):
+    """Evaluate and render one PDP (1-D feature or 2-D pair) in a worker process."""
+    period, features, model_path, X_path, profile = job
+    with use_profile(profile):
+        return _render_pdp(period, features, model_path, X_path)
+
+
+def _render_pdp(period, features, model_path, X_path):
+    model, X = _load_pdp_model(model_path, X_path)
+    columns = list(model.feature_names_in_)
+    out = pdp_figure_path(period, features)
+    if isinstance(features, str):
+        pdp = compute_partial_dependence(
+            model, X, columns.index(features),
+            grid_resolution=config("PDP_GRID_RESOLUTION"), percentiles=(0, 1),
+            method=config("PDP_METHOD"), ice_max_rows=config("PDP_ICE_MAX_ROWS"),
+            chunk_rows=config("PDP_ICE_CHUNK_ROWS"), seed=config("PDP_SEED"),
+        )
+        _plot_pdp(pdp, period, features, out)
+    else:
+        method = "recursion" if _supports_recursion(model) else "brute"
+        res = partial_dependence(
+            model, X, [tuple(columns.index(f) for f in features)], kind="average", method=method,
+            grid_resolution=config("PDP_2D_GRID_RESOLUTION"), percentiles=(0.01, 0.99),
+        )
+        _plot_pdp_2d(res["grid_values"], res["average"][0], period, features, out)
+    return out
+
+
+@with_profile
+def run_pdp_grid(periods=None, features=None, interactions=None, workers=None):
+    """PDPs for every feature (and 2-D interaction pair) across horizons.
+
+    One forest per horizon is fitted (or loaded from the PDP model cache); the
+    (horizon, feature) evaluations are then fanned out across a process pool, each
+    worker memory-mapping the cached design matrix. A ``profile`` keyword (see
+    profiles.py) applies to the fit and to every worker.
+
+    Returns
+    -------
+    list[Path]
+        Figures written to IMAGES_DIR/pdp/.
+    """
+    periods = periods or config("PDP_PERIODS") or config("FORECAST_PERIODS")
+    features = features if features is not None else config("PDP_FEATURES")
+    interactions = interactions if interactions is not None else config("PDP_INTERACTIONS")
+
+    jobs = []
+    for period in periods:
+        paths = fit_pdp_model(period)
+        if paths is None:
+            continue
+        jobs += [(period, f, *paths, current_profile()) for f in features]
+        jobs += [(period, tuple(pair), *paths, current_profile()) for pair in interactions]
+    if not jobs:
+        return []
+    (Path(config("IMAGES_DIR")) / "pdp").mkdir(parents=True, exist_ok=True)
+
+    workers = workers or config("PDP_N_WORKERS") or min(len(jobs), os.cpu_count() or 1)
+    if workers <= 1:
+        outs = list(map(_pdp_job, jobs))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            outs = list(ex.map(_pdp_job, jobs))
+    for out in outs:
+        print("PDP saved to", out)
+    return outs
+
+
+@with_profile
+def run_partial_dependence(period=None):
+    """Figure 1: PDP of realized EPS on meanest for one horizon (default PDP_DEFAULT_PERIOD)."""
+    if period is None:
+        period = config("PDP_DEFAULT_PERIOD")
+    paths = fit_pdp_model(period)
+    if paths is None:
+        return
+    model, X_scaled = _load_pdp_model(*paths)
+    model.n_jobs = config("RF_N_JOBS")
+
+    columns = list(X_scaled.columns)
+    meanest_idx = columns.index('meanest') if 'meanest' in columns else 0
+    pdp = compute_partial_dependence(
+        model, X_scaled, meanest_idx,
+        grid_resolution=config("PDP_GRID_RESOLUTION"), percentiles=(0, 1),
+        method=config("PDP_METHOD"), ice_max_rows=config("PDP_ICE_MAX_ROWS"),
+        chunk_rows=config("PDP_ICE_CHUNK_ROWS"), seed=config("PDP_SEED"),
+    )
+    images_dir = Path(config("IMAGES_DIR"))
+    images_dir.mkdir(parents=True, exist_ok=True)
+    out = images_dir / "partial_dependence_meanest.png"
+    _plot_figure1(pdp, out)
     print("Partial dependence plot saved to", out)
 
 
 if __name__ == "__main__":
-    run_partial_dependence()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--figure1", action="store_true", help="only Figure 1")
+    parser.add_argument("--period", action="append", help="only the PDP grid for this horizon (repeatable)")
+    args, _ = parser.parse_known_args()  # ALL-CAPS --VAR=value options are read by settings
+    if args.figure1 or not args.period:
+        run_partial_dependence()
+    if not args.figure1:
+        run_pdp_grid(periods=args.period)
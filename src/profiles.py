@@ -0,0 +1,217 @@
+"""
+Named run profiles: explicit configuration for the pipeline entry points.
+
+A profile is a set of settings overrides (RUN_PROFILES in settings.py) applied on top
+of settings.config. Every entry point takes a ``profile`` keyword
+(``run_train_rf(profile="extended")``, ``run_table2(profile=Profile(...))``); while a
+profile is active its values take precedence over the command line, the environment
+and settings.defaults, so no module has to be re-imported and nothing global is
+mutated for longer than the call.
+
+Directory overrides cascade: moving DATA_DIR moves PROCESSED_DIR, LINK_DIR,
+WRDS_STORE_DIR and MACRO_STORE_DIR, and moving OUTPUT_DIR moves RESULTS_DIR,
+IMAGES_DIR, ARTIFACT_STORE_DIR and SWEEP_DIR, unless the profile sets those too. The caches (RESULTS_CACHE_DIR, PDP_MODEL_DIR,
+FEATURE_STORE_DIR) are not derived, so profiles share them; their entries are keyed by
+the full input paths.
+
+run_profiles runs several profiles concurrently, one process per profile, after
+checking that they write to separate directories.
+
+Usage: python profiles.py --profile base --profile extended [--stage train_rf ...]
+"""
+import argparse
+import functools
+import importlib
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from itertools import repeat
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import settings
+from settings import config, if_relative_make_abs
+
+# Subdirectories that follow DATA_DIR / OUTPUT_DIR when a profile moves them
+DERIVED_DIRS = {
+    "DATA_DIR": {
+        "PROCESSED_DIR": "processed_data", "LINK_DIR": "link", "WRDS_STORE_DIR": "wrds", "MACRO_STORE_DIR": "macro",
+    },
+    "OUTPUT_DIR": {
+        "RESULTS_DIR": "results", "IMAGES_DIR": "images", "ARTIFACT_STORE_DIR": "models/rolling",
+        "SWEEP_DIR": "sweep",
+    },
+}
+
+# Stage name -> (module, entry point); all entry points accept ``profile=``
+STAGES = {
+    "load_data": ("load_data", "main"),
+    "data_engineering": ("data_engineering", "run_data_engineering"),
+    "eda": ("eda", "run_eda"),
+    "train_rf": ("train_rf", "run_train_rf"),
+    "feature_importance": ("feature_importance", "run_feature_importance"),
+    "partial_dependence": ("partial_dependence", "run_partial_dependence"),
+    "pdp_grid": ("partial_dependence", "run_pdp_grid"),
+    "table2": ("table2_term_structure", "run_table2"),
+    "stat_analysis": ("stat_analysis", "run_stat_analysis"),
+    "bias_analysis": ("bias_analysis", "run_bias_analysis"),
+    "summary_stats": ("summary_stats", "run_summary_stats"),
+    "rf_sweep": ("rf_sweep", "run_rf_sweep"),
+}
+DEFAULT_STAGES = [
+    "train_rf", "partial_dependence", "pdp_grid", "table2", "stat_analysis", "bias_analysis",
+]
+UPSTREAM_STAGES = {"load_data", "data_engineering"}  # write into DATA_DIR
+
+_active = []  # stack of active profiles
+
+
+class Profile:
+    """Named settings overrides, resolved once.
+
+    Parameters
+    ----------
+    name : str
+    overrides : dict, optional
+        Setting name -> value. ``*_DIR`` values may be relative to BASE_DIR.
+    """
+
+    def __init__(self, name, overrides=None):
+        self.name = name
+        values = {}
+        for key, value in (overrides or {}).items():
+            if "DIR" in key and value is not None:
+                value = if_relative_make_abs(value)
+            values[key] = value
+        for root, derived in DERIVED_DIRS.items():
+            if root in values:
+                for key, sub in derived.items():
+                    values.setdefault(key, values[root] / sub)
+        self.overrides = values
+
+    def config(self, var_name, default=None, cast=None):
+        """settings.config as seen with this profile active."""
+        with use_profile(self):
+            return config(var_name, default=default, cast=cast)
+
+    def __repr__(self):
+        return f"Profile({self.name!r}, {len(self.overrides)} overrides)"
+
+
+def get_profile(profile=None) -> Profile:
+    """Resolve a profile given by name (RUN_PROFILES), as a Profile, or as an overrides
+    dict. None means the active profile, or "base" when none is active."""
+    if isinstance(profile, Profile):
+        return profile
+    if isinstance(profile, dict):
+        return Profile("custom", profile)
+    if profile is None:
+        if _active:
+            return _active[-1]
+        profile = "base"
+    known = config("RUN_PROFILES")
+    if profile not in known:
+        raise ValueError(f"Unknown run profile {profile!r} (known: {', '.join(known)})")
+    return Profile(profile, known[profile])
+
+
+def current_profile():
+    """The active Profile, or None outside ``use_profile``."""
+    return _active[-1] if _active else None
+
+
+@contextmanager
+def use_profile(profile=None):
+    """Activate ``profile`` for the block (None leaves the current configuration as is).
+
+    Profiles do not merge: an inner profile replaces the outer one until it exits.
+    """
+    if profile is None:
+        yield current_profile()
+        return
+    profile = get_profile(profile)
+    previous = dict(settings._profile_overrides)
+    settings._profile_overrides.clear()
+    settings._profile_overrides.update(profile.overrides)
+    _active.append(profile)
+    try:
+        yield profile
+    finally:
+        _active.pop()
+        settings._profile_overrides.clear()
+        settings._profile_overrides.update(previous)
+
+
+def with_profile(func):
+    """Give an entry point a ``profile=None`` keyword that is active for the call."""
+    @functools.wraps(func)
+    def wrapper(*args, profile=None, **kwargs):
+        with use_profile(profile):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def run_profile(profile, stages=None):
+    """Run ``stages`` (default DEFAULT_STAGES) in order with ``profile`` active."""
+    profile = get_profile(profile)
+    stages = stages or DEFAULT_STAGES
+    with use_profile(profile):
+        Path(config("DATA_DIR")).mkdir(parents=True, exist_ok=True)
+        Path(config("OUTPUT_DIR")).mkdir(parents=True, exist_ok=True)
+        for i, stage in enumerate(stages, 1):
+            print(f"\n[{profile.name}] [{i}/{len(stages)}] {stage}")
+            module, func = STAGES[stage]
+            getattr(importlib.import_module(module), func)(profile=profile)
+    return profile.name
+
+
+def _check_isolated(profiles, stages):
+    """Concurrent profiles must not write to the same directories."""
+    dirs = ["OUTPUT_DIR"] + (["DATA_DIR"] if UPSTREAM_STAGES & set(stages) else [])
+    for key in dirs:
+        seen = {}
+        for p in profiles:
+            path = p.config(key)
+            if path in seen:
+                raise ValueError(f"Profiles {seen[path]!r} and {p.name!r} share {key} {path}")
+            seen[path] = p.name
+
+
+def run_profiles(profiles, stages=None, workers=None):
+    """Run several profiles concurrently, one process per profile.
+
+    Parameters
+    ----------
+    profiles : list[str or Profile]
+    stages : list[str], optional
+        Keys of STAGES, run in order within each profile; default DEFAULT_STAGES.
+    workers : int, optional
+        Profiles run at once; default one per profile, up to CPU count.
+
+    Returns
+    -------
+    list[str]
+        Names of the completed profiles.
+    """
+    profiles = [get_profile(p) for p in profiles]
+    stages = stages or DEFAULT_STAGES
+    unknown = [s for s in stages if s not in STAGES]
+    if unknown:
+        raise ValueError(f"Unknown stages {unknown} (known: {', '.join(STAGES)})")
+    _check_isolated(profiles, stages)
+    workers = workers or min(len(profiles), os.cpu_count() or 1)
+    if workers <= 1:
+        return [run_profile(p, stages) for p in profiles]
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        return list(ex.map(run_profile, profiles, repeat(stages)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profile", action="append", help="run profile (repeatable; default: base)")
+    parser.add_argument("--stage", action="append", choices=list(STAGES),
+                        help="stage to run (repeatable; default: the report stages)")
+    parser.add_argument("--workers", type=int, help="profiles run at once")
+    args, _ = parser.parse_known_args()  # ALL-CAPS --VAR=value options are read by settings
+    run_profiles(args.profile or ["base"], stages=args.stage, workers=args.workers)
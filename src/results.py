@@ -0,0 +1,95 @@
+"""
+Shared access to the rolling-window results (RESULTS_DIR/{period}_rf.csv).
+Used by: table2_term_structure, stat_analysis, bias_analysis, summary_stats.
+
+Each file is parsed once with fixed dtypes ("Date" normalized to "YYYY-MM" strings,
+"permno" as int64, everything else float64) and memoized in-process. A pickled copy
+is kept in RESULTS_CACHE_DIR under a key of the file's path, size and mtime plus
+the pandas version, so separate report processes (doit tasks) pay the CSV parse
+only once per results file. Cache file names carry a digest of the results path, so
+run profiles sharing RESULTS_CACHE_DIR only ever replace their own stale copies.
+"""
+import hashlib
+import pickle
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from settings import config
+
+import numpy as np
+import pandas as pd
+
+CACHE_VERSION = 1
+_memo = {}  # (path, size, mtime_ns) -> DataFrame
+
+
+def _cache_key(path: Path) -> tuple:
+    st = path.stat()
+    return str(path.resolve()), st.st_size, st.st_mtime_ns
+
+
+def _cache_prefix(path: Path) -> str:
+    return f"{path.stem}_{hashlib.sha1(str(path.resolve()).encode()).hexdigest()[:8]}"
+
+
+def _cache_path(path: Path, key: tuple) -> Path:
+    digest = hashlib.sha1(f"{key}|{pd.__version__}|{CACHE_VERSION}".encode()).hexdigest()[:12]
+    return Path(config("RESULTS_CACHE_DIR")) / f"{_cache_prefix(path)}_{digest}.pkl"
+
+
+def _parse(path: Path) -> pd.DataFrame:
+    df = pd.read_csv(path, dtype={"Date": str})
+    df["Date"] = pd.PeriodIndex(df["Date"], freq="M").astype(str)
+    if "permno" in df.columns:
+        df["permno"] = df["permno"].astype(np.int64)
+    for col in df.columns.drop(["Date", "permno"], errors="ignore"):
+        df[col] = pd.to_numeric(df[col], errors="coerce").astype(np.float64)
+    return df
+
+
+def load_result(period, results_dir=None) -> pd.DataFrame:
+    """Results frame for one horizon, or None if ``{period}_rf.csv`` is missing.
+
+    Returns a copy, so callers may add or modify columns freely.
+    """
+    path = Path(results_dir or config("RESULTS_DIR")) / f"{period}_rf.csv"
+    if not path.exists():
+        return None
+    key = _cache_key(path)
+    if key not in _memo:
+        use_disk = config("RESULTS_CACHE_ENABLED")
+        cache = _cache_path(path, key) if use_disk else None
+        if cache is not None and cache.exists():
+            with open(cache, "rb") as f:
+                _memo[key] = pickle.load(f)
+        else:
+            _memo[key] = _parse(path)
+            if cache is not None:
+                cache.parent.mkdir(parents=True, exist_ok=True)
+                for stale in cache.parent.glob(f"{_cache_prefix(path)}_*.pkl"):
+                    stale.unlink(missing_ok=True)
+                tmp = cache.with_suffix(".tmp")
+                with open(tmp, "wb") as f:
+                    pickle.dump(_memo[key], f, protocol=pickle.HIGHEST_PROTOCOL)
+                tmp.replace(cache)
+    return _memo[key].copy()
+
+
+def load_results(periods=None, results_dir=None, verbose=True) -> dict:
+    """Period -> results frame for every horizon in ``periods`` (default FORECAST_PERIODS)
+    whose file exists; missing ones are reported and left out."""
+    data = {}
+    for period in periods or config("FORECAST_PERIODS"):
+        df = load_result(period, results_dir)
+        if df is None:
+            if verbose:
+                print("Missing", Path(results_dir or config("RESULTS_DIR")) / f"{period}_rf.csv")
+            continue
+        data[period] = df
+    return data
+
+
+def clear_cache():
+    """Drop the in-process memo (the on-disk cache invalidates itself by key)."""
+    _memo.clear()
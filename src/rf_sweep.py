@@ -0,0 +1,198 @@
+"""
+Hyperparameter sweep of the rolling-window random forest.
+Depends on: data_engineering (processed_data/macro_data.csv, A1..Q3.csv).
+Outputs: SWEEP_DIR/rf_sweep_leaderboard.csv (out-of-sample RMSE and bias per
+         horizon and RF configuration)
+
+Evaluates every RandomForestRegressor setting in SWEEP_GRID over the same rolling
+windows as train_test_rolling. Each horizon's prepared panel comes from the feature
+store (feature_store.horizon_panel, built once per input change); a window is a pair
+of row ranges into its arrays, and pool workers memory-map them instead of receiving
+copies. All (configuration, window) fits of a rung go to one process pool.
+
+Successive halving: rung k of SWEEP_RUNGS scores every SWEEP_ETA**(SWEEP_RUNGS-1-k)-th
+window (nested subsets spread over the whole sample) and only the best 1/SWEEP_ETA
+configurations by RMSE, per horizon, go on to the next rung. Earlier scores are kept,
+so survivors of the last rung are scored on every window.
+
+The StandardScaler step of train_test_rolling is skipped: forest splits are invariant
+to rescaling a feature.
+
+Usage: python rf_sweep.py [--period Q1 [--period A2 ...]]
+"""
+import argparse
+import itertools
+import math
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from settings import config
+from profiles import with_profile
+from feature_store import FeaturePanel, attach, horizon_panel
+
+import numpy as np
+import pandas as pd
+
+# Per-window sums returned by _score_window
+STATS = ["n_windows", "n_obs", "sse", "sum_error", "sum_bias", "sse_AF"]
+
+
+def grid_configs(grid) -> list:
+    """Cartesian product of a {parameter: [values]} grid as a list of dicts."""
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+
+def _label(params):
+    return ",".join(f"{k}={v}" for k, v in params.items())
+
+
+def _score_window(task):
+    """Worker: fit one configuration on one window; return the STATS sums."""
+    from sklearn.ensemble import RandomForestRegressor
+
+    panel_dir, params, (train_lo, train_hi, test_lo, test_hi), seed = task
+    panel = attach(panel_dir)
+    model = RandomForestRegressor(**params, n_jobs=1, random_state=seed)
+    model.fit(panel.X[train_lo:train_hi], panel.y[train_lo:train_hi])
+    pred = model.predict(panel.X[test_lo:test_hi])
+    y = panel.y[test_lo:test_hi]
+    meanest = panel.column("meanest")[test_lo:test_hi]
+    price = panel.column("price")[test_lo:test_hi]
+    err = pred - y
+    return np.array([1, len(y), err @ err, err.sum(), ((meanest - pred) / price).sum(),
+                     (meanest - y) @ (meanest - y)])
+
+
+def sweep_panels(panel_dirs, configs, eta=3, rungs=3, seed=42, workers=None):
+    """Successive-halving sweep of ``configs`` over prepared panels.
+
+    Parameters
+    ----------
+    panel_dirs : dict[str, Path]
+        Horizon -> feature_store.FeaturePanel directory.
+    configs : list[dict]
+        RandomForestRegressor keyword arguments (``n_jobs`` is fixed to 1 per fit).
+    eta, rungs : int
+        Survivors per rung are the best ceil(n / eta); rung k scores every
+        eta**(rungs-1-k)-th window.
+    workers : int, optional
+        Pool size; None -> CPU count; 1 runs in-process.
+
+    Returns
+    -------
+    pd.DataFrame
+        Leaderboard: one row per horizon and configuration with the rung reached,
+        windows and observations scored, ``rmse`` (RF), ``rmse_AF`` (analysts, same
+        observations), ``mean_error`` (RF - AE) and ``bias_AF_ML`` (mean (AF - RF) / P),
+        ranked within each horizon (furthest rung first, then RMSE).
+    """
+    windows = {p: FeaturePanel.load(d).rolling_windows(p) for p, d in panel_dirs.items()}
+    totals = {(p, c): np.zeros(len(STATS)) for p in panel_dirs for c in range(len(configs))}
+    reached = {}
+    alive = {p: list(range(len(configs))) for p in panel_dirs}
+    scored = {p: set() for p in panel_dirs}
+    workers = workers or os.cpu_count() or 1
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        for rung in range(rungs):
+            step = eta ** (rungs - 1 - rung)
+            tasks, keys = [], []
+            for p, panel_dir in panel_dirs.items():
+                new = [w for w in range(0, len(windows[p]), step) if w not in scored[p]]
+                scored[p].update(new)
+                for c in alive[p]:
+                    reached[(p, c)] = rung
+                    tasks += [(str(panel_dir), configs[c], windows[p][w], seed) for w in new]
+                    keys += [(p, c)] * len(new)
+            if pool is None:
+                results = map(_score_window, tasks)
+            else:
+                results = pool.map(_score_window, tasks, chunksize=max(1, len(tasks) // (4 * workers)))
+            for key, stats in zip(keys, results):
+                totals[key] += stats
+            for p in panel_dirs:
+                alive[p].sort(key=lambda c: _rmse(totals[(p, c)]))
+                print(f"{p} rung {rung}: {len(alive[p])} configs, {len(scored[p])}/{len(windows[p])} windows,"
+                      f" best {_label(configs[alive[p][0]])}")
+                if rung < rungs - 1:
+                    alive[p] = alive[p][:math.ceil(len(alive[p]) / eta)]
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return _leaderboard(totals, reached, configs, list(panel_dirs))
+
+
+def _rmse(stats):
+    return math.sqrt(stats[2] / stats[1]) if stats[1] else math.inf
+
+
+def _leaderboard(totals, reached, configs, periods):
+    rows = []
+    for (p, c), stats in totals.items():
+        if (p, c) not in reached:
+            continue
+        n = stats[1] or np.nan
+        rows.append({
+            "period": p, "config": _label(configs[c]), **configs[c],
+            "rung": reached[(p, c)], "n_windows": int(stats[0]), "n_obs": int(stats[1]),
+            "rmse": _rmse(stats), "rmse_AF": math.sqrt(stats[5] / n),
+            "mean_error": stats[3] / n, "bias_AF_ML": stats[4] / n,
+        })
+    board = pd.DataFrame(rows)
+    if board.empty:
+        return board
+    board["period"] = pd.Categorical(board["period"], categories=periods, ordered=True)
+    board = board.sort_values(["period", "rung", "rmse"], ascending=[True, False, True])
+    board["rank"] = board.groupby("period", observed=True).cumcount() + 1
+    board["period"] = board["period"].astype(str)
+    return board.reset_index(drop=True)
+
+
+@with_profile
+def run_rf_sweep(periods=None, grid=None, workers=None):
+    """Sweep SWEEP_GRID over the rolling windows and write the leaderboard.
+
+    Parameters
+    ----------
+    periods : list[str], optional
+        Horizons; defaults to SWEEP_PERIODS or FORECAST_PERIODS.
+    grid : dict, optional
+        {parameter: [values]}; defaults to SWEEP_GRID.
+    workers : int, optional
+        Pool size; defaults to SWEEP_WORKERS (None -> CPU count).
+    profile : str or profiles.Profile, optional
+        Run profile whose settings apply for the call (see profiles.py).
+
+    Returns
+    -------
+    pd.DataFrame or None
+        Leaderboard (see sweep_panels); None if no processed data exists.
+    """
+    periods = periods or config("SWEEP_PERIODS") or config("FORECAST_PERIODS")
+    panel_dirs = {p: horizon_panel(p) for p in periods}
+    panel_dirs = {p: d for p, d in panel_dirs.items() if d is not None}
+    if not panel_dirs:
+        return None
+    board = sweep_panels(
+        panel_dirs, grid_configs(grid or config("SWEEP_GRID")),
+        eta=config("SWEEP_ETA"), rungs=config("SWEEP_RUNGS"), seed=config("SWEEP_SEED"),
+        workers=workers or config("SWEEP_WORKERS"),
+    )
+    out = Path(config("SWEEP_DIR")) / "rf_sweep_leaderboard.csv"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    board.to_csv(out, index=False)
+    print(board[board["rank"] <= 3].to_string(index=False))
+    print("Leaderboard saved to", out)
+    return board
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--period", action="append", help="horizon to sweep (repeatable; default: all)")
+    parser.add_argument("--workers", type=int, help="process pool size")
+    args, _ = parser.parse_known_args()  # ALL-CAPS --VAR=value options are read by settings
+    run_rf_sweep(periods=args.period, workers=args.workers)
@@ -170,6 +170,10 @@ defaults = {
 defaults["PROCESSED_DIR"] = defaults["DATA_DIR"] / "processed_data"
 defaults["RESULTS_DIR"] = defaults["OUTPUT_DIR"] / "results"
 defaults["IMAGES_DIR"] = defaults["OUTPUT_DIR"] / "images"
+defaults["RESULTS_CACHE_DIR"] = defaults["OUTPUT_DIR"] / "cache" / "results"
+defaults["RESULTS_CACHE_ENABLED"] = True  # pickled copies of results/*_rf.csv for report stages
+# Memory-mapped model-ready panels (feature_store.py) shared by worker processes
+defaults["FEATURE_STORE_DIR"] = defaults["OUTPUT_DIR"] / "cache" / "features"
 
 # Pipeline: forecast periods and data prep
 defaults["DATA_START_DATE"] = "1985-01-01"  # WRDS / rolling window start
@@ -180,12 +184,20 @@ defaults["COLS_TO_DROP_PREP"] = [
 ]
 defaults["TRIM_VALUE"] = 10
 defaults["VARS_TO_TRIM"] = ["adj_actual", "meanest", "adj_past_eps"]
+# Firm-history features added to every horizon panel (panel_features.py): name -> spec
+# with column, op (lag, diff, pct_change, rolling_mean, rolling_std, rolling_sum),
+# periods in months, optional min_periods and fill; e.g.
+# {"meanest_rev_1m": {"column": "meanest", "op": "diff", "periods": 1, "fill": 0.0}}
+defaults["PANEL_FEATURES"] = {}
 defaults["ROLLING_START_YEAR"] = 1985
 defaults["ROLLING_END_YEAR"] = 2019
 defaults["ROLLING_TRAIN_LENGTH"] = 11
 defaults["ROLLING_N_LOOPS"] = 408
 defaults["ROLLING_TRAIN_LENGTH_A2"] = 23
 defaults["ROLLING_N_LOOPS_A2"] = 396
+# Processes fitting rolling windows at once (train_test_rolling). Above 1 each window's
+# forest runs with n_jobs=1 and the panel is shared through the feature store
+defaults["ROLLING_N_WORKERS"] = 1
 
 # Random Forest (train_rf / partial_dependence / functions)
 defaults["RF_N_ESTIMATORS"] = 2000
@@ -193,9 +205,82 @@ defaults["RF_MAX_DEPTH"] = 7
 defaults["RF_MAX_SAMPLES"] = 0.01
 defaults["RF_MIN_SAMPLES_LEAF"] = 5
 defaults["RF_N_JOBS"] = -1
+# Tree-count convergence (train_test_rolling): grow each forest by RF_CONVERGENCE_STEP
+# trees (warm_start) until the RMS change of the test predictions, relative to the
+# training target's std, drops below RF_CONVERGENCE_TOL; RF_N_ESTIMATORS is the cap
+defaults["RF_CONVERGENCE_ENABLED"] = False
+defaults["RF_CONVERGENCE_STEP"] = 100
+defaults["RF_CONVERGENCE_TOL"] = 0.005
+
+# RF hyperparameter sweep (rf_sweep): grid of RandomForestRegressor arguments evaluated
+# over the rolling windows with successive halving (1/SWEEP_ETA of the configs survive
+# each rung; rung k scores every SWEEP_ETA**(SWEEP_RUNGS-1-k)-th window)
+defaults["SWEEP_GRID"] = {
+    "n_estimators": [500, 2000],
+    "max_depth": [5, 7, 9],
+    "max_samples": [0.01, 0.05],
+    "min_samples_leaf": [5, 20],
+}
+defaults["SWEEP_PERIODS"] = None  # None -> FORECAST_PERIODS
+defaults["SWEEP_ETA"] = 3
+defaults["SWEEP_RUNGS"] = 3
+defaults["SWEEP_SEED"] = 42
+defaults["SWEEP_WORKERS"] = None  # None -> CPU count
+defaults["SWEEP_DIR"] = defaults["OUTPUT_DIR"] / "sweep"
+
+# Artifact store for per-window fitted models (train_test_rolling)
+defaults["ARTIFACT_STORE_ENABLED"] = False
+defaults["ARTIFACT_STORE_DIR"] = defaults["OUTPUT_DIR"] / "models" / "rolling"
+defaults["ARTIFACT_STORE_MAX_GB"] = 20  # LRU eviction above this size; None = unbounded
+defaults["ARTIFACT_STORE_COMPRESS"] = 3  # joblib compression level
+
+# Feature importance over time (train_test_rolling -> results/feature_importance.npz)
+defaults["IMPORTANCE_ENABLED"] = False
+defaults["IMPORTANCE_PERMUTATION"] = True  # impurity importances are always recorded
+defaults["IMPORTANCE_PERM_MAX_ROWS"] = 2000  # test-month rows scored per window
+defaults["IMPORTANCE_PERM_REPEATS"] = 3
+defaults["IMPORTANCE_N_JOBS"] = -1
+defaults["IMPORTANCE_SEED"] = 42
+defaults["IMPORTANCE_TOP_N"] = 25  # features shown in the heatmaps
 
 # Stat analysis
 defaults["POST_REGULATION_DATE"] = "2000-10"
+defaults["STAT_ANALYSIS_MODE"] = "fe"  # "fe" (absorbed fixed effects) or "group_means" (notebook spec)
+# Month effects would absorb post_regulation (a pure time dummy), so only firm effects
+# are absorbed by default; month-level correlation is handled by clustering.
+defaults["STAT_FE_ABSORB"] = ["permno"]
+defaults["STAT_FE_CLUSTER"] = ["permno", "Date"]
+defaults["STAT_FE_TOL"] = 1e-10
+defaults["STAT_FE_MAX_ITER"] = 1000
+# Specification grid: label -> formula ("y ~ a + b"), label -> sample filter (DataFrame.query)
+defaults["STAT_SPECS"] = {
+    "post_regulation only": "bias_AF_ML ~ post_regulation",
+    "+ N_analyst": "bias_AF_ML ~ N_analyst + post_regulation",
+}
+defaults["STAT_SAMPLES"] = {"full": None}
+defaults["STAT_GRID_WORKERS"] = None  # None -> one process per (horizon, sample), up to CPU count
+
+# Table 2: block-bootstrap CIs of the per-date series (0 draws disables)
+defaults["TABLE2_BOOTSTRAP_DRAWS"] = 10000
+defaults["TABLE2_BOOTSTRAP_SEED"] = 42
+defaults["TABLE2_BOOTSTRAP_METHOD"] = "stationary"  # or "moving"
+defaults["TABLE2_BOOTSTRAP_BLOCK_LENGTH"] = None  # None -> Newey-West lag of the horizon
+defaults["TABLE2_BOOTSTRAP_CI_LEVEL"] = 0.95
+
+# Data engineering: engine for the CRSP x IBES merges, finratio imputation and as-of
+# merge ("pandas", or "polars" for data_engineering_polars.py, multi-threaded)
+defaults["DATA_ENGINEERING_ENGINE"] = "pandas"
+# IBES-CRSP link table (link_table.py): versioned artifact, recomputed per changed ticker
+defaults["LINK_DIR"] = defaults["DATA_DIR"] / "link"
+defaults["LINK_KEEP_VERSIONS"] = 5
+# WRDS tables (wrds_store.py): partitioned Parquet refreshed from a per-source date
+# watermark; each pull re-fetches WRDS_LOOKBACK_DAYS before it to pick up restatements
+defaults["WRDS_STORE_DIR"] = defaults["DATA_DIR"] / "wrds"
+defaults["WRDS_INCREMENTAL"] = True  # False -> full re-pull since DATA_START_DATE
+defaults["WRDS_LOOKBACK_DAYS"] = {"crsp": 31, "ibes_summary": 62, "finratio": 93}
+# Data engineering reads daily CRSP in chunks of this many rows, keeping only the rows
+# it needs (out-of-core); 0 reads the whole table into memory
+defaults["CRSP_CHUNK_ROWS"] = 1_000_000
 
 # Macro data source column start points (Fed CSV structure)
 defaults["MACRO_GDP_START_YEAR"] = 65
@@ -204,18 +289,92 @@ defaults["MACRO_IPT_START_YEAR"] = 72
 defaults["MACRO_IPT_START_MONTH"] = 11
 defaults["MACRO_CONS_START_YEAR"] = 65
 defaults["MACRO_CONS_START_MONTH"] = 11
+# Real-time macro series (Philadelphia Fed vintage files), read by load_data and the
+# vintage store (macro_store.py). Per series: url, local file, column prefix of its
+# vintage columns (PREFIX{yy}M{m} / PREFIX{yy}Q{q}), transform ("level", "diff",
+# "log_return": change of the latest-known value between vintages) and dating
+# ("vintage": value as known at each vintage; "observation": first release, dated by
+# the observation month, as build_macro does for unemployment). Feature columns are
+# NAME (level) or NAME_{transform}.
+_FED_XLSX = "https://www.philadelphiafed.org/-/media/frbp/assets/surveys-and-data/real-time-data/data-files/xlsx/"
+defaults["MACRO_SERIES"] = {
+    "GDP": {"url": _FED_XLSX + "routputmvqd.xlsx?la=en&hash=403C8B9FD72B33F83C1EE5C59D015C86",
+            "file": "real_GDP_FED.csv", "prefix": "ROUTPUT", "transform": "log_return", "dating": "vintage"},
+    "IPT": {"url": _FED_XLSX + "iptmvmd.xlsx?la=en&hash=E53F4C735866E2366E50511D5C9CCADE",
+            "file": "IPT_FED.csv", "prefix": "IPT", "transform": "log_return", "dating": "vintage"},
+    "Cons": {"url": _FED_XLSX + "rconmvqd.xlsx?la=en&hash=9F7B44DB227E6A620629495229CD93BB",
+             "file": "real_personal_consumption_FED.csv", "prefix": "RCON", "transform": "log_return",
+             "dating": "vintage"},
+    "Unempl": {"url": _FED_XLSX + "rucqvmd.xlsx?la=en&hash=FF1D4C67E144D916C1986A8EEDC4B42A",
+               "file": "Unemployment_FED.csv", "prefix": "RUC", "transform": "level", "dating": "observation"},
+}
+# Macro features for read_merge_prepare_data: "macro_data" (processed_data/macro_data.csv
+# from build_macro) or "vintage_store" (MACRO_SERIES as-of each statpers, macro_store.py)
+defaults["MACRO_SOURCE"] = "macro_data"
+defaults["MACRO_STORE_DIR"] = defaults["DATA_DIR"] / "macro"
 
 # Partial dependence plot
 defaults["PDP_DEFAULT_PERIOD"] = "Q1"
 defaults["PDP_GRID_RESOLUTION"] = 100
+defaults["PDP_METHOD"] = "auto"  # "auto" (recursion when supported), "recursion" or "brute"
+defaults["PDP_ICE_MAX_ROWS"] = 20000  # rows sampled for the ICE std (None = all rows)
+defaults["PDP_ICE_CHUNK_ROWS"] = 1000  # rows per predict batch (x grid resolution)
+defaults["PDP_SEED"] = 42
+# PDP grid: features x horizons (+ 2-D interaction pairs); one cached forest per horizon
+defaults["PDP_PERIODS"] = None  # None -> FORECAST_PERIODS
+defaults["PDP_FEATURES"] = ["meanest", "adj_past_eps", "price"]
+defaults["PDP_INTERACTIONS"] = [("meanest", "adj_past_eps")]
+defaults["PDP_2D_GRID_RESOLUTION"] = 30
+defaults["PDP_MODEL_DIR"] = defaults["OUTPUT_DIR"] / "models" / "pdp"
+defaults["PDP_N_WORKERS"] = None  # None -> up to CPU count
 defaults["WINSORIZE_LIMITS"] = (0.01, 0.01)
 
+# Summary statistics (tables + figures rendered as independent jobs)
+defaults["SUMMARY_STATS_WORKERS"] = None  # None -> one process per job, up to CPU count
+
 # Bias analysis / figures
 defaults["BIAS_PLOT_YEAR_LOCATOR"] = 2
 defaults["BIAS_FIGSIZE"] = (15, 10)
 defaults["BIAS_DPI"] = 80
+defaults["BIAS_TRIM_PROPORTION"] = 0.01  # cut from each tail of the per-date means
 defaults["OUTPUT_DPI"] = 100
 
+# Named run profiles (profiles.py): overrides layered on top of everything else while
+# the profile is active. Moving DATA_DIR / OUTPUT_DIR also moves their subdirectories;
+# the caches (RESULTS_CACHE_DIR, PDP_MODEL_DIR, FEATURE_STORE_DIR) stay shared unless a profile sets them.
+defaults["RUN_PROFILES"] = {
+    "base": {},
+    "extended": {  # data through 2026-02
+        "DATA_DIR": "_data_extended",
+        "OUTPUT_DIR": "_output_extended",
+        "ROLLING_END_YEAR": 2026,
+        "ROLLING_N_LOOPS": 482,  # test from 1986-01 to 2026-02
+        "ROLLING_N_LOOPS_A2": 470,  # test from 1987-01 to 2026-02
+        "DATA_ENGINEERING_ENGINE": "polars",  # all cores for the larger sample
+    },
+}
+
+
+# Environment lookups are resolved once per process (python-decouple walks os.environ
+# and the .env file on every call). The defaults dict is still read live, so in-process
+# overrides (tests) take effect immediately.
+_ENV_MISSING = object()
+_env_cache = {}
+
+# Values of the active run profile (set by profiles.use_profile)
+_profile_overrides = {}
+
+
+def _env_lookup(var_name):
+    if var_name not in _env_cache:
+        _env_cache[var_name] = _config(var_name, default=_ENV_MISSING)
+    return _env_cache[var_name]
+
+
+def clear_config_cache():
+    """Forget cached environment lookups (after changing os.environ in-process)."""
+    _env_cache.clear()
+
 
 def config(
     var_name,
@@ -227,6 +386,7 @@ def config(
 ):
     """Config defines a variable that can be used in the project. The definition of variables follows
     an order of precedence:
+    0. The active run profile (profiles.use_profile), if any
     1. Command line arguments
     2. Environment variables
     3. Settings.py file
@@ -234,6 +394,13 @@ def config(
     5. Error
     """
 
+    # 0. Active run profile (explicitly passed to an entry point)
+    if var_name in _profile_overrides:
+        value = _profile_overrides[var_name]
+        if cast is not None:
+            value = cast(value)
+        return value
+
     # 1. Command line arguments (highest priority)
     if var_name in cli_vars and cli_vars[var_name] is not None:
         value = cli_vars[var_name]
@@ -244,11 +411,9 @@ def config(
             value = if_relative_make_abs(Path(value))
         return value
 
-    # 2. Environment variables through decouple
-    # Use decouple but with a sentinel default to detect if it was found
-    env_sentinel = object()
-    env_value = _config(var_name, default=env_sentinel)
-    if env_value is not env_sentinel:
+    # 2. Environment variables through decouple (cached per process)
+    env_value = _env_lookup(var_name)
+    if env_value is not _ENV_MISSING:
         # Found in environment
         if cast is not None:
             env_value = cast(env_value)
@@ -1,71 +1,188 @@
 """
 Statistical analysis: regression to explain bias (post_regulation, N_analyst).
 Replicates notebooks/stat_analysis_results.ipynb: Cell 6 (post_regulation only) and Cell 8 (+ N_analyst).
-Outputs: OUTPUT_DIR/stat_analysis_regulation.txt (and printed summaries).
+
+Runs a specification grid: STAT_SPECS (formulas) x FORECAST_PERIODS x STAT_SAMPLES
+(sample filters). Each (horizon, sample) is one job in a process pool; the variables
+of all specifications are demeaned once per job and every formula is fitted on that
+shared design.
+
+Two estimators (STAT_ANALYSIS_MODE):
+  "fe"          -- fixed effects in STAT_FE_ABSORB swept out by alternating projections,
+                   cluster-robust SEs over STAT_FE_CLUSTER (panel_regression).
+  "group_means" -- the notebook specification: firm and date means of the bias
+                   (alpha_i, beta_t) as regressors in plain OLS; kept for comparison.
+Outputs: OUTPUT_DIR/stat_analysis_regulation.txt (and printed summaries),
+         OUTPUT_DIR/stat_analysis_coefficients.csv (+ .parquet when pyarrow is installed).
 """
+import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).resolve().parent))
 from settings import config
+from panel_regression import fit_prepared, format_fe_summary, prepare_fe_design
+from profiles import with_profile
+from results import load_results
 
 import numpy as np
 import pandas as pd
 import statsmodels.api as sm
 
-OUTPUT_DIR = Path(config("OUTPUT_DIR"))
-RESULTS_DIR = Path(config("RESULTS_DIR"))
 
+def parse_formula(formula: str):
+    """Split ``"y ~ a + b"`` into ``("y", ["a", "b"])`` (additive terms only)."""
+    lhs, sep, rhs = formula.partition("~")
+    if not sep:
+        raise ValueError(f"Formula needs '~': {formula!r}")
+    regressors = [t.strip() for t in rhs.split("+") if t.strip()]
+    return lhs.strip(), regressors
+
+
+def _fit_sample(job):
+    """Fit every specification on one (period, sample) frame; returns (tidy rows, text blocks)."""
+    period, sample, df, specs, mode, fe_options = job
+    parsed = {name: parse_formula(f) for name, f in specs.items()}
+    rows, texts = [], []
+
+    if mode == "fe":
+        columns = [v for y, xs in parsed.values() for v in [y] + xs]
+        design = prepare_fe_design(df, columns, **fe_options)
+    elif mode == "group_means":
+        # Firm / date means of each dependent variable, computed once per sample
+        for y in {y for y, _ in parsed.values()}:
+            df[f"alpha_i[{y}]"] = df.groupby('permno')[y].transform('mean')
+            df[f"beta_t[{y}]"] = df.groupby('Date')[y].transform('mean')
+    else:
+        raise ValueError(f"Unknown STAT_ANALYSIS_MODE: {mode!r} (use 'fe' or 'group_means')")
+
+    for name, (y, regressors) in parsed.items():
+        if mode == "fe":
+            res = fit_prepared(design, y, regressors)
+            summary = format_fe_summary(res, y)
+            params, bse, pvalues, nobs = res["params"], res["bse"], res["pvalues"], res["nobs"]
+        else:
+            X = df[[f"alpha_i[{y}]", f"beta_t[{y}]"] + regressors].rename(
+                columns={f"alpha_i[{y}]": "alpha_i", f"beta_t[{y}]": "beta_t"})
+            model = sm.OLS(df[y], X).fit()
+            summary = str(model.summary())
+            params, bse, pvalues, nobs = model.params, model.bse, model.pvalues, int(model.nobs)
+        for term in params.index:
+            rows.append({
+                "period": period, "sample": sample, "spec": name, "formula": specs[name],
+                "estimator": mode, "term": term, "coef": params[term], "std_err": bse[term],
+                "t": params[term] / bse[term] if bse[term] else np.nan,
+                "p_value": pvalues[term], "nobs": nobs,
+            })
+        texts.append((name, summary, regressors, params, pvalues))
+    return period, sample, rows, texts
+
+
+def run_spec_grid(data: dict, specs: dict, samples: dict, mode: str, workers=None):
+    """Fit ``specs`` x horizons in ``data`` x ``samples`` in a process pool.
+
+    Parameters
+    ----------
+    data : dict[str, pd.DataFrame]
+        Period -> results frame (with N_analyst and post_regulation columns).
+    specs : dict[str, str]
+        Specification label -> formula ``"y ~ a + b"``.
+    samples : dict[str, str or None]
+        Sample label -> ``DataFrame.query`` expression (None = full sample).
+    mode : str
+        "fe" or "group_means".
+    workers : int, optional
+        Pool size; defaults to min(#jobs, CPU count). 1 runs in-process.
+
+    Returns
+    -------
+    (pd.DataFrame, list)
+        Tidy coefficient table and, in grid order, ``(period, sample, texts)`` for the
+        text report.
+    """
+    fe_options = {
+        "absorb": config("STAT_FE_ABSORB"),
+        "cluster": config("STAT_FE_CLUSTER"),
+        "tol": config("STAT_FE_TOL"),
+        "max_iter": config("STAT_FE_MAX_ITER"),
+    }
+    needed = sorted({v for f in specs.values() for v in [parse_formula(f)[0]] + parse_formula(f)[1]}
+                    | {"permno", "Date"} | set(fe_options["absorb"]) | set(fe_options["cluster"]))
+    jobs = []
+    for period, df in data.items():
+        for sample, query in samples.items():
+            frame = df.query(query) if query else df
+            jobs.append((period, sample, frame[needed].copy(), specs, mode, fe_options))
 
-def run_stat_analysis():
+    workers = workers or min(len(jobs), os.cpu_count() or 1)
+    if workers <= 1:
+        results = list(map(_fit_sample, jobs))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            results = list(ex.map(_fit_sample, jobs))
+
+    coef_table = pd.DataFrame([row for _, _, rows, _ in results for row in rows])
+    return coef_table, [(period, sample, texts) for period, sample, _, texts in results]
+
+
+def _report_lines(mode, reports):
+    lines = [f"Estimator: {mode}\n"]
+    for period, sample, texts in reports:
+        suffix = "" if sample == "full" else f" [{sample}]"
+        for name, summary, regressors, params, pvalues in texts:
+            lines.append(f"Summary for {period} ({name}){suffix}:")
+            lines.append(summary)
+            lines.append(f"\nHypothesis tests for {period} ({name}){suffix}:")
+            for term in regressors:
+                lines.append(f"{term} coefficient: {params[term]}, p-value: {pvalues[term]}")
+                lines.append(f"Is {term} significant? {'Yes' if pvalues[term] < 0.05 else 'No'}")
+            lines.append("")
+    return lines
+
+
+@with_profile
+def run_stat_analysis(mode=None):
+    """Regress the analyst-machine bias on the STAT_SPECS grid for every horizon and sample.
+
+    Parameters
+    ----------
+    mode : str, optional
+        "fe" or "group_means"; defaults to STAT_ANALYSIS_MODE.
+    profile : str or profiles.Profile, optional
+        Run profile whose settings apply for the call (see profiles.py).
+    """
+    if mode is None:
+        mode = config("STAT_ANALYSIS_MODE")
     periods = config("FORECAST_PERIODS")
-    data = {}
-    for period in periods:
-        path = RESULTS_DIR / f"{period}_rf.csv"
-        if not path.exists():
-            print("Missing", path)
-            return
-        data[period] = pd.read_csv(path)
-
-    lines = []
-    for period in periods:
-        data[period].rename(columns={'numest': 'N_analyst'}, inplace=True)
-        data[period]['post_regulation'] = np.where(data[period]['Date'] > config("POST_REGULATION_DATE"), 1, 0)
-        data[period]['alpha_i'] = data[period].groupby('permno')['bias_AF_ML'].transform('mean')
-        data[period]['beta_t'] = data[period].groupby('Date')['bias_AF_ML'].transform('mean')
-
-        # Regression 1: post_regulation only (notebook Cell 6)
-        X1 = data[period][['alpha_i', 'beta_t', 'post_regulation']]
-        y = data[period]['bias_AF_ML']
-        model1 = sm.OLS(y, X1).fit()
-
-        lines.append(f"Summary for {period} (post_regulation only):")
-        lines.append(str(model1.summary()))
-        gamma_coef = model1.params['post_regulation']
-        gamma_pval = model1.pvalues['post_regulation']
-        lines.append(f"\nHypothesis tests for {period}:")
-        lines.append(f"gamma (post_regulation) coefficient: {gamma_coef}, p-value: {gamma_pval}")
-        lines.append(f"Is gamma significant? {'Yes' if gamma_pval < 0.05 else 'No'}\n")
-
-        # Regression 2: + N_analyst (notebook Cell 8)
-        X2 = data[period][['alpha_i', 'beta_t', 'N_analyst', 'post_regulation']]
-        model2 = sm.OLS(y, X2).fit()
-        lines.append(f"Summary for {period} (+ N_analyst):")
-        lines.append(str(model2.summary()))
-        gamma_pval2 = model2.pvalues['post_regulation']
-        lambda_pval = model2.pvalues['N_analyst']
-        lines.append(f"gamma (post_regulation) p-value: {gamma_pval2}, lambda (N_analyst) p-value: {lambda_pval}")
-        lines.append(f"Is gamma significant? {'Yes' if gamma_pval2 < 0.05 else 'No'}")
-        lines.append(f"Is lambda significant? {'Yes' if lambda_pval < 0.05 else 'No'}\n")
-
-    out = OUTPUT_DIR / "stat_analysis_regulation.txt"
-    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    data = load_results(periods)
+    if len(data) < len(periods):
+        return
+    for df in data.values():
+        df.rename(columns={'numest': 'N_analyst'}, inplace=True)
+        df['post_regulation'] = (df['Date'] > config("POST_REGULATION_DATE")).astype(int)
+
+    coef_table, reports = run_spec_grid(
+        data, config("STAT_SPECS"), config("STAT_SAMPLES"), mode, workers=config("STAT_GRID_WORKERS"))
+
+    output_dir = Path(config("OUTPUT_DIR"))
+    output_dir.mkdir(parents=True, exist_ok=True)
+    out_csv = output_dir / "stat_analysis_coefficients.csv"
+    coef_table.to_csv(out_csv, index=False)
+    print("Coefficient table saved to", out_csv)
+    try:
+        coef_table.to_parquet(out_csv.with_suffix(".parquet"), index=False)
+    except ImportError:
+        pass
+
+    lines = _report_lines(mode, reports)
+    out = output_dir / "stat_analysis_regulation.txt"
     with open(out, 'w') as f:
         f.write("\n".join(lines))
     print("Stat analysis saved to", out)
     for line in lines:
         print(line)
-    return data
+    return coef_table
 
 
 if __name__ == "__main__":
@@ -4,6 +4,7 @@ Replicate Table 2: The term structure of earnings forecasts via machine learning
 Uses results/*_rf.csv: for each forecast horizon, computes time-series averages of
 RF (ML forecast), AF (analyst forecast), AE (actual), their differences, squared
 differences, (AF-RF)/P, and Newey-West t-statistics (3 lags for quarterly, 12 for annual).
+Block-bootstrap percentile CIs of the per-date series are reported alongside the t-stats.
 
 Outputs: OUTPUT_DIR/table2_term_structure.csv (and optional LaTeX).
 """
@@ -11,19 +12,14 @@ import sys
 from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).resolve().parent))
-try:
-    from settings import config
-    RESULTS_DIR = Path(config("RESULTS_DIR"))
-    OUTPUT_DIR = Path(config("OUTPUT_DIR"))
-    FORECAST_PERIODS = config("FORECAST_PERIODS")
-except Exception:
-    RESULTS_DIR = Path(__file__).resolve().parent.parent / "_output" / "results"
-    OUTPUT_DIR = Path(__file__).resolve().parent.parent / "_output"
-    FORECAST_PERIODS = ["Q1", "Q2", "Q3", "A1", "A2"]
+from settings import config
+from profiles import with_profile
+
+import os
+from concurrent.futures import ProcessPoolExecutor
 
 import numpy as np
 import pandas as pd
-import statsmodels.api as sm
 
 # Horizon labels for Table 2 (paper order)
 HORIZON_LABELS = {
@@ -35,21 +31,133 @@ HORIZON_LABELS = {
 }
 # Newey-West lags: 3 for quarterly, 12 for annual (paper note)
 NW_LAGS = {"Q1": 3, "Q2": 3, "Q3": 3, "A1": 12, "A2": 12}
+# Table 2 column -> per-date series in table2_by_date (bootstrapped for CIs)
+BY_DATE_COLUMNS = {
+    "RF": "RF",
+    "AF": "AF",
+    "AE": "AE",
+    "(RF-AE)": "RF_AE",
+    "(AF-AE)": "AF_AE",
+    "(RF-AE)^2": "RF_AE_sq",
+    "(AF-AE)^2": "AF_AE_sq",
+    "(AF-RF)/P": "AF_RF_P",
+}
+# Resamples are drawn in batches to bound memory (batch x n_dates x n_columns floats)
+_BOOTSTRAP_BATCH = 1000
 
 
 def _newey_west_tstat(series: pd.Series, maxlags: int) -> float:
-    """T-statistic for H0: mean = 0 using Newey-West SE."""
-    y = series.dropna()
-    if len(y) < 2 or y.std() == 0:
+    """T-statistic for H0: mean = 0 using Newey-West SE.
+
+    Same as OLS on a constant with statsmodels ``cov_type="HAC"`` (Bartlett kernel,
+    no small-sample correction), computed directly.
+    """
+    y = series.dropna().to_numpy(dtype=float)
+    n = len(y)
+    if n < 2 or y.std() == 0:
         return np.nan
-    X = np.ones((len(y), 1))
-    model = sm.OLS(y, X)
-    res = model.fit(cov_type="HAC", cov_kwds={"maxlags": maxlags})
-    return float(res.tvalues[0])
+    e = y - y.mean()
+    s = e @ e
+    for lag in range(1, min(maxlags, n - 1) + 1):
+        s += 2 * (1 - lag / (maxlags + 1)) * (e[lag:] @ e[:-lag])
+    return float(y.mean() / np.sqrt(s / n ** 2))
+
+
+def _bootstrap_indices(n: int, n_draws: int, block_length: int, method: str,
+                       rng: np.random.Generator) -> np.ndarray:
+    """Resampled date positions, shape (n_draws, n), for a block bootstrap.
+
+    ``method="moving"`` concatenates fixed-length overlapping blocks (Kunsch 1989);
+    ``method="stationary"`` uses geometric block lengths with mean ``block_length``
+    and circular wrapping (Politis and Romano 1994).
+    """
+    block_length = max(1, min(int(block_length), n))
+    t = np.arange(n)
+    if method == "stationary":
+        new_block = rng.random((n_draws, n)) < 1.0 / block_length
+        new_block[:, 0] = True
+        starts = rng.integers(0, n, size=(n_draws, n))
+        # Position of the most recent block start at or before each t
+        last = np.maximum.accumulate(np.where(new_block, t, 0), axis=1)
+        first = np.take_along_axis(starts, last, axis=1)
+        return (first + t - last) % n
+    if method == "moving":
+        n_blocks = -(-n // block_length)
+        starts = rng.integers(0, n - block_length + 1, size=(n_draws, n_blocks))
+        idx = (starts[:, :, None] + np.arange(block_length)).reshape(n_draws, -1)
+        return idx[:, :n]
+    raise ValueError(f"Unknown bootstrap method: {method!r} (use 'stationary' or 'moving')")
+
+
+def block_bootstrap_ci(
+    by_date: pd.DataFrame,
+    block_length: int,
+    n_draws: int = 10000,
+    seed=None,
+    method: str = "stationary",
+    level: float = 0.95,
+) -> pd.DataFrame:
+    """Percentile block-bootstrap CIs for the time-series mean of each by_date column.
+
+    All columns share the same resampled dates, so the joint time-series dependence
+    across columns is preserved. Resamples are vectorized in NumPy in batches.
+
+    Returns
+    -------
+    pd.DataFrame
+        Index = by_date columns; columns ``lo``, ``hi``.
+    """
+    values = by_date.to_numpy(dtype=float)
+    n = len(values)
+    if n < 2 or n_draws <= 0:
+        return pd.DataFrame(np.nan, index=by_date.columns, columns=["lo", "hi"])
+    rng = np.random.default_rng(seed)
+    has_nan = np.isnan(values).any()
+    means = np.empty((n_draws, values.shape[1]))
+    for start in range(0, n_draws, _BOOTSTRAP_BATCH):
+        stop = min(start + _BOOTSTRAP_BATCH, n_draws)
+        idx = _bootstrap_indices(n, stop - start, block_length, method, rng)
+        sample = values[idx]
+        means[start:stop] = np.nanmean(sample, axis=1) if has_nan else sample.mean(axis=1)
+    alpha = (1.0 - level) / 2.0
+    lo, hi = np.nanquantile(means, [alpha, 1.0 - alpha], axis=0)
+    return pd.DataFrame({"lo": lo, "hi": hi}, index=by_date.columns)
+
+
+def _bootstrap_job(args):
+    period, by_date, n_draws, seed, method, block_length, level = args
+    if block_length is None:
+        block_length = NW_LAGS[period]
+    # Independent, reproducible stream per horizon regardless of which horizons run
+    period_seed = None if seed is None else [int(seed), list(HORIZON_LABELS).index(period)]
+    return period, block_bootstrap_ci(by_date, block_length, n_draws, period_seed, method, level)
+
 
+def bootstrap_table2(
+    by_dates: dict,
+    n_draws: int = 10000,
+    seed=None,
+    method: str = "stationary",
+    block_length=None,
+    level: float = 0.95,
+) -> dict:
+    """Block-bootstrap CIs for every horizon, one process per horizon.
 
-def compute_table2_row(period: str, df: pd.DataFrame) -> dict:
-    """Compute one row of Table 2 for a given forecast horizon."""
+    ``block_length=None`` uses the horizon's Newey-West lag (3 quarterly, 12 annual).
+    Returns a mapping of period to the frame from :func:`block_bootstrap_ci`.
+    """
+    if n_draws <= 0 or not by_dates:
+        return {}
+    jobs = [(p, bd, n_draws, seed, method, block_length, level) for p, bd in by_dates.items()]
+    max_workers = min(len(jobs), os.cpu_count() or 1)
+    if max_workers == 1:
+        return dict(map(_bootstrap_job, jobs))
+    with ProcessPoolExecutor(max_workers=max_workers) as ex:
+        return dict(ex.map(_bootstrap_job, jobs))
+
+
+def table2_by_date(df: pd.DataFrame) -> pd.DataFrame:
+    """Cross-sectional mean per Date of every Table 2 quantity (the time series behind each column)."""
     df = df.copy()
     df["_rf"] = df["predicted_adj_actual"]
     df["_af"] = df["meanest"]
@@ -59,8 +167,7 @@ def compute_table2_row(period: str, df: pd.DataFrame) -> dict:
     df["_rf_ae_sq"] = df["_rf_ae"] ** 2
     df["_af_ae_sq"] = df["_af_ae"] ** 2
 
-    # Time-series average: cross-sectional mean per Date, then average over dates
-    by_date = df.groupby("Date").agg(
+    return df.groupby("Date").agg(
         RF=("_rf", "mean"),
         AF=("_af", "mean"),
         AE=("_ae", "mean"),
@@ -71,6 +178,17 @@ def compute_table2_row(period: str, df: pd.DataFrame) -> dict:
         AF_RF_P=("bias_AF_ML", "mean"),
     )
 
+
+def compute_table2_row(period: str, df: pd.DataFrame, by_date: pd.DataFrame = None,
+                       boot_ci: pd.DataFrame = None) -> dict:
+    """Compute one row of Table 2 for a given forecast horizon.
+
+    ``boot_ci`` (from :func:`block_bootstrap_ci`) adds ``lo(<col>)`` / ``hi(<col>)`` entries.
+    """
+    # Time-series average: cross-sectional mean per Date, then average over dates
+    if by_date is None:
+        by_date = table2_by_date(df)
+
     row = {
         "Horizon": HORIZON_LABELS[period],
         "RF": by_date["RF"].mean(),
@@ -90,21 +208,38 @@ def compute_table2_row(period: str, df: pd.DataFrame) -> dict:
     row["t(AF-AE)"] = _newey_west_tstat(by_date["AF_AE"], maxlags)
     row["t((AF-RF)/P)"] = _newey_west_tstat(by_date["AF_RF_P"], maxlags)
 
+    if boot_ci is not None:
+        for col, series in BY_DATE_COLUMNS.items():
+            row[f"lo({col})"] = boot_ci.loc[series, "lo"]
+            row[f"hi({col})"] = boot_ci.loc[series, "hi"]
+
     return row
 
 
+@with_profile
 def run_table2():
-    """Load results, compute Table 2, save CSV in paper layout (value row + t-stat row per horizon)."""
-    rows = []
-    for period in FORECAST_PERIODS:
-        path = RESULTS_DIR / f"{period}_rf.csv"
-        if not path.exists():
-            print(f"Missing {path}, skipping {period}")
-            continue
-        df = pd.read_csv(path)
-        df["Date"] = df["Date"].astype(str)
-        row = compute_table2_row(period, df)
-        rows.append(row)
+    """Load results, compute Table 2, save CSV in paper layout.
+
+    Each horizon gets a value row and a t-stat row; when ``TABLE2_BOOTSTRAP_DRAWS > 0``
+    it also gets ``CI low`` / ``CI high`` rows with block-bootstrap percentile bounds.
+    Takes a ``profile`` keyword (see profiles.py).
+    """
+    from results import load_results
+    data = load_results(config("FORECAST_PERIODS"))
+
+    by_dates = {period: table2_by_date(df) for period, df in data.items()}
+    boot = bootstrap_table2(
+        by_dates,
+        n_draws=config("TABLE2_BOOTSTRAP_DRAWS"),
+        seed=config("TABLE2_BOOTSTRAP_SEED"),
+        method=config("TABLE2_BOOTSTRAP_METHOD"),
+        block_length=config("TABLE2_BOOTSTRAP_BLOCK_LENGTH"),
+        level=config("TABLE2_BOOTSTRAP_CI_LEVEL"),
+    )
+    rows = [
+        compute_table2_row(period, df, by_date=by_dates[period], boot_ci=boot.get(period))
+        for period, df in data.items()
+    ]
 
     # Build table in exact paper layout: each horizon = 2 rows (values, then t-stat)
     # Columns: Horizon, RF, AF, AE, (RF-AE), (AF-AE), (RF-AE)^2, (AF-AE)^2, (AF-RF)/P, N
@@ -139,16 +274,25 @@ def run_table2():
             "(AF-RF)/P": round(r["t((AF-RF)/P)"], 2),
             "N": "",
         })
+        # Bootstrap CI rows (all value columns filled)
+        if "lo(RF)" in r:
+            for label, side in [("CI low", "lo"), ("CI high", "hi")]:
+                ci_row = {"Horizon": label}
+                for col in BY_DATE_COLUMNS:
+                    ci_row[col] = round(r[f"{side}({col})"], 3)
+                ci_row["N"] = ""
+                out_rows.append(ci_row)
 
     table_out = pd.DataFrame(out_rows)
 
-    out_csv = OUTPUT_DIR / "table2_term_structure.csv"
-    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    output_dir = Path(config("OUTPUT_DIR"))
+    out_csv = output_dir / "table2_term_structure.csv"
+    output_dir.mkdir(parents=True, exist_ok=True)
     table_out.to_csv(out_csv, index=False)
     print("Table 2 (term structure) saved to", out_csv)
 
     # Also write a formatted text table matching the paper exactly (separator lines, alignment)
-    out_txt = OUTPUT_DIR / "table2_term_structure.txt"
+    out_txt = output_dir / "table2_term_structure.txt"
     _write_paper_format_table(out_rows, out_txt)
     print("Table 2 (paper format) saved to", out_txt)
 
@@ -161,7 +305,8 @@ def run_table2():
 
 
 def _write_paper_format_table(rows: list, path: Path) -> None:
-    """Write table in paper layout: header, then for each horizon value row + t-stat row, separators."""
+    """Write table in paper layout: header, then for each horizon value row + t-stat row
+    (+ bootstrap CI rows when present), separators."""
     col_names = ["", "RF", "AF", "AE", "(RF-AE)", "(AF-AE)", "(RF-AE)^2", "(AF-AE)^2", "(AF-RF)/P", "N"]
     col_widths = [22, 7, 7, 7, 9, 9, 10, 10, 10, 12]
 
@@ -179,6 +324,7 @@ def _write_paper_format_table(rows: list, path: Path) -> None:
 
     for r in rows:
         is_tstat = r["Horizon"] == "t-stat"
+        is_ci = r["Horizon"] in ("CI low", "CI high")
         row_label = r["Horizon"]
         line = row_label.ljust(col_widths[0])
         if is_tstat:
@@ -191,6 +337,10 @@ def _write_paper_format_table(rows: list, path: Path) -> None:
             line += "".ljust(col_widths[7])
             line += fmt_num(r["(AF-RF)/P"], 2).rjust(col_widths[8])
             line += "".ljust(col_widths[9])
+        elif is_ci:
+            for col, w in zip(col_names[1:-1], col_widths[1:-1]):
+                line += fmt_num(r[col]).rjust(w)
+            line += "".ljust(col_widths[9])
         else:
             line += fmt_num(r["RF"]).rjust(col_widths[1])
             line += fmt_num(r["AF"]).rjust(col_widths[2])
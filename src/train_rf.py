@@ -2,7 +2,11 @@
 Train Random Forest (and OLS) rolling-window models for Man vs Machine.
 Depends on: data_engineering (processed_data/macro_data.csv, A1..Q3.csv).
 Outputs: OUTPUT_DIR/results/{Q1,Q2,Q3,A1,A2}_rf.csv
+         (+ results/feature_importance_{period}.npz with IMPORTANCE_ENABLED)
+
+Usage: python train_rf.py [--period Q1 [--period A2 ...]] [--force]
 """
+import argparse
 import sys
 from pathlib import Path
 
@@ -10,21 +14,34 @@ sys.path.insert(0, str(Path(__file__).resolve().parent))
 from settings import config
 
 from functions import read_merge_prepare_data, train_test_rolling
+from artifact_store import store_from_config
+from feature_importance import recorder_from_config
+from profiles import with_profile
 
 import pandas as pd
 
-DATA_DIR = Path(config("DATA_DIR"))
-OUTPUT_DIR = Path(config("OUTPUT_DIR"))
-RESULTS_DIR = Path(config("RESULTS_DIR"))
-RESULTS_DIR.mkdir(parents=True, exist_ok=True)
-
 
-def run_train_rf():
+@with_profile
+def run_train_rf(periods=None, force=False):
     """Train rolling-window RF (and OLS) models for each forecast period.
 
     Loads macro_data.csv and period-specific processed data (A1..Q3), runs
     train_test_rolling for each period, and writes results to
-    RESULTS_DIR/{period}_rf.csv. Skips periods whose output file already exists.
+    RESULTS_DIR/{period}_rf.csv. Skips periods whose output file already exists
+    unless ``force``. With ARTIFACT_STORE_ENABLED, every window's fitted models are
+    kept in the artifact store (ARTIFACT_STORE_DIR) for post-hoc analyses. With
+    IMPORTANCE_ENABLED, per-window feature importances are written to
+    RESULTS_DIR/feature_importance_{period}.npz.
+
+    Parameters
+    ----------
+    periods : list[str], optional
+        Horizons to train; defaults to FORECAST_PERIODS. One horizon per process
+        lets doit run horizons in parallel (``pipeline_train_rf:Q1`` etc.).
+    force : bool
+        Retrain even if the results file exists.
+    profile : str or profiles.Profile, optional
+        Run profile whose settings apply for the call (see profiles.py).
 
     Returns
     -------
@@ -32,30 +49,38 @@ def run_train_rf():
         Mapping of period name to rolling results DataFrame; None if macro_data
         is missing.
     """
-    periods = config("FORECAST_PERIODS")
+    periods = periods or config("FORECAST_PERIODS")
     macro_path = Path(config("PROCESSED_DIR")) / "macro_data.csv"
     if not macro_path.exists():
         print("Missing", macro_path)
         return
     Macro_Data = pd.read_csv(macro_path)
+    results_dir = Path(config("RESULTS_DIR"))
+    results_dir.mkdir(parents=True, exist_ok=True)
 
-    forecast_data = {}
-    for forecast in periods:
-        forecast_data[forecast] = read_merge_prepare_data(forecast, Macro_Data, data_dir=DATA_DIR)
-
+    store = store_from_config()
     results_rolling = {}
-    for forecast, df in forecast_data.items():
+    for forecast in periods:
         print(forecast)
-        out = RESULTS_DIR / f"{forecast}_rf.csv"
-        if out.exists():
+        out = results_dir / f"{forecast}_rf.csv"
+        if out.exists() and not force:
             print(f"Results for {forecast} already exist, skipping")
             continue
-        results_rolling[forecast] = train_test_rolling(forecast, df)
+        df = read_merge_prepare_data(forecast, Macro_Data)
+        importances = recorder_from_config()
+        results_rolling[forecast] = train_test_rolling(forecast, df, store=store, importances=importances)
         results_rolling[forecast].to_csv(out, index=False)
         print(f"Results for {forecast} saved to {out}")
+        if importances is not None and len(importances):
+            fi_path = importances.save(results_dir / f"feature_importance_{forecast}.npz", merge=False)
+            print("Feature importances saved to", fi_path)
     print("Pipeline train_rf done.")
     return results_rolling
 
 
 if __name__ == "__main__":
-    run_train_rf()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--period", action="append", help="horizon to train (repeatable; default: all)")
+    parser.add_argument("--force", action="store_true", help="retrain even if results exist")
+    args, _ = parser.parse_known_args()  # ALL-CAPS --VAR=value options are read by settings
+    run_train_rf(periods=args.period, force=args.force)
@@ -0,0 +1,276 @@
+"""
+Local store of the WRDS tables (CRSP daily, IBES summary, financial ratios), refreshed
+incrementally by date watermark.
+Outputs: WRDS_STORE_DIR/{source}/year=YYYY/part-0.parquet, WRDS_STORE_DIR/watermarks.json
+
+Each source is a partitioned Parquet dataset (one file per year of its date column).
+The first pull fetches everything since DATA_START_DATE; later pulls fetch only rows
+dated on or after the stored watermark (the source's max date) minus
+WRDS_LOOKBACK_DAYS, so restatements inside the look-back window are picked up. Pulled
+rows replace stored rows with the same key, and stored rows dated inside the window
+that are no longer returned are dropped; only the year partitions the pull touches
+are rewritten. IBES summary rows also change when their actual is announced, so its
+incremental query also re-pulls rows whose announcement date is inside the window.
+
+Queries go through a QueryRunner: WrdsRunner wraps a wrds.Connection, SqliteRunner
+serves the same SQL from local SQLite files attached as the WRDS schemas (tests,
+offline experiments).
+"""
+import json
+import shutil
+import sqlite3
+import sys
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from settings import config
+
+import pandas as pd
+
+
+class QueryRunner(ABC):
+    """Runs a SQL query against WRDS (or a stand-in) and returns a DataFrame."""
+
+    @abstractmethod
+    def query(self, sql, date_cols=()):
+        """Result of ``sql``, with ``date_cols`` parsed as datetimes."""
+
+
+class WrdsRunner(QueryRunner):
+    """Queries through a ``wrds.Connection``."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def query(self, sql, date_cols=()):
+        return self.db.raw_sql(sql, date_cols=list(date_cols))
+
+
+class SqliteRunner(QueryRunner):
+    """Queries local SQLite files attached under the WRDS schema names.
+
+    Parameters
+    ----------
+    schemas : dict
+        Schema name (e.g. ``"crsp"``) -> SQLite file holding its tables; dates stored
+        as ISO text compare like WRDS dates in the queries.
+    """
+
+    def __init__(self, schemas):
+        self.conn = sqlite3.connect(":memory:")
+        for schema, path in schemas.items():
+            self.conn.execute("ATTACH DATABASE ? AS " + schema, (str(path),))
+
+    def query(self, sql, date_cols=()):
+        df = pd.read_sql_query(sql, self.conn)
+        for c in date_cols:
+            df[c] = pd.to_datetime(df[c])
+        return df
+
+
+class Source:
+    """One WRDS table pulled into the store.
+
+    ``query`` is a template with ``{start}`` (DATA_START_DATE) and ``{incremental}``,
+    which becomes ``since_filter`` with ``{since}`` filled in on incremental pulls and
+    is empty on full pulls.
+    """
+
+    def __init__(self, name, query, date_column, key, date_cols, since_filter):
+        self.name = name
+        self.query = query
+        self.date_column = date_column
+        self.key = key
+        self.date_cols = date_cols
+        self.since_filter = since_filter
+
+    def sql(self, start, since=None):
+        incremental = "" if since is None else self.since_filter.format(since=since)
+        return self.query.format(start=start, incremental=incremental)
+
+
+SOURCES = {
+    "crsp": Source(
+        "crsp", """
+        SELECT a.permno, a.cusip, a.date, a.cfacshr, ABS(a.prc) AS price, b.shrcd, b.exchcd, a.ret
+        FROM crsp.dsf AS a
+        LEFT JOIN crsp.msenames AS b
+        ON a.permno = b.permno
+        AND b.namedt <= a.date
+        AND a.date <= b.nameendt
+        WHERE a.cusip != ''
+        AND a.date >= '{start}'
+        AND (b.exchcd IN ('1', '2', '3'))
+        AND (b.shrcd IN ('10', '11'))
+        {incremental}
+    """, date_column="date", key=["permno", "date"], date_cols=["date"],
+        since_filter="AND a.date >= '{since}'"),
+    "ibes_summary": Source(
+        "ibes_summary", """
+        SELECT ticker, cusip, cname, fpedats, statpers, meanest, fpi, numest, actual, anndats_act
+        FROM ibes.statsum_epsus
+        WHERE cusip != ''
+        AND usfirm = '1'
+        AND fpedats >= '{start}'
+        AND (fpi IN ('1', '2', '6', '7', '8'))
+        {incremental}
+    """, date_column="statpers", key=["ticker", "cusip", "fpedats", "statpers", "fpi"],
+        date_cols=["fpedats", "statpers", "anndats_act"],
+        since_filter="AND (statpers >= '{since}' OR anndats_act >= '{since}')"),
+    "finratio": Source(
+        "finratio", """
+        SELECT *
+        FROM wrdsapps_finratio_ibes.firm_ratio_ibes
+        WHERE cusip != ''
+        AND public_date >= '{start}'
+        {incremental}
+    """, date_column="public_date", key=["permno", "public_date"], date_cols=["public_date"],
+        since_filter="AND public_date >= '{since}'"),
+}
+
+
+def _store_dir():
+    return Path(config("WRDS_STORE_DIR"))
+
+
+def read_watermarks(store_dir=None) -> dict:
+    path = Path(store_dir or _store_dir()) / "watermarks.json"
+    return json.loads(path.read_text()) if path.exists() else {}
+
+
+def _write_watermarks(store_dir, marks):
+    tmp = store_dir / "watermarks.json.tmp"
+    tmp.write_text(json.dumps(marks, indent=1))
+    tmp.replace(store_dir / "watermarks.json")
+
+
+def _partition(store_dir, name, year):
+    return store_dir / name / f"year={year}" / "part-0.parquet"
+
+
+def _align(new, old):
+    """Cast ``new``'s shared columns to ``old``'s dtypes where possible, so partitions
+    written by different pulls keep one schema."""
+    for c in new.columns.intersection(old.columns):
+        if new[c].dtype != old[c].dtype:
+            try:
+                new[c] = new[c].astype(old[c].dtype)
+            except (TypeError, ValueError):
+                pass
+    return new
+
+
+def pull_source(runner, name, full=None, store_dir=None):
+    """Fetch ``name`` (a key of SOURCES) into the store and advance its watermark.
+
+    Parameters
+    ----------
+    runner : QueryRunner
+    full : bool, optional
+        Re-pull everything since DATA_START_DATE and rewrite the dataset (default:
+        ``not WRDS_INCREMENTAL``). A source without a watermark is always pulled in full.
+
+    Returns
+    -------
+    pd.DataFrame
+        The rows fetched by this pull.
+    """
+    source = SOURCES[name]
+    store_dir = Path(store_dir or _store_dir())
+    marks = read_watermarks(store_dir)
+    start = pd.Timestamp(config("DATA_START_DATE"))
+    if full is None:
+        full = not config("WRDS_INCREMENTAL")
+    since = None
+    if not full and name in marks and (store_dir / name).exists():
+        lookback = config("WRDS_LOOKBACK_DAYS")
+        lookback = lookback.get(name, 0) if isinstance(lookback, dict) else lookback
+        since = max(start, pd.Timestamp(marks[name]["watermark"]) - pd.Timedelta(days=lookback))
+    print(f"Fetching {name} " + ("(full)" if since is None else f"since {since.date()}") + "...")
+    new = runner.query(source.sql(start.strftime("%Y-%m-%d"), None if since is None else since.strftime("%Y-%m-%d")),
+                       date_cols=source.date_cols)
+
+    if since is None and (store_dir / name).exists():
+        shutil.rmtree(store_dir / name)
+    new_keys = pd.util.hash_pandas_object(new[source.key], index=False)
+    years = new[source.date_column].dt.year
+    touched = set(years.dropna().astype(int))
+    if since is not None:
+        touched |= {int(p.parent.name.split("=")[1]) for p in (store_dir / name).glob("year=*/part-0.parquet")
+                    if int(p.parent.name.split("=")[1]) >= since.year}
+    for year in sorted(touched):
+        path = _partition(store_dir, name, year)
+        part = new[(years == year).to_numpy()]
+        if path.exists():
+            old = pd.read_parquet(path)
+            stale = pd.util.hash_pandas_object(old[source.key], index=False).isin(new_keys).to_numpy()
+            if since is not None:
+                stale |= (old[source.date_column] >= since).to_numpy()
+            part = pd.concat([old[~stale], _align(part.copy(), old)], ignore_index=True)
+        part = part.sort_values(source.key, kind="stable").reset_index(drop=True)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        part.to_parquet(path.with_suffix(".tmp"), index=False)
+        path.with_suffix(".tmp").replace(path)
+
+    previous = marks.get(name, {}).get("watermark")
+    latest = new[source.date_column].max()
+    watermark = max(filter(None, [previous if since is not None else None,
+                                  None if pd.isna(latest) else latest.strftime("%Y-%m-%d")]), default=None)
+    marks[name] = {
+        "watermark": watermark, "since": None if since is None else since.strftime("%Y-%m-%d"),
+        "rows_pulled": len(new), "pulled_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    store_dir.mkdir(parents=True, exist_ok=True)
+    _write_watermarks(store_dir, marks)
+    print(f"{name}: {len(new):,} rows pulled, {len(touched)} year partitions written, watermark {watermark}")
+    return new
+
+
+def read_source(name, columns=None, filters=None, store_dir=None):
+    """A stored source as one DataFrame (falls back to the legacy DATA_DIR/{name}.csv).
+
+    Parameters
+    ----------
+    columns : list[str], optional
+        Columns to read (Parquet reads only these).
+    filters : list, optional
+        pyarrow filters, e.g. ``[("date", ">=", pd.Timestamp("2000-01-01"))]``
+        (ignored for the CSV fallback).
+    """
+    path = Path(store_dir or _store_dir()) / name
+    if path.exists():
+        df = pd.read_parquet(path, columns=columns, filters=filters)
+        return df.drop(columns=["year"], errors="ignore")
+    legacy = Path(config("DATA_DIR")) / f"{name}.csv"
+    wanted = None if columns is None else {"Unnamed: 0", *columns}
+    return pd.read_csv(legacy, index_col=0, usecols=None if wanted is None else wanted.__contains__)
+
+
+def iter_source(name, columns=None, filters=None, batch_rows=1_000_000, store_dir=None):
+    """Stream a stored source as DataFrames of at most ``batch_rows`` rows.
+
+    Only ``columns`` are read and ``filters`` (as in read_source) are pushed down to
+    the Parquet scan, so partitions and row groups outside them are skipped. The
+    legacy CSV is read in chunks of ``batch_rows`` without filtering. Yields at least
+    one (possibly empty) frame.
+    """
+    path = Path(store_dir or _store_dir()) / name
+    if path.exists():
+        import pyarrow.dataset as ds
+        import pyarrow.parquet as pq
+
+        dataset = ds.dataset(path, format="parquet", partitioning="hive")
+        expression = None if not filters else pq.filters_to_expression(filters)
+        empty = True
+        for batch in dataset.to_batches(columns=columns, filter=expression, batch_size=batch_rows):
+            empty = False
+            yield batch.to_pandas()
+        if empty:
+            yield dataset.schema.empty_table().to_pandas()[columns or dataset.schema.names]
+        return
+    legacy = Path(config("DATA_DIR")) / f"{name}.csv"
+    wanted = None if columns is None else {"Unnamed: 0", *columns}
+    yield from pd.read_csv(legacy, index_col=0, usecols=None if wanted is None else wanted.__contains__,
+                           chunksize=batch_rows)
@@ -0,0 +1,62 @@
+"""
+Sanity checks for artifact_store.py — per-window model persistence, lookup and eviction.
+"""
+import numpy as np
+import pytest
+from sklearn.preprocessing import StandardScaler
+from sklearn.tree import DecisionTreeRegressor
+
+from artifact_store import ArtifactStore
+
+
+def _fitted(seed):
+    rng = np.random.default_rng(seed)
+    X, y = rng.normal(size=(50, 3)), rng.normal(size=50)
+    return DecisionTreeRegressor(max_depth=3).fit(X, y), StandardScaler().fit(X), X
+
+
+def test_save_and_lazy_lookup(tmp_path):
+    """Stored window round-trips; lookup(as_of) returns the latest month at or before it."""
+    store = ArtifactStore(tmp_path)
+    model, scaler, X = _fitted(0)
+    store.save("Q1", "1986-01", model, scaler=scaler, features=["a", "b", "c"], ols_params=np.ones(4))
+    store.save("Q1", "1986-02", *_fitted(1)[:2], features=["a", "b", "c"])
+
+    reopened = ArtifactStore(tmp_path)
+    assert reopened.months("Q1") == ["1986-01", "1986-02"]
+    art = reopened.lookup("Q1", "1986-01-31")
+    assert art.month == "1986-01" and art._payload is None
+    assert np.allclose(art.model.predict(X), model.predict(X))
+    assert art.features == ["a", "b", "c"] and art["ols_params"].shape == (4,)
+    with pytest.raises(KeyError):
+        reopened.get("A1", "1986-01")
+
+
+def test_size_cap_evicts_least_recently_used(tmp_path):
+    """Above max_bytes the least recently accessed window is removed first."""
+    store = ArtifactStore(tmp_path)
+    for i, month in enumerate(["1986-01", "1986-02"]):
+        store.save("Q1", month, *_fitted(i)[:2])
+    store.get("Q1", "1986-01").load()  # 1986-02 is now least recently used
+    store.max_bytes = store.size_bytes()
+    store.save("Q1", "1986-03", *_fitted(2)[:2])
+    assert ("Q1", "1986-02") not in store
+    assert ("Q1", "1986-01") in store and ("Q1", "1986-03") in store
+    assert not (tmp_path / "Q1" / "1986-02.joblib").exists()
+
+
+def test_window_larger_than_cap_is_kept(tmp_path):
+    """A window that alone exceeds max_bytes evicts the others but is itself kept."""
+    store = ArtifactStore(tmp_path, max_bytes=10)
+    store.save("Q1", "1986-01", *_fitted(0)[:2])
+    path = store.save("Q1", "1986-02", *_fitted(1)[:2])
+    assert path.exists() and store.keys() == [("Q1", "1986-02")]
+    assert not (tmp_path / "Q1" / "1986-01.joblib").exists()
+
+
+def test_two_writers_keep_each_others_entries(tmp_path):
+    """Stores opened before each other's saves (one per horizon process) do not drop entries."""
+    a, b = ArtifactStore(tmp_path), ArtifactStore(tmp_path)
+    a.save("Q1", "1986-01", *_fitted(0)[:2])
+    b.save("A1", "1986-01", *_fitted(1)[:2])
+    assert ArtifactStore(tmp_path).keys() == [("A1", "1986-01"), ("Q1", "1986-01")]
@@ -9,3 +9,75 @@ def test_group_fpi_horizons_sanity():
     """FPI 6,7,8 → same group; 1,2 → same group (paper horizon logic)."""
     assert group_fpi(6) == group_fpi(7) == group_fpi(8) == "678"
     assert group_fpi(1) == group_fpi(2) == "12"
+
+
+def test_fpi_group_codes_match_group_fpi():
+    """Integer codes partition fpi values exactly like group_fpi; the (ticker, group)
+    key separates tickers and groups."""
+    import numpy as np
+    from data_engineering import fpi_group_codes, ticker_fpi_key
+
+    fpi = np.array([6, 1, 7, 2, 8, 3, 6, 3])
+    codes = fpi_group_codes(fpi)
+    assert codes.dtype.kind == "i"
+    for a in range(len(fpi)):
+        for b in range(len(fpi)):
+            assert (codes[a] == codes[b]) == (group_fpi(fpi[a]) == group_fpi(fpi[b]))
+    key = ticker_fpi_key(["AA", "AA", "BB", "BB"], [6, 8, 6, 1])
+    assert key.dtype == np.int64 and key[0] == key[1] and len(set(key)) == 3
+
+
+def test_restrict_crsp_keeps_only_needed_days():
+    """CRSP is cut to the (permno, date) pairs on a statpers or announcement date; the
+    merge does not depend on CRSP's row order."""
+    import pandas as pd
+    from data_engineering import link_ibes, merge_ibes_crsp, restrict_crsp
+    from data_engineering_polars import synthetic_inputs
+
+    IBES, CRSP, link_table, _ = synthetic_inputs(n_firms=5, n_months=12)
+    IBES_link = link_ibes(IBES, link_table)
+    crsp = restrict_crsp(CRSP, IBES_link)
+    reported = IBES_link.dropna(subset=["announcement_actual_eps"])
+    needed = set(zip(IBES_link["permno"], IBES_link["statpers"])) | set(
+        zip(reported["permno"], reported["announcement_actual_eps"]))
+    assert set(zip(crsp["permno"], crsp["date"])) == needed & set(zip(CRSP["permno"], pd.to_datetime(CRSP["date"])))
+    assert len(crsp) < len(CRSP) / 5 and crsp["ret"].dtype == float
+    key = ["permno", "statpers", "fpi"]
+    merged = merge_ibes_crsp(IBES, CRSP, link_table).sort_values(key).reset_index(drop=True)
+    shuffled = merge_ibes_crsp(IBES, CRSP.sample(frac=1, random_state=0), link_table)
+    pd.testing.assert_frame_equal(shuffled.sort_values(key).reset_index(drop=True), merged)
+
+
+def test_streamed_crsp_matches_in_memory(tmp_path):
+    """CRSP streamed in small chunks from the Parquet store, with crsp_filters pushed
+    down, gives the same merge as the whole table in memory."""
+    import pandas as pd
+    from data_engineering import crsp_filters, merge_ibes_crsp
+    from data_engineering_polars import synthetic_inputs
+    from wrds_store import iter_source
+
+    IBES, CRSP, link_table, _ = synthetic_inputs(n_firms=5, n_months=12)
+    stored = CRSP.assign(date=pd.to_datetime(CRSP["date"]), ret=pd.to_numeric(CRSP["ret"], errors="coerce"))
+    for year, rows in stored.groupby(stored["date"].dt.year):
+        (tmp_path / "crsp" / f"year={year}").mkdir(parents=True)
+        rows.to_parquet(tmp_path / "crsp" / f"year={year}" / "part-0.parquet", index=False)
+    link_table = link_table.iloc[1:]
+    chunks = iter_source("crsp", columns=["permno", "date", "price", "ret", "cfacshr"],
+                         filters=crsp_filters(IBES, link_table), batch_rows=500, store_dir=tmp_path)
+    pd.testing.assert_frame_equal(merge_ibes_crsp(IBES, chunks, link_table), merge_ibes_crsp(IBES, CRSP, link_table))
+
+
+def test_char_fpi_from_store_fills_every_horizon():
+    """fpi read back from the WRDS store as text ('1', '6', ...) merges and splits into
+    the same horizon panels as integer fpi."""
+    import pandas as pd
+    from data_engineering import merge_ibes_crsp, split_horizons
+    from data_engineering_polars import synthetic_inputs
+
+    IBES, CRSP, link_table, _ = synthetic_inputs(n_firms=5, n_months=24)
+    expected = split_horizons(merge_ibes_crsp(IBES, CRSP, link_table))
+    got = split_horizons(merge_ibes_crsp(IBES.assign(fpi=IBES["fpi"].astype(str)), CRSP, link_table))
+    assert list(got) == ["A1", "A2", "Q1", "Q2", "Q3"]
+    for name, frame in got.items():
+        assert len(frame) > 0, name
+        pd.testing.assert_frame_equal(frame, expected[name])
@@ -0,0 +1,82 @@
+"""
+Sanity checks for feature_store.py — panel windows match train_test_rolling's month
+arithmetic, workers attach to one memory-mapped copy, and pooled rolling windows give
+the serial results.
+"""
+import numpy as np
+import pandas as pd
+
+import feature_store
+from feature_store import FeaturePanel, attach, publish
+from functions import train_test_rolling
+from profiles import Profile, use_profile
+
+
+def _frame(n_months=30, n_firms=40, seed=0):
+    rng = np.random.default_rng(seed)
+    n = n_months * n_firms
+    x = rng.normal(size=n)
+    meanest = rng.normal(size=n)
+    return pd.DataFrame({
+        "Date": np.repeat(pd.period_range("1985-01", periods=n_months, freq="M"), n_firms),
+        "permno": np.tile(np.arange(n_firms), n_months),
+        "numest": rng.integers(1, 10, n),
+        "x": x, "meanest": meanest, "price": rng.uniform(5, 50, n),
+        "adj_actual": np.sin(2 * x) + 0.5 * meanest + rng.normal(scale=0.1, size=n),
+    }).sample(frac=1, random_state=0)
+
+
+def _profile(tmp_path, **overrides):
+    return Profile("store-test", {
+        "ROLLING_START_YEAR": 1985, "ROLLING_END_YEAR": 1987,
+        "ROLLING_TRAIN_LENGTH": 11, "ROLLING_N_LOOPS": 20,
+        "FEATURE_STORE_DIR": tmp_path / "features", **overrides,
+    })
+
+
+def test_panel_windows_follow_rolling_months(tmp_path):
+    """Window i trains on months i..i+11 and tests on month i+12; rows are grouped by month."""
+    df = _frame()
+    with use_profile(_profile(tmp_path)):
+        panel = FeaturePanel.load(FeaturePanel.from_frame(df).save(tmp_path / "Q1"))
+        windows = panel.rolling_windows("Q1")
+    assert len(windows) == 30 - 12
+    train_lo, train_hi, test_lo, test_hi = windows[3]
+    assert (train_lo, train_hi, test_lo, test_hi) == (3 * 40, 15 * 40, 15 * 40, 16 * 40)
+    assert panel.features == ["x", "meanest", "price"]
+    assert panel.X.dtype == np.float32 and panel.X.flags["C_CONTIGUOUS"]
+    test_rows = df[df["Date"] == pd.Period("1986-04", "M")]
+    assert np.allclose(np.sort(panel.y[test_lo:test_hi]), np.sort(test_rows["adj_actual"]))
+
+
+def test_attach_maps_one_copy_and_publish_cleans_up(tmp_path):
+    """Attached panels are read-only memory maps opened once per process; a published
+    panel is gone once the block exits."""
+    with use_profile(_profile(tmp_path)):
+        panel = FeaturePanel.from_frame(_frame())
+        with publish(panel) as path:
+            attached = attach(path)
+            assert attach(path) is attached
+            assert isinstance(attached.X, np.memmap) and not attached.X.flags["WRITEABLE"]
+            np.testing.assert_array_equal(attached.X, panel.X)
+        feature_store._attached.pop(str(path))
+        assert not path.exists() and list((tmp_path / "features").iterdir()) == []
+
+
+def test_pooled_windows_match_serial(tmp_path):
+    """ROLLING_N_WORKERS=2 returns the serial rows, OLS predictions and importance keys."""
+    from feature_importance import ImportanceRecorder
+
+    df = _frame()
+    rf = {"RF_N_ESTIMATORS": 5, "RF_MAX_SAMPLES": 0.5, "RF_N_JOBS": 1, "RF_CONVERGENCE_ENABLED": False}
+    results, recorders = [], []
+    for workers in (1, 2):
+        recorder = ImportanceRecorder(permutation=False)
+        with use_profile(_profile(tmp_path, ROLLING_N_WORKERS=workers, **rf)):
+            results.append(train_test_rolling("Q1", df, importances=recorder))
+        recorders.append(recorder)
+    serial, pooled = results
+    pd.testing.assert_frame_equal(serial[["Date", "permno", "adj_actual"]], pooled[["Date", "permno", "adj_actual"]])
+    np.testing.assert_allclose(serial["predicted_adj_actual_LR"], pooled["predicted_adj_actual_LR"], rtol=1e-6)
+    assert pooled["predicted_adj_actual"].notna().all()
+    assert sorted(recorders[0]._records) == sorted(recorders[1]._records) and len(recorders[1]) == 18
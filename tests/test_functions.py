@@ -1,9 +1,19 @@
 """
 Sanity checks for functions.py — macro extraction feeds RF features.
 """
+import tracemalloc
+
+import numpy as np
 import pandas as pd
 import pytest
-from functions import PrepareMacro
+from scipy import stats
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.preprocessing import StandardScaler
+
+from profiles import Profile, use_profile
+from functions import (
+    PrepareMacro, fit_forest_converged, grouped_trim_mean, ols_fit, standardize_into, train_test_rolling,
+)
 
 
 def test_prepare_macro_sanity():
@@ -15,3 +25,94 @@ def test_prepare_macro_sanity():
     out = PrepareMacro(df, Begin_Year=65, Begin_Month=11, Name_col="ROUTPUT", Name_Var="GDP")
     assert "Dates" in out.columns and "GDP" in out.columns
     assert out["GDP"].notna().all() and pd.api.types.is_numeric_dtype(out["GDP"])
+
+
+def test_grouped_trim_mean_matches_scipy():
+    """Per-date trimmed means equal scipy's trim_mean per group, including NaN handling."""
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        "Date": rng.choice(["1990-01", "1990-02", "1990-03"], size=600),
+        "x": rng.standard_t(2, size=600),
+    })
+    df.loc[[3, 10], "x"] = np.nan
+    out = grouped_trim_mean(df, "Date", ["x"], 0.01)
+    expected = df.groupby("Date")["x"].apply(lambda v: stats.trim_mean(v, 0.01))
+    assert list(out.index) == list(expected.index)
+    np.testing.assert_allclose(out["x"].values, expected.values, equal_nan=True)
+
+
+def test_fit_forest_converged_stops_early_within_cap():
+    """Warm-started growth stops below the cap once predictions settle, and the trees
+    grown match the count reported."""
+    from sklearn.ensemble import RandomForestRegressor
+
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(400, 3))
+    y = X[:, 0] + rng.normal(scale=0.1, size=400)
+    model = RandomForestRegressor(n_estimators=400, max_depth=4, random_state=0)
+    model, pred, n_trees = fit_forest_converged(model, X[:300], y[:300], X[300:], step=20, tol=0.01)
+    assert 20 < n_trees < 400 and len(model.estimators_) == n_trees
+    np.testing.assert_allclose(pred, model.predict(X[300:]))
+    _, _, capped = fit_forest_converged(
+        RandomForestRegressor(n_estimators=50, max_depth=4, random_state=0),
+        X[:300], y[:300], X[300:], step=20, tol=0.0)
+    assert capped == 50
+
+
+def test_standardize_into_and_ols_fit_match_reference():
+    """In-place float32 scaling matches StandardScaler without allocating a copy of X;
+    chunked OLS matches least squares with an intercept."""
+    rng = np.random.default_rng(0)
+    X = rng.normal(3, 2, size=(20000, 20)).astype(np.float32)
+    X[:, 4] = 1.0  # constant column -> scale 1
+    out = np.empty_like(X)
+    tracemalloc.start()
+    mean, scale = standardize_into(X, out)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert peak < X.nbytes / 4
+    np.testing.assert_allclose(out, StandardScaler().fit_transform(X.astype(np.float64)), atol=1e-5)
+    y = X.astype(np.float64) @ rng.normal(size=20) + rng.normal(size=20000)
+    design = np.column_stack([np.ones(20000), X.astype(np.float64)])
+    np.testing.assert_allclose(ols_fit(X, y, chunk_rows=700), np.linalg.lstsq(design, y, rcond=None)[0],
+                               atol=1e-8)
+
+
+def test_train_test_rolling_fits_without_copying_windows(monkeypatch):
+    """Forests receive float32 C-contiguous windows and allocate far less than a copy of
+    them; predictions line up with the test rows they belong to."""
+    rng = np.random.default_rng(0)
+    n_months, n_firms, n_noise = 16, 300, 60
+    n = n_months * n_firms
+    signal = rng.normal(size=n)
+    df = pd.DataFrame(rng.normal(size=(n, n_noise)), columns=[f"f{j}" for j in range(n_noise)])
+    df["Date"] = np.repeat(pd.period_range("1985-01", periods=n_months, freq="M"), n_firms)
+    df["permno"] = np.tile(np.arange(n_firms), n_months)
+    df["numest"] = 1
+    df["meanest"], df["price"] = signal, 10.0
+    df["adj_actual"] = signal
+    df = df.sample(frac=1, random_state=0)
+
+    fits = []
+    real_fit = RandomForestRegressor.fit
+
+    def fit(self, X, y, *args, **kwargs):
+        tracemalloc.start()
+        out = real_fit(self, X, y, *args, **kwargs)
+        fits.append((X.dtype, X.flags["C_CONTIGUOUS"], tracemalloc.get_traced_memory()[1], X.nbytes))
+        tracemalloc.stop()
+        return out
+
+    monkeypatch.setattr(RandomForestRegressor, "fit", fit)
+    profile = Profile("rolling-test", {
+        "ROLLING_START_YEAR": 1985, "ROLLING_END_YEAR": 1986, "ROLLING_TRAIN_LENGTH": 11,
+        "ROLLING_N_LOOPS": 4, "RF_N_ESTIMATORS": 3, "RF_MAX_SAMPLES": 0.2, "RF_N_JOBS": 1,
+        "RF_CONVERGENCE_ENABLED": False,
+    })
+    with use_profile(profile):
+        result = train_test_rolling("Q1", df)
+    assert len(fits) == 4
+    assert all(dtype == np.float32 and contiguous and peak < nbytes / 2
+               for dtype, contiguous, peak, nbytes in fits)
+    assert len(result) == 4 * n_firms and result["Date"].is_monotonic_increasing
+    assert np.corrcoef(result["predicted_adj_actual_LR"], result["adj_actual"])[0, 1] > 0.99
@@ -0,0 +1,68 @@
+"""
+Sanity checks for link_table.py — incremental link updates equal a full recompute,
+only touched tickers are recomputed, and a stored link is used offline.
+"""
+import pandas as pd
+
+from link_table import LinkStore, compute_link, load_link_table
+from profiles import Profile, use_profile
+
+
+def _sources(n=8):
+    ibes_id = pd.DataFrame({
+        "ticker": [f"T{i}" for i in range(n) for _ in range(2)],
+        "cusip": [f"C{i}" for i in range(n) for _ in range(2)],
+        "cname": "x",
+        "sdates": pd.to_datetime(["1990-01-01", "1995-01-01"] * n),
+    })
+    stocknames = pd.DataFrame({
+        "permno": [10000 + i for i in range(n)],
+        "ncusip": [f"C{i}" for i in range(n)],
+        "comnam": "x",
+        "namedt": pd.to_datetime(["1985-01-01"] * n),
+        "nameenddt": pd.to_datetime(["2020-12-31"] * n),
+    })
+    return ibes_id, stocknames
+
+
+def test_incremental_update_matches_full_recompute(tmp_path):
+    """New sdates / namedt records recompute only their tickers; unchanged sources reuse
+    the current version; the result equals compute_link on the new sources."""
+    ibes_id, stocknames = _sources()
+    store = LinkStore(tmp_path / "link")
+    first = store.update(ibes_id, stocknames)
+    assert len(first) == 8 and store.version == 1
+    store.update(ibes_id.sample(frac=1, random_state=0), stocknames)
+    assert store.version == 1
+
+    new_ibes = pd.concat([ibes_id, pd.DataFrame({
+        "ticker": ["T1"], "cusip": ["C9"], "cname": ["x"], "sdates": pd.to_datetime(["2000-01-01"])})])
+    new_names = pd.concat([stocknames, pd.DataFrame({
+        "permno": [20009, 10003], "ncusip": ["C9", "C3"], "comnam": ["y", "y"],
+        "namedt": pd.to_datetime(["1999-01-01", "2021-01-01"]),
+        "nameenddt": pd.to_datetime(["2024-12-31", "2024-12-31"])})])
+    updated = LinkStore(tmp_path / "link").update(new_ibes, new_names)
+    manifest = LinkStore(tmp_path / "link").manifest
+    assert manifest["current"] == 2 and manifest["versions"][-1]["mode"] == "incremental"
+    assert manifest["versions"][-1]["tickers_recomputed"] == 2  # T1 (new cusip) and T3 (new name record)
+    pd.testing.assert_frame_equal(updated, compute_link(new_ibes, new_names))
+    assert ("T1", 20009) in set(zip(updated["ticker"], updated["permno"]))
+
+
+def _no_wrds():
+    raise AssertionError("WRDS contacted although a stored link exists")
+
+
+def test_load_link_table_offline(tmp_path):
+    """Without local sources, the stored link version is used and WRDS is not contacted."""
+    profile = Profile("link-test", {"DATA_DIR": tmp_path})
+    ibes_id, stocknames = _sources()
+    with use_profile(profile):
+        assert load_link_table() is None
+        ibes_id.to_parquet(tmp_path / "ibes_id.parquet", index=False)
+        stocknames.to_parquet(tmp_path / "crsp_stocknames.parquet", index=False)
+        online = load_link_table()
+        assert list(online.columns) == ["permno", "ncusip"] and len(online) == 8
+        (tmp_path / "ibes_id.parquet").unlink()
+        offline = load_link_table(connect=_no_wrds)
+    pd.testing.assert_frame_equal(offline, online)
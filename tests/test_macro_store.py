@@ -0,0 +1,95 @@
+"""
+Sanity checks for macro_store.py — vintage matrices parsed from Fed-style files by
+column name reproduce PrepareMacro's series, answer as-of queries without look-ahead,
+and feed read_merge_prepare_data.
+"""
+import numpy as np
+import pandas as pd
+
+from functions import PrepareMacro
+from macro_store import VintageMatrix, load_series, macro_features
+from profiles import Profile, use_profile
+
+
+def _fed_file(path, prefix, n_obs=60, n_vintages=24, seed=0):
+    """Quarterly observations from 1947:Q1, monthly vintages from 65M11; vintage v
+    publishes 20 + v // 3 rows (under half the rows, where PrepareMacro's pick is the
+    last published row) and revises earlier ones."""
+    rng = np.random.default_rng(seed)
+    level = 100 * np.exp(np.cumsum(rng.normal(0.01, 0.01, n_obs)))
+    table = {"DATE": [f"{1947 + t // 4}:Q{t % 4 + 1}" for t in range(n_obs)]}
+    for v in range(n_vintages):
+        year, month = 1965 + (10 + v) // 12, (10 + v) % 12 + 1
+        column = level * (1 + rng.normal(0, 0.002, n_obs))
+        column[20 + v // 3:] = np.nan
+        table[f"{prefix}{year % 100:02d}M{month}"] = column
+    pd.DataFrame(table).to_csv(path)
+    return path
+
+
+def _profile(tmp_path):
+    return Profile("macro-test", {"DATA_DIR": tmp_path, "MACRO_SERIES": {
+        "GDP": {"file": "gdp.csv", "prefix": "ROUTPUT", "transform": "log_return", "dating": "vintage"},
+        "GDPlevel": {"file": "gdp.csv", "prefix": "ROUTPUT", "transform": "level", "dating": "observation"},
+    }})
+
+
+def test_vintage_store_matches_prepare_macro(tmp_path):
+    """Latest-known values and their log returns equal PrepareMacro on the same file."""
+    path = _fed_file(tmp_path / "gdp.csv", "ROUTPUT")
+    expected = PrepareMacro(pd.read_csv(path, index_col=0), 65, 11, "ROUTPUT", "GDP")
+    expected["GDP_log_return"] = np.log(expected["GDP"] / expected["GDP"].shift(1))
+    expected = expected.dropna()
+    with use_profile(_profile(tmp_path)):
+        got = macro_features(expected["Dates"] + pd.Timedelta(days=14))
+    np.testing.assert_allclose(got["GDP_log_return"], expected["GDP_log_return"], rtol=1e-12)
+    raw = pd.read_csv(path, index_col=0)
+    first = raw.iloc[:, 1:].bfill(axis=1).iloc[:, 0]  # each observation's first release
+    np.testing.assert_allclose(got["GDPlevel"], first.dropna().iloc[-1])
+
+
+def test_as_of_queries_have_no_look_ahead(tmp_path):
+    """as_of(t) is the vintage published by t; the matrix is re-parsed only when the file changes."""
+    path = _fed_file(tmp_path / "gdp.csv", "ROUTPUT")
+    with use_profile(_profile(tmp_path)):
+        matrix = load_series("GDP")
+        assert load_series("GDP").values.shape == (60, 24)
+        stored = (tmp_path / "macro" / "GDP.npz").stat().st_mtime_ns
+        load_series("GDP")
+        assert (tmp_path / "macro" / "GDP.npz").stat().st_mtime_ns == stored
+    raw = pd.read_csv(path, index_col=0)
+    known = matrix.as_of(pd.Timestamp("1966-03-20"))
+    np.testing.assert_allclose(known.to_numpy(), raw["ROUTPUT66M3"].dropna().to_numpy())
+    assert known.index[-1] == pd.Timestamp("1952-01-01")
+    assert matrix.as_of(pd.Timestamp("1965-10-31")).empty
+    assert list(matrix.vintage_at(pd.to_datetime(["1965-11-01", "1966-01-31", "1970-01-01"]))) == [0, 2, 23]
+    assert isinstance(VintageMatrix.load(tmp_path / "macro" / "GDP.npz")[0], VintageMatrix)
+
+
+def test_read_merge_prepare_data_from_store(tmp_path):
+    """MACRO_SOURCE="vintage_store" gives the rows and features of the macro_data.csv
+    path when that file holds the same series at the vintage months."""
+    from functions import read_merge_prepare_data
+
+    series = {}
+    for seed, (name, prefix, transform) in enumerate([("GDP", "ROUTPUT", "log_return"), ("Cons", "RCON", "log_return"),
+                                                      ("IPT", "IPT", "log_return"), ("Unempl", "RUC", "level")]):
+        _fed_file(tmp_path / f"{name}.csv", prefix, seed=seed)
+        series[name] = {"file": f"{name}.csv", "prefix": prefix, "transform": transform, "dating": "vintage"}
+    rng = np.random.default_rng(0)
+    statpers = pd.to_datetime("1966-01-01") + pd.to_timedelta(rng.integers(0, 360, 200), unit="D")
+    (tmp_path / "processed_data").mkdir()
+    pd.DataFrame({
+        "permno": rng.integers(1, 20, 200), "statpers": statpers, "rankdate": statpers.strftime("%Y-%m"),
+        "adj_actual": rng.normal(size=200), "meanest": rng.normal(size=200), "adj_past_eps": rng.normal(size=200),
+    }).to_csv(tmp_path / "processed_data" / "Q1.csv", index=False)
+    overrides = {"DATA_DIR": tmp_path, "MACRO_SERIES": series, "COLS_TO_DROP_PREP": ["statpers"],
+                 "ROLLING_START_YEAR": 1966, "ROLLING_END_YEAR": 1966}
+    with use_profile(Profile("macro-test", overrides)):
+        vintages = pd.to_datetime([f"{1965 + (10 + v) // 12}-{(10 + v) % 12 + 1:02d}-01" for v in range(24)])
+        macro = macro_features(vintages)
+        expected = read_merge_prepare_data("Q1", macro, data_dir=tmp_path)
+    with use_profile(Profile("macro-store", {**overrides, "MACRO_SOURCE": "vintage_store"})):
+        got = read_merge_prepare_data("Q1", None, data_dir=tmp_path)
+    assert len(got) == 200
+    pd.testing.assert_frame_equal(got.reset_index(drop=True), expected[got.columns].reset_index(drop=True))
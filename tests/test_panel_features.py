@@ -0,0 +1,74 @@
+"""
+Sanity checks for panel_features.py — segment-wise lags, differences and rolling stats
+match a per-firm calendar-month reference, and features are cached per panel file.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from panel_features import add_panel_features, compute_panel_features
+from profiles import Profile, use_profile
+
+
+def _panel(n_firms=30, n_months=40, seed=0):
+    """Monthly firm panel with gaps (about a fifth of firm-months missing), NaNs, shuffled."""
+    rng = np.random.default_rng(seed)
+    months = pd.period_range("1990-01", periods=n_months, freq="M")
+    df = pd.DataFrame({
+        "permno": np.repeat(10000 + np.arange(n_firms), n_months),
+        "statpers": np.tile(months.to_timestamp() + pd.Timedelta(days=14), n_firms),
+    })
+    df = df[rng.random(len(df)) > 0.2].sample(frac=1, random_state=seed).reset_index(drop=True)
+    df["meanest"] = rng.normal(size=len(df))
+    df.loc[rng.random(len(df)) < 0.05, "meanest"] = np.nan
+    df["numest"] = rng.integers(1, 20, len(df)).astype(float)
+    return df
+
+
+def _reference(df, column, op, k, min_periods=None):
+    """Per firm: reindex to every calendar month, then pandas shift / rolling."""
+    out = pd.Series(np.nan, index=df.index)
+    for _, g in df.groupby("permno"):
+        s = g.set_index(g["statpers"].dt.to_period("M"))[column]
+        full = s.reindex(pd.period_range(s.index.min(), s.index.max(), freq="M"))
+        if op in ("lag", "diff"):
+            r = full.shift(k) if op == "lag" else full - full.shift(k)
+        else:
+            r = getattr(full.rolling(k, min_periods=min_periods or k), op.split("_")[1])()
+        out[g.index] = r.loc[s.index].to_numpy()
+    return out
+
+
+SPECS = {
+    "meanest_lag_1": {"column": "meanest", "op": "lag", "periods": 1},
+    "numest_diff_3": {"column": "numest", "op": "diff", "periods": 3},
+    "meanest_mean_6": {"column": "meanest", "op": "rolling_mean", "periods": 6, "min_periods": 2},
+    "numest_std_12": {"column": "numest", "op": "rolling_std", "periods": 12, "min_periods": 3},
+}
+
+
+def test_segment_features_match_per_firm_reference():
+    """Month gaps give NaN lags; rolling windows count calendar months, not rows."""
+    df = _panel()
+    got = compute_panel_features(df, SPECS)
+    for name, spec in SPECS.items():
+        expected = _reference(df, spec["column"], spec["op"], spec["periods"], spec.get("min_periods"))
+        np.testing.assert_allclose(got[name], expected, rtol=1e-9, atol=1e-12, err_msg=name)
+    with pytest.raises(ValueError):
+        compute_panel_features(df, {"leak": {"column": "adj_actual", "op": "lag", "periods": 1}})
+
+
+def test_features_cached_next_to_processed_panel(tmp_path):
+    """The second call reads the cached columns; a changed spec recomputes and replaces them."""
+    source = tmp_path / "Q1.csv"
+    df = _panel()
+    df.to_csv(source, index=False)
+    df = pd.read_csv(source)
+    with use_profile(Profile("panel-test", {"PANEL_FEATURES": SPECS})):
+        first = add_panel_features(df, "Q1", source)
+        cached = list((tmp_path / "panel_features").iterdir())
+        pd.testing.assert_frame_equal(add_panel_features(df, "Q1", source), first)
+    with use_profile(Profile("panel-test", {"PANEL_FEATURES": {"f": {**SPECS["meanest_lag_1"], "fill": 0.0}}})):
+        filled = add_panel_features(df, "Q1", source)
+    assert len(cached) == 1 and list((tmp_path / "panel_features").iterdir()) != cached
+    assert filled["f"].notna().all() and set(first.columns) - set(df.columns) == set(SPECS)
@@ -233,3 +233,40 @@ class TestPlotElements:
         left_strip = img_array[:, : w // 12, :]
         dark = np.all(left_strip < 80, axis=2)
         assert dark.sum() > 30, "No y-axis label detected in left region"
+
+
+# ===========================================================================
+# 6. PDP engine: one-pass average + ICE spread
+# ===========================================================================
+
+@pytest.fixture(scope="module")
+def fitted():
+    from sklearn.ensemble import RandomForestRegressor
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(300, 4))
+    y = np.tanh(X[:, 0]) + 0.1 * X[:, 1] + rng.normal(size=300) * 0.05
+    model = RandomForestRegressor(n_estimators=20, max_depth=4, random_state=0).fit(X, y)
+    return model, X
+
+
+class TestPartialDependenceEngine:
+    def test_brute_matches_sklearn_ice(self, fitted):
+        """Streaming chunks reproduce sklearn's brute average and the ICE std over rows."""
+        from sklearn.inspection import partial_dependence
+        from partial_dependence import compute_partial_dependence
+        model, X = fitted
+        ref = partial_dependence(model, X, [0], kind="both", method="brute",
+                                 grid_resolution=20, percentiles=(0, 1))
+        out = compute_partial_dependence(model, X, 0, grid_resolution=20, method="brute", chunk_rows=7)
+        assert np.allclose(out["grid"], ref["grid_values"][0])
+        assert np.allclose(out["average"], ref["average"][0])
+        assert np.allclose(out["ice_std"], ref["individual"][0].std(axis=0))
+
+    def test_recursion_with_subsampled_ice(self, fitted):
+        """Auto mode uses tree traversal for the average and a bounded ICE subsample."""
+        from partial_dependence import compute_partial_dependence
+        model, X = fitted
+        out = compute_partial_dependence(model, X, 0, grid_resolution=20, ice_max_rows=50, seed=1)
+        assert out["n_ice"] == 50 and out["n_rows"] == len(X)
+        assert out["average"].shape == out["ice_std"].shape == (20,)
+        assert out["average"][-1] > out["average"][0]
@@ -0,0 +1,55 @@
+"""
+Sanity checks for profiles.py — run profiles override settings for one call only,
+derive their subdirectories, and refuse to share output directories.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import settings
+from profiles import Profile, get_profile, run_profiles, use_profile
+from settings import config
+
+
+def test_profile_overrides_and_derived_dirs(tmp_path):
+    """Moving OUTPUT_DIR moves RESULTS_DIR / IMAGES_DIR; the caches stay shared; nothing leaks out."""
+    base_results, base_cache = config("RESULTS_DIR"), config("RESULTS_CACHE_DIR")
+    profile = Profile("tmp", {"OUTPUT_DIR": tmp_path / "out", "ROLLING_END_YEAR": 2026})
+    with use_profile(profile):
+        assert config("RESULTS_DIR") == tmp_path / "out" / "results"
+        assert config("IMAGES_DIR") == tmp_path / "out" / "images"
+        assert config("ROLLING_END_YEAR") == 2026
+        assert config("RESULTS_CACHE_DIR") == base_cache
+        with use_profile("base"):
+            assert config("RESULTS_DIR") == base_results
+        assert config("RESULTS_DIR") == tmp_path / "out" / "results"
+    assert config("RESULTS_DIR") == base_results and not settings._profile_overrides
+    assert get_profile("extended").config("OUTPUT_DIR").name == "_output_extended"
+    with pytest.raises(ValueError):
+        get_profile("no-such-profile")
+    with pytest.raises(ValueError):
+        run_profiles([Profile("a", {"OUTPUT_DIR": tmp_path}), Profile("b", {"OUTPUT_DIR": tmp_path})])
+
+
+def test_entry_point_takes_profile(tmp_path):
+    """run_table2(profile=...) reads and writes only the profile's directories."""
+    from table2_term_structure import run_table2
+
+    out = tmp_path / "out"
+    (out / "results").mkdir(parents=True)
+    rng = np.random.default_rng(0)
+    n = 120
+    pd.DataFrame({
+        "Date": np.repeat(pd.period_range("1990-01", periods=24, freq="M").astype(str), 5),
+        "permno": np.tile(np.arange(5), 24),
+        "meanest": rng.normal(size=n), "adj_actual": rng.normal(size=n),
+        "predicted_adj_actual": rng.normal(size=n), "price": rng.uniform(5, 50, n),
+        "bias_AF_ML": rng.normal(size=n) / 20,
+    }).to_csv(out / "results" / "Q1_rf.csv", index=False)
+    profile = Profile("tmp", {
+        "OUTPUT_DIR": out, "RESULTS_CACHE_DIR": tmp_path / "cache",
+        "FORECAST_PERIODS": ["Q1"], "TABLE2_BOOTSTRAP_DRAWS": 0,
+    })
+    run_table2(profile=profile)
+    table = pd.read_csv(out / "table2_term_structure.csv")
+    assert list(table["Horizon"]) == ["One-quarter-ahead", "t-stat"]
@@ -0,0 +1,33 @@
+"""
+Sanity checks for results.py — single-load, typed access to results/*_rf.csv.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+import results
+import settings
+
+
+def test_load_result_typed_memoized_and_invalidated(tmp_path, monkeypatch):
+    """Date normalized to YYYY-MM, numerics typed; on-disk cache reused until the CSV changes."""
+    monkeypatch.setitem(settings.defaults, "RESULTS_CACHE_DIR", tmp_path / "cache")
+    monkeypatch.setitem(settings.defaults, "RESULTS_CACHE_ENABLED", True)
+    csv = tmp_path / "Q1_rf.csv"
+    pd.DataFrame({"Date": ["1990-01", "1990-02"], "permno": [1, 2], "meanest": [1, 2]}).to_csv(csv, index=False)
+    results.clear_cache()
+
+    df = results.load_result("Q1", tmp_path)
+    assert list(df["Date"]) == ["1990-01", "1990-02"]
+    assert df["permno"].dtype == np.int64 and df["meanest"].dtype == np.float64
+    assert len(list((tmp_path / "cache").glob("Q1_rf_*.pkl"))) == 1
+    df["meanest"] = 0  # callers get copies
+    results.clear_cache()
+    assert results.load_result("Q1", tmp_path)["meanest"].tolist() == [1.0, 2.0]  # from pickle
+
+    pd.DataFrame({"Date": ["1990-03"], "permno": [3], "meanest": [5]}).to_csv(csv, index=False)
+    os.utime(csv, ns=(0, os.stat(csv).st_mtime_ns + 10**9))
+    assert results.load_result("Q1", tmp_path)["Date"].tolist() == ["1990-03"]
+    assert len(list((tmp_path / "cache").glob("Q1_rf_*.pkl"))) == 1  # stale copy replaced
+    assert results.load_results(["Q1", "A2"], tmp_path, verbose=False).keys() == {"Q1"}
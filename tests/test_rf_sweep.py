@@ -0,0 +1,44 @@
+"""
+Sanity check for rf_sweep.py — successive halving keeps only the best configurations
+to the end.
+"""
+import numpy as np
+import pandas as pd
+
+from profiles import Profile, use_profile
+from feature_store import FeaturePanel
+from rf_sweep import sweep_panels
+
+
+def _frame(n_months=30, n_firms=40, seed=0):
+    rng = np.random.default_rng(seed)
+    n = n_months * n_firms
+    x = rng.normal(size=n)
+    meanest = rng.normal(size=n)
+    return pd.DataFrame({
+        "Date": np.repeat(pd.period_range("1985-01", periods=n_months, freq="M"), n_firms),
+        "permno": np.tile(np.arange(n_firms), n_months),
+        "numest": rng.integers(1, 10, n),
+        "x": x, "meanest": meanest, "price": rng.uniform(5, 50, n),
+        "adj_actual": np.sin(2 * x) + 0.5 * meanest + rng.normal(scale=0.1, size=n),
+    }).sample(frac=1, random_state=0)
+
+
+PROFILE = Profile("sweep-test", {
+    "ROLLING_START_YEAR": 1985, "ROLLING_END_YEAR": 1987,
+    "ROLLING_TRAIN_LENGTH": 11, "ROLLING_N_LOOPS": 20,
+})
+
+
+def test_successive_halving_leaderboard(tmp_path):
+    """Weak configs stop after the first rung; survivors are scored on every window."""
+    with use_profile(PROFILE):
+        path = FeaturePanel.from_frame(_frame()).save(tmp_path / "Q1")
+        configs = [{"n_estimators": 10, "max_depth": d, "max_samples": 0.5} for d in (1, 2, 6, 8)]
+        board = sweep_panels({"Q1": path}, configs, eta=2, rungs=2, workers=1)
+    assert len(board) == 4 and list(board["rank"]) == [1, 2, 3, 4]
+    finalists = board[board["rung"] == 1]
+    assert len(finalists) == 2 and (finalists["n_windows"] == 18).all()
+    assert (board[board["rung"] == 0]["n_windows"] == 9).all()
+    assert set(finalists["max_depth"]) == {6, 8}
+    assert (board["rmse"] < board["rmse_AF"]).iloc[0]
@@ -37,3 +37,31 @@ def test_bias_regression_sanity():
     X2 = df[["alpha_i", "beta_t", "N_analyst", "post_regulation"]]
     m2 = sm.OLS(df["bias_AF_ML"], X2).fit()
     assert np.isfinite(m2.params["N_analyst"]) and 0 <= m2.pvalues["N_analyst"] <= 1
+
+
+def test_spec_grid_tidy_table():
+    """Grid runner: one tidy row per (period, sample, spec, term), shared design per sample."""
+    from stat_analysis import parse_formula, run_spec_grid
+
+    assert parse_formula("bias_AF_ML ~ N_analyst + post_regulation") == (
+        "bias_AF_ML", ["N_analyst", "post_regulation"])
+
+    rng = np.random.default_rng(0)
+    n = 400
+    df = pd.DataFrame({
+        "Date": rng.choice(["1999-01", "1999-06", "2001-01", "2001-06"], size=n),
+        "permno": rng.integers(0, 40, size=n),
+        "bias_AF_ML": rng.normal(size=n) * 0.01,
+        "N_analyst": rng.integers(1, 20, size=n),
+    })
+    df["post_regulation"] = (df["Date"] > "2000-10").astype(int)
+    specs = {"post": "bias_AF_ML ~ post_regulation", "both": "bias_AF_ML ~ N_analyst + post_regulation"}
+    samples = {"full": None, "late": "Date >= '1999-06'"}
+    table, reports = run_spec_grid({"Q1": df, "A1": df}, specs, samples, mode="fe", workers=1)
+
+    assert len(table) == 2 * 2 * (1 + 2)
+    assert set(table["term"]) == {"post_regulation", "N_analyst"}
+    late = table[(table["sample"] == "late") & (table["period"] == "Q1")]
+    assert (late["nobs"] == (df["Date"] >= "1999-06").sum()).all()
+    assert table["p_value"].between(0, 1).all()
+    assert len(reports) == 4
@@ -0,0 +1,40 @@
+"""
+Sanity checks for summary_stats.py — job runner renders every output once and skips
+jobs whose inputs are unchanged.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+import summary_stats
+from profiles import Profile
+
+
+def test_run_summary_stats_renders_then_skips(tmp_path):
+    """First run writes all tables/figures; a rerun is a no-op until a results file changes."""
+    results_dir = tmp_path / "results"
+    results_dir.mkdir()
+    rng = np.random.default_rng(0)
+    n = 240
+    df = pd.DataFrame({
+        "Date": np.repeat(pd.period_range("1990-01", periods=24, freq="M").astype(str), 10),
+        "permno": np.tile(np.arange(10), 24),
+        "meanest": rng.normal(size=n), "adj_actual": rng.normal(size=n),
+        "predicted_adj_actual": rng.normal(size=n), "price": rng.uniform(5, 50, n),
+        "numest": rng.integers(1, 10, n), "bias_AF_ML": rng.normal(size=n) / 20,
+    })
+    df.to_csv(results_dir / "Q1_rf.csv", index=False)
+    profile = Profile("test", {
+        "OUTPUT_DIR": tmp_path, "RESULTS_CACHE_DIR": tmp_path / "cache" / "results",
+        "FORECAST_PERIODS": ["Q1", "A2"],
+    })
+
+    outs = summary_stats.run_summary_stats(workers=1, profile=profile)
+    assert len(outs) == len(summary_stats.summary_jobs()) and all(p.exists() for p in outs)
+    assert "Q1 (1-qtr)" in (tmp_path / "summary_stats_coverage.tex").read_text()
+    assert summary_stats.run_summary_stats(workers=1, profile=profile) == []
+
+    path = results_dir / "Q1_rf.csv"
+    os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 10**9))
+    assert len(summary_stats.run_summary_stats(workers=1, profile=profile)) == len(outs)
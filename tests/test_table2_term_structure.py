@@ -9,8 +9,11 @@ from pathlib import Path
 from table2_term_structure import (
     HORIZON_LABELS,
     NW_LAGS,
+    _bootstrap_indices,
     _newey_west_tstat,
+    block_bootstrap_ci,
     compute_table2_row,
+    table2_by_date,
 )
 
 
@@ -35,6 +38,16 @@ def test_newey_west_constant_returns_nan():
     assert np.isnan(_newey_west_tstat(s, maxlags=3))
 
 
+@pytest.mark.parametrize("maxlags", [3, 12])
+def test_newey_west_matches_statsmodels_hac(maxlags):
+    """Direct Bartlett-kernel t-stat equals OLS-on-constant with statsmodels HAC."""
+    sm = pytest.importorskip("statsmodels.api")
+    rng = np.random.default_rng(0)
+    s = pd.Series(0.2 + rng.normal(size=150).cumsum() * 0.1 + rng.normal(size=150))
+    res = sm.OLS(s, np.ones((len(s), 1))).fit(cov_type="HAC", cov_kwds={"maxlags": maxlags})
+    assert _newey_west_tstat(s, maxlags) == pytest.approx(float(res.tvalues.iloc[0]), rel=1e-10)
+
+
 def test_compute_table2_row_sanity():
     """Row has paper columns and N = number of observations."""
     df = _make_table2_df(n_dates=5, n_firms_per_date=4)
@@ -48,6 +61,28 @@ def test_compute_table2_row_sanity():
     assert NW_LAGS["Q1"] == 3 and NW_LAGS["A1"] == 12
 
 
+@pytest.mark.parametrize("method", ["stationary", "moving"])
+def test_bootstrap_indices_shape_and_range(method):
+    """Resampled positions are valid date indices, one full-length path per draw."""
+    idx = _bootstrap_indices(50, 200, 5, method, np.random.default_rng(0))
+    assert idx.shape == (200, 50)
+    assert idx.min() >= 0 and idx.max() < 50
+
+
+def test_block_bootstrap_ci_covers_mean_and_is_reproducible():
+    """CI brackets the sample mean of every column; same seed -> same bounds."""
+    np.random.seed(0)
+    by_date = table2_by_date(_make_table2_df(n_dates=60, n_firms_per_date=5))
+    ci = block_bootstrap_ci(by_date, block_length=3, n_draws=2000, seed=1)
+    assert list(ci.index) == list(by_date.columns)
+    means = by_date.mean()
+    assert ((ci["lo"] <= means) & (means <= ci["hi"])).all()
+    assert ci.equals(block_bootstrap_ci(by_date, block_length=3, n_draws=2000, seed=1))
+
+    row = compute_table2_row("Q1", _make_table2_df(n_dates=5), boot_ci=ci)
+    assert row["lo((AF-RF)/P)"] == ci.loc["AF_RF_P", "lo"]
+
+
 def test_rf_csv_sanity_when_exists():
     """When results/*_rf.csv exist: required columns and key numeric not all NaN."""
     try:
@@ -0,0 +1,79 @@
+"""
+Sanity checks for wrds_store.py — incremental pulls from a SQLite stand-in for WRDS
+fetch only the look-back window, pick up restatements and late IBES actuals, and
+leave the store equal to a full pull.
+"""
+import sqlite3
+
+import pandas as pd
+
+from profiles import Profile, use_profile
+from wrds_store import SqliteRunner, pull_source, read_source, read_watermarks
+
+
+def _write(path, **tables):
+    with sqlite3.connect(path) as conn:
+        for name, df in tables.items():
+            df.to_sql(name, conn, index=False, if_exists="replace")
+
+
+def _crsp_tables(days):
+    dsf = pd.DataFrame({
+        "permno": [10001] * len(days) + [10002] * len(days),
+        "cusip": ["11111111"] * len(days) + ["22222222"] * len(days),
+        "date": list(days) * 2,
+        "cfacshr": 1.0, "prc": -10.0, "ret": 0.01,
+    })
+    msenames = pd.DataFrame({"permno": [10001, 10002], "namedt": "1980-01-01", "nameendt": "2099-12-31",
+                             "shrcd": "10", "exchcd": "1"})
+    return dsf, msenames
+
+
+def _profile(tmp_path):
+    return Profile("wrds-test", {"DATA_DIR": tmp_path / "data", "DATA_START_DATE": "1985-01-01",
+                                 "WRDS_LOOKBACK_DAYS": {"crsp": 10, "ibes_summary": 10}})
+
+
+def test_incremental_crsp_pull_refetches_lookback_window(tmp_path):
+    """The second pull reads from watermark - look-back, replaces restated rows in the
+    window, appends new days, and leaves older rows alone."""
+    days = pd.bdate_range("1999-12-01", "2000-01-31").strftime("%Y-%m-%d")
+    dsf, msenames = _crsp_tables(days)
+    _write(tmp_path / "crsp.db", dsf=dsf, msenames=msenames)
+    runner = SqliteRunner({"crsp": tmp_path / "crsp.db"})
+    with use_profile(_profile(tmp_path)):
+        assert len(pull_source(runner, "crsp")) == len(dsf)
+        assert read_watermarks()["crsp"]["watermark"] == "2000-01-31"
+
+        more, _ = _crsp_tables(pd.bdate_range("1999-12-01", "2000-02-29").strftime("%Y-%m-%d"))
+        more.loc[more["date"] == "2000-01-28", "prc"] = -11.0  # restated inside the window
+        more.loc[more["date"] == "1999-12-01", "prc"] = -12.0  # outside the window: not re-fetched
+        _write(tmp_path / "crsp.db", dsf=more, msenames=msenames)
+        pulled = pull_source(runner, "crsp")
+        assert pulled["date"].min() == pd.Timestamp("2000-01-21")
+        assert read_watermarks()["crsp"]["since"] == "2000-01-21"
+
+        stored = read_source("crsp").set_index(["permno", "date"])["price"]
+    assert len(stored) == len(more) and stored.index.is_unique
+    assert (stored.xs(pd.Timestamp("2000-01-28"), level="date") == 11.0).all()
+    assert (stored.xs(pd.Timestamp("1999-12-01"), level="date") == 10.0).all()
+    assert sorted((tmp_path / "data" / "wrds" / "crsp").iterdir())[0].name == "year=1999"
+
+
+def test_late_ibes_actual_updates_older_rows(tmp_path):
+    """An actual announced after the last pull reaches estimates dated before the window."""
+    ibes = pd.DataFrame({
+        "ticker": "AAA", "cusip": "11111111", "cname": "A", "usfirm": "1", "fpi": "1",
+        "fpedats": "2000-12-31", "statpers": ["2000-06-15", "2000-07-20", "2000-08-17"],
+        "meanest": [1.0, 1.1, 1.2], "numest": 3, "actual": None, "anndats_act": None,
+    })
+    _write(tmp_path / "ibes.db", statsum_epsus=ibes)
+    runner = SqliteRunner({"ibes": tmp_path / "ibes.db"})
+    with use_profile(_profile(tmp_path)):
+        pull_source(runner, "ibes_summary")
+        ibes[["actual", "anndats_act"]] = [1.3, "2001-02-10"]
+        _write(tmp_path / "ibes.db", statsum_epsus=ibes)
+        assert len(pull_source(runner, "ibes_summary")) == 3
+        stored = read_source("ibes_summary")
+    assert len(stored) == 3 and (stored["actual"] == 1.3).all()
+    assert (stored["anndats_act"] == pd.Timestamp("2001-02-10")).all()